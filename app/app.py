@@ -1,32 +1,99 @@
 # Importing necessary modules
 from flask import Flask, request, jsonify
 from flask_cors import CORS
+import numpy as np
 import pandas as pd
 import logging
+import functools
+import hashlib
+import threading
 from datetime import datetime
 
 # Importing self-defined modules
 import config
 import database
 import processors
+import queries
+import columnar
+from cache import ResponseCache
 
 # Setting up Logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
+app.json.sort_keys = False
 CORS(app)
 
+# ---------------- Response Cache ----------------
+
+response_cache = ResponseCache(config.RESPONSE_CACHE_MAX_ENTRIES, config.RESPONSE_CACHE_TTL_SECONDS)
+not_modified_count = 0
+
+def cached_response(**defaults):
+    """
+    Serving an endpoint from the response cache.
+    The key holds the endpoint's own query parameters with their defaults filled in (other parameters are ignored)
+    and the current data generation, so an ingest commit makes every older entry unreachable.
+    Only 200 responses are cached; they carry a content ETag and If-None-Match gets a 304.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper():
+            global not_modified_count
+            params = tuple((name, request.args.get(name, default)) for name, default in defaults.items())
+            key = (database.DB_PATH, request.path, database.get_data_generation(), params)
+            entry = response_cache.get(key)
+            if entry is None:
+                response = app.make_response(view())
+                if response.status_code != 200:
+                    return response
+                body = response.get_data()
+                entry = (body, hashlib.sha1(body).hexdigest())
+                response_cache.put(key, entry)
+
+            body, etag = entry
+            if request.if_none_match.contains(etag):
+                not_modified_count += 1
+                response = app.response_class(status=304)
+            else:
+                response = app.response_class(body, mimetype='application/json')
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return wrapper
+    return decorator
+
+# ---------------- Schema Migration ----------------
+# Servers started through prepare_database() migrate before serving; an app imported any other way
+# (flask run, the test client) brings each database up to date before its first request instead.
+
+migrated_paths = set()
+migration_lock = threading.Lock()
+
+@app.before_request
+def ensure_schema_once():
+    """Running ensure_schema() once per database path in this process"""
+    if database.DB_PATH in migrated_paths:
+        return
+    with migration_lock:
+        if database.DB_PATH not in migrated_paths and database.database_exists():
+            database.ensure_schema()
+            migrated_paths.add(database.DB_PATH)
+
 # ---------------- API Routing ----------------
 
 @app.route('/api/sales/daily', methods=['GET'])
+@cached_response(start_date=None, end_date=None, timezone='UTC', currency=None,
+                 status=None, category=None, transaction_currency=None, customer_id=None, group_by=None)
 def daily_sales():
-    """Daily sales data"""
+    """Daily sales data, optionally filtered and split by group_by"""
     try:
         # obtaining query parameters
         start_date = request.args.get('start_date')
         end_date = request.args.get('end_date')
         timezone_str = request.args.get('timezone', 'UTC')
+        currency = reporting_currency()
         
         # validating parameters
         if not start_date or not end_date:
@@ -53,74 +120,102 @@ def daily_sales():
                 'timestamp':datetime.utcnow().isoformat() + 'Z'
             }), 400
         
-        # Querying the database
-        conn = database.get_connection()
-        query = '''
-            SELECT processed_timestamp, amount
-            FROM transactions
-            WHERE processed_timestamp IS NOT NULL
-            AND status = 'completed'
-            AND DATE(processed_timestamp) BETWEEN ? AND ?
-            ORDER BY processed_timestamp
-        '''
+        error = currency_error(currency)
+        if error:
+            return error
+        
+        filters, group_by, error = sales_breakdown()
+        if error:
+            return error
         
-        df = pd.read_sql_query(query, conn, params=[start_date, end_date])
-        conn.close()
+        # Querying the database for the local days of the requested timezone
+        start_ts, end_ts = processors.local_date_range(start_date, end_date, timezone_str)
+        df = queries.get_sales(start_ts, end_ts, timezone_str, currency, filters, group_by)
         
         if df.empty:
-            return jsonify({
+            summary = {'total_sales': 0, 'total_transactions': 0, 'average_daily_sales': 0}
+            if queries.has_customer_sketches(filters):
+                summary['unique_customers'] = 0
+            return jsonify(with_currency(with_breakdown({
                 'data': [],
                 'timezone': timezone_str,
                 'period': f"{start_date} To {end_date}",
-                'summary': {'total_sales': 0, 'total_transactions': 0, 'average_daily_sales': 0}
-            })
+                'summary': summary
+            }, filters, group_by, []), currency))
         
-        # Processing daily sales data
-        df['processed_timestamp'] = pd.to_datetime(df['processed_timestamp'])
-        df['target_date'] = df['processed_timestamp'].apply(
-            lambda x: processors.convert_timezone(x, timezone_str).date()
-        )
+        # Processing daily sales data in the requested timezone
+        utc = pd.to_datetime(df['processed_ts'], unit='s', utc=True)
+        df['target_date'] = processors.local_day_buckets(utc, timezone_str)
         
         # Grouping by date and calculating sales
-        grouped = df.groupby('target_date').agg({
-            'amount': ['sum', 'count', 'mean']
-        }).round(2)
+        grouped = df.groupby('target_date').agg(
+            total=('amount', 'sum'), count=('transaction_count', 'sum')
+        )
+        grouped['mean'] = grouped['total'] / grouped['count']
+        grouped = grouped.round(2)
         
-        daily_data = []
-        for date, row in grouped.iterrows():
-            daily_data.append({
+        daily_data = [
+            {
                 'date': date.strftime('%Y-%m-%d'),
-                'total_sales': float(row[('amount', 'sum')]),
-                'transaction_count': int(row[('amount', 'count')]),
-                'average_order_value': float(row[('amount', 'mean')])
-            })
+                'total_sales': float(total),
+                'transaction_count': int(count),
+                'average_order_value': float(mean)
+            }
+            for date, total, count, mean in grouped.itertuples()
+        ]
         
         # Sorting the data by date
         total_sales = sum(day['total_sales'] for day in daily_data)
         total_transactions = sum(day['transaction_count'] for day in daily_data)
         avg_daily_sales = total_sales / len(daily_data) if daily_data else 0
+        summary = {
+            'total_sales': round(total_sales, 2),
+            'total_transactions': total_transactions,
+            'average_daily_sales': round(avg_daily_sales, 2)
+        }
         
-        return jsonify({
+        # Distinct customers of each local day and of the whole range, merged from hourly sketches
+        day_ranges = [processors.local_date_range(day['date'], day['date'], timezone_str) for day in daily_data]
+        unique_customers = queries.get_unique_customers(day_ranges + [(start_ts, end_ts)], filters)
+        if unique_customers is not None:
+            *day_counts, summary['unique_customers'] = unique_customers
+            for day, count in zip(daily_data, day_counts):
+                day['unique_customers'] = count
+        
+        rows = None
+        if group_by:
+            name = dimension_name(group_by)
+            rows = group_rows(df, 'target_date', group_by)
+            daily_data = [
+                {
+                    'date': date.strftime('%Y-%m-%d'),
+                    name: value,
+                    'total_sales': round(float(total), 2),
+                    'transaction_count': int(count),
+                    'average_order_value': round(float(total / count), 2)
+                }
+                for date, value, total, count in rows.itertuples(index=False)
+            ]
+        
+        return jsonify(with_currency(with_breakdown({
             'data': daily_data,
             'timezone': timezone_str,
             'period': f"{start_date} To {end_date}",
-            'summary': {
-                'total_sales': round(total_sales, 2),
-                'total_transactions': total_transactions,
-                'average_daily_sales': round(avg_daily_sales, 2)
-            }
-        })
+            'summary': summary
+        }, filters, group_by, rows), currency))
         
     except Exception as e:
         logger.error(f"Daily Sales Error: {e}")
         return jsonify({'error': 'Server Internal Error'}), 500
 
 @app.route('/api/sales/hourly', methods=['GET'])
+@cached_response(date=None, timezone='UTC', currency=None, status=None, category=None, transaction_currency=None, customer_id=None, group_by=None)
 def hourly_sales():
-    """Hourly sales data"""
+    """Hourly sales data, optionally filtered and split by group_by"""
     try:
         date_str = request.args.get('date')
         timezone_str = request.args.get('timezone', 'UTC')
+        currency = reporting_currency()
         
         if not date_str:
             return jsonify({
@@ -133,138 +228,288 @@ def hourly_sales():
         if not processors.validate_date(date_str) or not processors.validate_timezone(timezone_str):
             return jsonify({'error': 'Parameter Format Error'}), 400
         
-        # Querying the database
-        conn = database.get_connection()
-        query = '''
-            SELECT processed_timestamp, amount
-            FROM transactions
-            WHERE processed_timestamp IS NOT NULL
-            AND status = 'completed'
-            AND DATE(processed_timestamp) = ?
-        '''
+        error = currency_error(currency)
+        if error:
+            return error
         
-        df = pd.read_sql_query(query, conn, params=[date_str])
-        conn.close()
+        filters, group_by, error = sales_breakdown()
+        if error:
+            return error
         
-        if df.empty:
-            return jsonify({'data': [], 'timezone': timezone_str, 'date': date_str})
-        
-        # Processing hourly sales data
-        df['processed_timestamp'] = pd.to_datetime(df['processed_timestamp'])
-        df['target_hour'] = df['processed_timestamp'].apply(
-            lambda x: processors.convert_timezone(x, timezone_str).replace(
-                minute=0, second=0, microsecond=0
-            )
-        )
+        # Querying the database for the local day of the requested timezone
+        start_ts, end_ts = processors.local_date_range(date_str, date_str, timezone_str)
+        df = queries.get_sales(start_ts, end_ts, timezone_str, currency, filters, group_by)
         
-        grouped = df.groupby('target_hour').agg({
-            'amount': ['sum', 'count']
-        }).round(2)
-        
-        hourly_data = []
-        for hour, row in grouped.iterrows():
-            hourly_data.append({
+        if df.empty:
+            return jsonify(with_currency(with_breakdown(
+                {'data': [], 'timezone': timezone_str, 'date': date_str}, filters, group_by, []
+            ), currency))
+        
+        # Processing hourly sales data in the requested timezone
+        utc = pd.to_datetime(df['processed_ts'], unit='s', utc=True)
+        df['target_hour'] = processors.local_hour_buckets(utc, timezone_str)
+        
+        rows = None
+        if group_by:
+            rows = group_rows(df, 'target_hour', group_by)
+            hours, values = pd.DatetimeIndex(rows['target_hour']), rows[group_by]
+            grouped = rows[['total', 'count']].round(2)
+        else:
+            grouped = df.groupby('target_hour').agg(
+                total=('amount', 'sum'), count=('transaction_count', 'sum')
+            ).round(2)
+            hours, values = grouped.index, None
+        local_hours = hours.tz_convert(timezone_str)
+        
+        # Local hour labels repeat on a DST fall back day, so each hour also carries its UTC offset
+        hourly_data = [
+            {
                 'hour': hour.strftime('%Y-%m-%d %H:%M:%S'),
-                'total_sales': float(row[('amount', 'sum')]),
-                'transaction_count': int(row[('amount', 'count')])
-            })
-        
-        hourly_data.sort(key=lambda x: x['hour'])
+                'utc_offset': hour.isoformat()[-6:],
+                'total_sales': float(total),
+                'transaction_count': int(count)
+            }
+            for hour, (total, count) in zip(local_hours, grouped.itertuples(index=False))
+        ]
+        if group_by:
+            name = dimension_name(group_by)
+            hourly_data = [{**hour, name: value} for hour, value in zip(hourly_data, values)]
         
-        return jsonify({
+        return jsonify(with_currency(with_breakdown({
             'data': hourly_data,
             'timezone': timezone_str,
             'date': date_str
-        })
+        }, filters, group_by, rows), currency))
         
     except Exception as e:
         logger.error(f"Hourly Sales API Error: {e}")
         return jsonify({'error': 'Server Internal Error'}), 500
 
 @app.route('/api/sales/compare', methods=['GET'])
+@cached_response(period1=None, period2=None, periods=None, offsets=None, timezone='UTC', currency=None,
+                 status=None, category=None, transaction_currency=None, customer_id=None, group_by=None)
 def compare_periods():
-    """Compararison of sales between two periods"""
+    """
+    Comparison of sales between periods: period1 and period2, or a comma separated list of periods
+    (YYYY, YYYY-Qn, YYYY-MM, YYYY-Www, YYYY-MM-DD or YYYY-MM-DD..YYYY-MM-DD) with optional offsets (-1y, -1m, ...)
+    """
     try:
-        period1 = request.args.get('period1')  # YYYY-MM
-        period2 = request.args.get('period2')  # YYYY-MM
+        period1 = request.args.get('period1')
+        period2 = request.args.get('period2')
+        periods_arg = request.args.get('periods')
+        offsets_arg = request.args.get('offsets')
+        timezone_str = request.args.get('timezone', 'UTC')
+        currency = reporting_currency()
         
-        if not period1 or not period2:
+        if not periods_arg and (not period1 or not period2):
             return jsonify({
                 'error': 'Missing Parameters',
-                'message': 'Required period1 and period2 (YYYY-MM Format)'
+                'message': 'Required periods (comma separated) or period1 and period2 (YYYY-MM Format)'
+            }), 400
+        
+        if not processors.validate_timezone(timezone_str):
+            return jsonify({
+                'error': 'Timezone invalid',
+                'message': 'Please provide a valid timezone name',
+                'code': 400,
+                'timestamp': datetime.utcnow().isoformat() + 'Z'
             }), 400
         
         # validating period format
+        period_strs = periods_arg.split(',') if periods_arg else [period1, period2]
+        offsets = offsets_arg.split(',') if offsets_arg else []
         try:
-            p1_start, p1_end = processors.get_period_bounds(period1)
-            p2_start, p2_end = processors.get_period_bounds(period2)
-        except ValueError:
-            return jsonify({'error': 'Period Format Invaild，should in YYYY-MM'}), 400
-        
-        # Quering the data between two periods
-        conn = database.get_connection()
-        query = '''
-            SELECT 
-                CASE 
-                    WHEN DATE(processed_timestamp) BETWEEN ? AND ? THEN 'period1'
-                    WHEN DATE(processed_timestamp) BETWEEN ? AND ? THEN 'period2'
-                END as period,
-                SUM(amount) as total_sales,
-                COUNT(*) as transaction_count
-            FROM transactions
-            WHERE processed_timestamp IS NOT NULL
-            AND status = 'completed'
-            AND (DATE(processed_timestamp) BETWEEN ? AND ? 
-                 OR DATE(processed_timestamp) BETWEEN ? AND ?)
-            GROUP BY period
-        '''
-        
-        results = conn.execute(query, [
-            p1_start, p1_end, p2_start, p2_end,
-            p1_start, p1_end, p2_start, p2_end
-        ]).fetchall()
-        conn.close()
-        
-        # Processing results
-        period_data = {}
-        for row in results:
-            period_data[row[0]] = {
-                'total_sales': float(row[1]),
-                'transaction_count': int(row[2])
-            }
-        
-        # Calculating growth percentages
-        p1_sales = period_data.get('period1', {}).get('total_sales', 0)
-        p2_sales = period_data.get('period2', {}).get('total_sales', 0)
-        p1_count = period_data.get('period1', {}).get('transaction_count', 0)
-        p2_count = period_data.get('period2', {}).get('transaction_count', 0)
+            periods = processors.expand_periods(period_strs, offsets)
+        except ValueError as e:
+            return jsonify({
+                'error': 'Period Format Invalid',
+                'message': f"{e}; periods are YYYY, YYYY-Qn, YYYY-MM, YYYY-Www, YYYY-MM-DD or "
+                           "YYYY-MM-DD..YYYY-MM-DD and offsets look like -1y, -3m, -1w or -7d",
+                'code': 400,
+                'timestamp': datetime.utcnow().isoformat() + 'Z'
+            }), 400
         
-        sales_change = ((p2_sales - p1_sales) / p1_sales * 100) if p1_sales > 0 else 0
-        count_change = ((p2_count - p1_count) / p1_count * 100) if p1_count > 0 else 0
+        if len(periods) > config.COMPARE_MAX_PERIODS:
+            return jsonify({
+                'error': 'Too many periods',
+                'message': f"At most {config.COMPARE_MAX_PERIODS} periods (offset copies included) per request",
+                'code': 400,
+                'timestamp': datetime.utcnow().isoformat() + 'Z'
+            }), 400
         
-        return jsonify({
-            'period1': {
-                'start': p1_start, 'end': p1_end,
-                'total_sales': p1_sales, 'transaction_count': p1_count
-            },
-            'period2': {
-                'start': p2_start, 'end': p2_end,
-                'total_sales': p2_sales, 'transaction_count': p2_count
-            },
-            'growth': {
-                'sales_change_percent': round(sales_change, 2),
-                'transaction_change_percent': round(count_change, 2)
-            }
-        })
+        error = currency_error(currency)
+        if error:
+            return error
+        
+        filters, group_by, error = sales_breakdown()
+        if error:
+            return error
+        
+        # Quering every period from one read of the sales they cover
+        ranges = [
+            processors.local_date_range(start_date, end_date, timezone_str) for _, start_date, end_date in periods
+        ]
+        totals = queries.get_period_totals(ranges, currency, timezone_str, filters)
+        summaries = [
+            {'period': label, 'start': start_date, 'end': end_date,
+             'total_sales': round(total_sales, 2), 'transaction_count': transaction_count}
+            for (label, start_date, end_date), (total_sales, transaction_count) in zip(periods, totals)
+        ]
+        unique_customers = queries.get_unique_customers(ranges, filters)
+        if unique_customers is not None:
+            for summary, count in zip(summaries, unique_customers):
+                summary['unique_customers'] = count
+        if group_by:
+            name = dimension_name(group_by)
+            for summary, groups in zip(summaries, queries.get_period_groups(ranges, group_by, currency,
+                                                                              timezone_str, filters)):
+                summary['groups'] = [
+                    {name: value, 'total_sales': round(total_sales, 2), 'transaction_count': transaction_count}
+                    for value, total_sales, transaction_count in groups
+                ]
+        
+        if not periods_arg:
+            first, second = summaries
+            keys = ('start', 'end', 'total_sales', 'transaction_count', 'unique_customers', 'groups')
+            return jsonify(with_currency(with_breakdown({
+                'period1': {key: first[key] for key in keys if key in first},
+                'period2': {key: second[key] for key in keys if key in second},
+                'growth': period_growth(first, second)
+            }, filters, group_by), currency))
+        
+        return jsonify(with_currency(with_breakdown({
+            'timezone': timezone_str,
+            'periods': summaries,
+            'growth': [
+                {'from': before['period'], 'to': after['period'], **period_growth(before, after)}
+                for i, before in enumerate(summaries) for after in summaries[i + 1:]
+            ]
+        }, filters, group_by), currency))
         
     except Exception as e:
-        logger.error(f"Comparison of sales between two periods Error: {e}")
+        logger.error(f"Comparison of sales between periods Error: {e}")
+        return jsonify({'error': 'Server Internal Error'}), 500
+
+@app.route('/api/customers/top', methods=['GET'])
+@cached_response(start_date=None, end_date=None, timezone='UTC', by='spend', limit='10', mode='auto')
+def top_customers():
+    """
+    Customers with the highest spend (BASE_CURRENCY) or most completed transactions over a date range.
+    mode=exact sums the range's transactions, mode=approximate merges the daily top customer summaries
+    (values may overstate by up to max_error), mode=auto picks exact for ranges of a few days.
+    """
+    try:
+        start_date = request.args.get('start_date')
+        end_date = request.args.get('end_date')
+        timezone_str = request.args.get('timezone', 'UTC')
+        metric = request.args.get('by', 'spend')
+        mode = request.args.get('mode', 'auto')
+        limit = request.args.get('limit', '10')
+
+        if not start_date or not end_date:
+            return jsonify({
+                'error': 'Missing parameters',
+                'message': 'Required start_date and end_date ( In YYYY-MM-DD format)',
+                'code': 400,
+                'timestamp': datetime.utcnow().isoformat() + 'Z'
+            }), 400
+
+        if not processors.validate_date(start_date) or not processors.validate_date(end_date):
+            return jsonify({
+                'error': 'Invalid date format',
+                'message': 'start_date and end_date must be in YYYY-MM-DD format',
+                'code': 400,
+                'timestamp': datetime.utcnow().isoformat() + 'Z'
+            }), 400
+
+        if not processors.validate_timezone(timezone_str):
+            return jsonify({
+                'error': 'Timezone invalid',
+                'message': 'Please provide a valid timezone name',
+                'code': 400,
+                'timestamp': datetime.utcnow().isoformat() + 'Z'
+            }), 400
+
+        if metric not in database.TOP_CUSTOMER_METRICS or mode not in ('auto', 'exact', 'approximate'):
+            return jsonify({
+                'error': 'Invalid parameters',
+                'message': f"by must be one of {', '.join(database.TOP_CUSTOMER_METRICS)} "
+                           "and mode one of auto, exact, approximate",
+                'code': 400,
+                'timestamp': datetime.utcnow().isoformat() + 'Z'
+            }), 400
+
+        if not limit.isdigit() or not 1 <= int(limit) <= config.TOP_CUSTOMERS_SUMMARY_SIZE:
+            return jsonify({
+                'error': 'Invalid limit',
+                'message': f"limit must be a whole number from 1 to {config.TOP_CUSTOMERS_SUMMARY_SIZE}",
+                'code': 400,
+                'timestamp': datetime.utcnow().isoformat() + 'Z'
+            }), 400
+
+        start_ts, end_ts = processors.local_date_range(start_date, end_date, timezone_str)
+        exact = mode == 'exact' or (mode == 'auto' and queries.use_exact_top_customers(start_ts, end_ts))
+        customers, error_bound = queries.get_top_customers(start_ts, end_ts, metric, int(limit), exact)
+
+        def value(number):
+            return round(float(number), 2) if metric == 'spend' else int(number)
+
+        key = 'total_sales' if metric == 'spend' else 'transaction_count'
+        result = {
+            'customers': [
+                {'customer_id': customer_id, key: value(total), 'max_error': value(max_error)}
+                for customer_id, total, max_error in customers
+            ],
+            'by': metric,
+            'mode': 'exact' if exact else 'approximate',
+            'error_bound': value(error_bound),
+            'timezone': timezone_str,
+            'period': f"{start_date} To {end_date}"
+        }
+        if metric == 'spend':
+            result['currency'] = config.BASE_CURRENCY
+        return jsonify(result)
+
+    except Exception as e:
+        logger.error(f"Top Customers Error: {e}")
         return jsonify({'error': 'Server Internal Error'}), 500
 
 @app.route('/api/data-quality', methods=['GET'])
+@cached_response(start_date=None, end_date=None, timezone='UTC', category=None, currency=None, group_by=None)
 def data_quality_report():
-    """Data quality report"""
+    """
+    Data quality report. UTC date ranges and group_by are answered from the per-day quality counters;
+    category, currency or a local timezone are answered from the records' quality_issues bitmask.
+    """
     try:
+        start_date = request.args.get('start_date')
+        end_date = request.args.get('end_date')
+        timezone_str = request.args.get('timezone', 'UTC')
+        category = request.args.get('category')
+        currency = request.args.get('currency')
+        group_by = request.args.get('group_by')
+
+        if group_by is not None and group_by not in queries.QUALITY_GROUPS:
+            return jsonify({
+                'error': 'Invalid group_by',
+                'message': f"group_by must be one of: {', '.join(queries.QUALITY_GROUPS)}",
+                'code': 400,
+                'timestamp': datetime.utcnow().isoformat() + 'Z'
+            }), 400
+
+        if category or currency or timezone_str != 'UTC':
+            if group_by:
+                return jsonify({
+                    'error': 'Invalid group_by',
+                    'message': 'group_by is only available for UTC date ranges without category or currency',
+                    'code': 400,
+                    'timestamp': datetime.utcnow().isoformat() + 'Z'
+                }), 400
+            return filtered_quality_report(start_date, end_date, timezone_str, category, currency)
+
+        if start_date or end_date or group_by:
+            return counter_quality_report(start_date, end_date, group_by)
+
         quality_data, processed_count = database.get_quality_summary()
         
         if not quality_data:
@@ -295,6 +540,10 @@ def data_quality_report():
                 'duplicate_transactions': quality_data[3],
                 'out_of_order_records': quality_data[4]
             },
+            'out_of_order_lateness': {
+                'threshold_seconds': config.OUT_OF_ORDER_LATENESS_SECONDS,
+                'histogram': dict(zip(processors.LATENESS_BUCKET_LABELS, database.get_lateness_histogram()))
+            },
             'resolution_summary': resolution_summary
         })
         
@@ -302,15 +551,217 @@ def data_quality_report():
         logger.error(f"Data Quality API Error: {e}")
         return jsonify({'error': 'Server Internal Error'}), 500
 
+def reporting_currency():
+    """Reporting currency of a sales request (upper case), None to sum amounts as stored"""
+    currency = request.args.get('currency')
+    return currency.strip().upper() if currency else None
+
+def currency_error(currency):
+    """400 response for a reporting currency without FX rates, None when it can be used"""
+    currencies = processors.current_fx_rates().currencies()
+    if currency is None or currency in currencies:
+        return None
+    return jsonify({
+        'error': 'Unsupported currency',
+        'message': f"currency must be one of {', '.join(currencies)}",
+        'code': 400,
+        'timestamp': datetime.utcnow().isoformat() + 'Z'
+    }), 400
+
+def with_currency(body, currency):
+    """Sales response naming its reporting currency when one was requested"""
+    if currency:
+        body['currency'] = currency
+    return body
+
+# Filter parameters of the sales endpoints and the columns they filter
+SALES_FILTER_PARAMS = {
+    'status': 'status', 'category': 'product_category', 'transaction_currency': 'currency', 'customer_id': 'customer_id'
+}
+
+def sales_breakdown():
+    """
+    (filters, group_by column, None) of a sales request, or (None, None, 400 response) for an unknown group_by.
+    status defaults to completed ('all' keeps every status), except with group_by=status.
+    """
+    group_by = request.args.get('group_by')
+    if group_by and group_by not in queries.SALES_DIMENSIONS:
+        return None, None, (jsonify({
+            'error': 'Invalid group_by',
+            'message': f"group_by must be one of {', '.join(queries.SALES_DIMENSIONS)}",
+            'code': 400,
+            'timestamp': datetime.utcnow().isoformat() + 'Z'
+        }), 400)
+    status = request.args.get('status') or ('all' if group_by == 'status' else 'completed')
+    filters = {'status': None if status == 'all' else status}
+    for param, column in SALES_FILTER_PARAMS.items():
+        if param != 'status' and request.args.get(param):
+            filters[column] = request.args.get(param)
+    return filters, queries.SALES_DIMENSIONS.get(group_by), None
+
+def dimension_name(column):
+    """group_by name of a column, the key its values get in sales responses"""
+    return next(name for name, dimension in queries.SALES_DIMENSIONS.items() if dimension == column)
+
+def group_rows(df, bucket, group_by):
+    """
+    Sales summed per (bucket, group) as (bucket, group, total, count) rows in bucket then group order,
+    groups as text. Rows are keyed by bucket rank * groups + group rank and summed with one bincount.
+    """
+    bucket_codes, buckets = pd.factorize(df[bucket], sort=True)
+    group_codes, groups = pd.factorize(df[group_by])
+    names = np.asarray(groups).astype(str)
+    order = np.argsort(names, kind='stable')
+    rank = np.empty(len(names), dtype='int64')
+    rank[order] = np.arange(len(names))
+    keys, inverse = np.unique(bucket_codes * len(names) + rank[group_codes], return_inverse=True)
+    return pd.DataFrame({
+        bucket: buckets[keys // len(names)],
+        group_by: names[order][keys % len(names)],
+        'total': np.bincount(inverse, weights=np.nan_to_num(df['amount'].to_numpy('float64'))),
+        'count': np.bincount(inverse, weights=df['transaction_count'].to_numpy('float64')).astype('int64'),
+    })
+
+def with_breakdown(body, filters, group_by, rows=None):
+    """
+    Sales response naming its filters and group_by when they differ from completed sales of every group,
+    with each group's totals (largest sales first) when rows holds the group_rows() of the response
+    (an empty list for an empty response)
+    """
+    if filters != queries.DEFAULT_SALES_FILTERS or group_by:
+        body['filters'] = {param: filters.get(column) for param, column in SALES_FILTER_PARAMS.items()}
+        body['filters']['status'] = body['filters']['status'] or 'all'
+    if not group_by:
+        return body
+    name = body['group_by'] = dimension_name(group_by)
+    if isinstance(rows, list):
+        body['groups'] = rows
+    elif rows is not None:
+        codes, names = pd.factorize(rows[group_by])
+        totals = np.bincount(codes, weights=rows['total'].to_numpy('float64'))
+        counts = np.bincount(codes, weights=rows['count'].to_numpy('float64'))
+        body['groups'] = [
+            {name: names[i], 'total_sales': round(float(totals[i]), 2), 'transaction_count': int(counts[i])}
+            for i in np.lexsort((np.asarray(names), -totals))
+        ]
+    return body
+
+def period_growth(before, after):
+    """Sales and transaction change from one period summary to another, in percent (0 from an empty period)"""
+    sales_change = ((after['total_sales'] - before['total_sales']) / before['total_sales'] * 100
+                    if before['total_sales'] > 0 else 0)
+    count_change = ((after['transaction_count'] - before['transaction_count']) / before['transaction_count'] * 100
+                    if before['transaction_count'] > 0 else 0)
+    return {'sales_change_percent': round(sales_change, 2), 'transaction_change_percent': round(count_change, 2)}
+
+def quality_range_error(start_date, end_date):
+    """400 response for an incomplete or malformed start_date/end_date pair, None when usable"""
+    if bool(start_date) != bool(end_date):
+        return jsonify({
+            'error': 'Missing parameters',
+            'message': 'start_date and end_date must be given together (YYYY-MM-DD format)',
+            'code': 400,
+            'timestamp': datetime.utcnow().isoformat() + 'Z'
+        }), 400
+
+    if start_date and (not processors.validate_date(start_date) or not processors.validate_date(end_date)):
+        return jsonify({
+            'error': 'Invalid date format',
+            'message': 'start_date and end_date must be in YYYY-MM-DD format',
+            'code': 400,
+            'timestamp': datetime.utcnow().isoformat() + 'Z'
+        }), 400
+    return None
+
+def filtered_quality_report(start_date, end_date, timezone_str, category, currency):
+    """Issues of the stored records matching the filters, counted from the quality_issues bitmask"""
+    error = quality_range_error(start_date, end_date)
+    if error:
+        return error
+
+    if not processors.validate_timezone(timezone_str):
+        return jsonify({
+            'error': 'Timezone invalid',
+            'message': 'Please provide a valid timezone name',
+            'code': 400,
+            'timestamp': datetime.utcnow().isoformat() + 'Z'
+        }), 400
+
+    start_ts, end_ts = processors.local_date_range(start_date, end_date, timezone_str) if start_date else (None, None)
+    total_records, records_with_issues, issue_counts = queries.get_issue_counts(start_ts, end_ts, category, currency)
+
+    return jsonify({
+        'filters': {
+            'start_date': start_date, 'end_date': end_date, 'timezone': timezone_str,
+            'category': category, 'currency': currency
+        },
+        'total_records': total_records,
+        'records_with_issues': records_with_issues,
+        'issues_found': issue_counts
+    })
+
+def counter_quality_report(start_date, end_date, group_by):
+    """Quality counts of a UTC date range (or of everything ingested), summed from quality_counters_daily"""
+    error = quality_range_error(start_date, end_date)
+    if error:
+        return error
+
+    start_ts, end_ts = processors.local_date_range(start_date, end_date, 'UTC') if start_date else (None, None)
+
+    def report(counts):
+        return {
+            'total_records': counts['total_records'],
+            'issues_found': {name: count for name, count in counts.items() if name != 'total_records'}
+        }
+
+    result = {
+        'filters': {'start_date': start_date, 'end_date': end_date, 'timezone': 'UTC', 'group_by': group_by},
+        # Counters recounted from the stored rows of a database loaded before they were kept: no duplicates
+        'backfilled': queries.has_backfilled_counters(start_ts, end_ts)
+    }
+    if group_by is None:
+        (_, counts), = queries.get_quality_counters(start_ts, end_ts)
+        result.update(report(counts))
+    else:
+        groups = queries.get_quality_counters(start_ts, end_ts, group_by)
+        totals = dict.fromkeys(database.QUALITY_COUNTER_COLUMNS, 0)
+        result['groups'] = []
+        for group, counts in groups:
+            for name, count in counts.items():
+                totals[name] += count
+            if group_by == 'day':
+                label = {'date': None if group == database.UNDATED_DAY
+                         else datetime.utcfromtimestamp(group).strftime('%Y-%m-%d')}
+            else:
+                label = {'batch_id': group[0], 'mode': group[1], 'finished_at': group[2]}
+            result['groups'].append(dict(label, **report(counts)))
+        result.update(report(totals))
+    return jsonify(result)
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
+    database_available = database.database_exists()
     return jsonify({
         'status': 'Normal',
         'timestamp': datetime.utcnow().isoformat(),
-        'database_available': database.database_exists()
+        'database_available': database_available,
+        'database_healthy': database_available and database.get_pool().health_check()
     })
 
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    """Response cache, connection pool and processor cache metrics (plus the ASGI thread pool when served by asgi.py)"""
+    result = {
+        'data_generation': database.get_data_generation(),
+        'response_cache': dict(response_cache.stats(), not_modified=not_modified_count),
+        'connection_pool': database.get_pool().stats(),
+        'processor_caches': processors.cache_stats()
+    }
+    if 'asgi' in app.extensions:
+        result['asgi'] = app.extensions['asgi'].stats()
+    return jsonify(result)
+
 # ---------------- Error Handling ----------------
 
 @app.errorhandler(404)
@@ -323,21 +774,30 @@ def internal_error(error):
 
 # ---------------- Main Application ----------------
 
+def prepare_database():
+    """Bringing the schema and the columnar store up to date before serving (ingest runs separately)"""
+    if not database.database_exists():
+        raise RuntimeError("Cannot find database file, please run 'python setup_db.py' first")
+    database.ensure_schema()
+    migrated_paths.add(database.DB_PATH)
+    columnar.ensure_store()
+
 if __name__ == '__main__':
     # Check if database exists
     if not database.database_exists():
         logger.error("Cannot find database file, please run 'python setup_db.py' first")
         exit(1)
     
-    # Check if there are processed transactions
+    # Bring the schema up to date and check if there are processed transactions
+    database.ensure_schema()
     if database.get_transaction_count() == 0:
         logger.info("No processed transactions found, starting to process CSV...")
         processors.process_csv_data()
+    columnar.ensure_store()
 
     logger.info("Starting E-commerce Analytics API")
     logger.info(f"API Address: http://{config.HOST}:{config.PORT}")
     logger.info(f"Health Check: http://{config.HOST}:{config.PORT}/health")
     
-    app.json.sort_keys = False
     app.run(debug=config.DEBUG, host=config.HOST, port=config.PORT)
     
\ No newline at end of file
@@ -0,0 +1,226 @@
+"""
+ASGI entry point for the analytics API.
+
+Usage: uvicorn asgi:application --app-dir app --host 0.0.0.0 --port 5000
+   or: python app/asgi.py
+
+Requests are accepted on the event loop and the Flask views of app.py run in a bounded thread pool,
+so the routes and JSON responses are exactly those of the Flask server while a burst of requests
+costs waiting coroutines instead of blocked server threads.
+"""
+
+import asyncio
+import io
+import json
+import logging
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+# Importing self-defined modules
+import config
+import database
+import processors
+from app import app as flask_app, prepare_database
+
+logger = logging.getLogger(__name__)
+
+# ---------------- WSGI Bridge ----------------
+
+def wsgi_environ(scope, body):
+    """WSGI environ of an ASGI HTTP scope and its request body"""
+    server_name, server_port = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server_name,
+        'SERVER_PORT': str(server_port),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': (scope.get('client') or ('', 0))[0],
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', []):
+        name, value = name.decode('latin-1'), value.decode('latin-1')
+        if name == 'content-length':
+            continue
+        if name == 'content-type':
+            environ['CONTENT_TYPE'] = value
+            continue
+        key = 'HTTP_' + name.upper().replace('-', '_')
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+def call_wsgi(wsgi_app, environ):
+    """Running a WSGI app to completion: (status code, ASGI headers, body)"""
+    response = {}
+
+    def start_response(status, headers, exc_info=None):
+        response['status'] = int(status.split(' ', 1)[0])
+        response['headers'] = [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+
+    chunks = wsgi_app(environ, start_response)
+    try:
+        body = b''.join(chunks)
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+    return response['status'], response['headers'], body
+
+def error_response(status, error, message):
+    """Response in the API's error format"""
+    body = json.dumps({
+        'error': error,
+        'message': message,
+        'code': status,
+        'timestamp': datetime.utcnow().isoformat() + 'Z'
+    }).encode('utf-8')
+    return status, [(b'content-type', b'application/json')], body
+
+# ---------------- ASGI Application ----------------
+
+class ThreadPoolASGI:
+    """
+    ASGI adapter running a WSGI app in a bounded thread pool.
+    At most max_pending requests are admitted at once (running or waiting for a thread); later ones
+    get 503 with Retry-After straight away. A request not answered within timeout_seconds gets 504;
+    its view still finishes in its thread and keeps its admission slot until then, so slow queries
+    cannot pile up behind the timeout.
+    """
+
+    def __init__(self, wsgi_app, threads=config.ASGI_THREADS, max_pending=config.ASGI_MAX_PENDING,
+                 timeout_seconds=config.ASGI_REQUEST_TIMEOUT_SECONDS, startup=None):
+        self.wsgi_app = wsgi_app
+        self.threads = threads
+        self.max_pending = max_pending
+        self.timeout_seconds = timeout_seconds
+        self.startup = startup
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='asgi')
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self.handle(scope, receive, send)
+
+    async def handle(self, scope, receive, send):
+        if not self._admit():
+            status, headers, body = error_response(
+                503, 'Server busy', f"More than {self.max_pending} requests in progress, please retry"
+            )
+            await self._send(send, status, headers + [(b'retry-after', b'1')], body)
+            return
+
+        loop = asyncio.get_running_loop()
+        try:
+            environ = wsgi_environ(scope, await self._read_body(receive))
+            future = loop.run_in_executor(self.executor, call_wsgi, self.wsgi_app, environ)
+        except BaseException:
+            self._release()
+            raise
+        future.add_done_callback(lambda _: self._release(completed=True))
+        try:
+            # shield keeps the view running (and its slot taken) when the wait is abandoned
+            status, headers, body = await asyncio.wait_for(asyncio.shield(future), self.timeout_seconds)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self.timed_out += 1
+            status, headers, body = error_response(
+                504, 'Request timed out', f"No response within {self.timeout_seconds} seconds"
+            )
+        await self._send(send, status, headers, body)
+
+    async def lifespan(self, receive, send):
+        """Running the startup hook in the pool before traffic is accepted, closing the pool on shutdown"""
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    if self.startup is not None:
+                        await asyncio.get_running_loop().run_in_executor(self.executor, self.startup)
+                except Exception as e:
+                    logger.error(f"ASGI startup failed: {e}")
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=True)
+                database.close_pools()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def stats(self):
+        with self._lock:
+            return {
+                'threads': self.threads,
+                'max_pending': self.max_pending,
+                'timeout_seconds': self.timeout_seconds,
+                'pending': self.pending,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'timed_out': self.timed_out,
+            }
+
+    def _admit(self):
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                return False
+            self.pending += 1
+            return True
+
+    def _release(self, completed=False):
+        with self._lock:
+            self.pending -= 1
+            self.completed += completed
+
+    @staticmethod
+    async def _read_body(receive):
+        body = b''
+        while True:
+            message = await receive()
+            body += message.get('body', b'')
+            if not message.get('more_body', False):
+                return body
+
+    @staticmethod
+    async def _send(send, status, headers, body):
+        headers = [(name, value) for name, value in headers if name != b'content-length']
+        headers.append((b'content-length', str(len(body)).encode('latin-1')))
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': body})
+
+def start_server():
+    """Startup hook: preparing the database; this process only serves, ingest runs separately"""
+    processors.INGEST_DISABLED = 'ASGI server'
+    prepare_database()
+
+application = ThreadPoolASGI(flask_app, startup=start_server)
+flask_app.extensions['asgi'] = application
+
+# ---------------- Main Application ----------------
+
+if __name__ == '__main__':
+    try:
+        import uvicorn
+    except ImportError:
+        logger.error("uvicorn is not installed, please run 'pip install uvicorn'")
+        sys.exit(1)
+
+    logging.basicConfig(level=logging.INFO)
+    logger.info(f"Starting E-commerce Analytics API (ASGI) on http://{config.HOST}:{config.PORT}")
+    uvicorn.run(application, host=config.HOST, port=config.PORT, lifespan='on')
@@ -0,0 +1,261 @@
+import os
+import json
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+import config
+import database
+
+# pyarrow is optional, without it the endpoints keep reading SQLite
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+# ---------------- Columnar Store ----------------
+# Copy of the columns the sales endpoints read, one Arrow IPC file per UTC day sorted by processed_ts.
+# Files are uncompressed so a memory-mapped read hands out the column buffers without copying them.
+# _manifest.json records the data generation the files were written at; readers fall back to SQLite
+# whenever it differs from the database's, so the store can never answer with older data.
+
+DAY_SECONDS = 86400
+MANIFEST_NAME = '_manifest.json'
+DICTIONARY_COLUMNS = ('status', 'currency', 'product_category')
+MAX_OPEN_PARTITIONS = 256
+
+EXPORT_SQL = '''
+    SELECT processed_ts, amount, amount_base, status, currency, product_category
+    FROM transactions
+    WHERE processed_ts >= ? AND processed_ts < ?
+    ORDER BY processed_ts
+'''
+
+_open_partitions = OrderedDict()  # path -> (mtime_ns, table), least recently used first
+_manifest_cache = {}  # path -> (mtime_ns, manifest)
+
+def is_enabled():
+    """Checking if the columnar store can be used"""
+    return pa is not None and config.USE_COLUMNAR_STORE
+
+def store_dir():
+    """Directory of the store, by default a 'columnar' folder next to the database"""
+    return config.COLUMNAR_DIR or os.path.join(os.path.dirname(os.path.abspath(database.DB_PATH)), 'columnar')
+
+def partition_name(day):
+    """File name of a UTC day given as days since the epoch"""
+    return f"day={pd.Timestamp(day * DAY_SECONDS, unit='s').strftime('%Y-%m-%d')}.arrow"
+
+def _replace_file(path, write):
+    """Writing a file next to its destination and moving it into place"""
+    tmp_path = path + '.tmp'
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+def _to_table(frame):
+    """Arrow table with int64 timestamps and dictionary-encoded text columns"""
+    columns = {
+        'processed_ts': pa.array(frame['processed_ts'].to_numpy('int64')),
+        'amount': pa.array(frame['amount'].to_numpy('float64')),
+        'amount_base': pa.array(frame['amount_base'].to_numpy('float64', na_value=np.nan)),
+    }
+    for name in DICTIONARY_COLUMNS:
+        columns[name] = pa.array(frame[name], pa.string()).dictionary_encode()
+    return pa.table(columns)
+
+def write_partition(directory, day, frame):
+    """Writing one day of rows as a single record batch"""
+    table = _to_table(frame)
+
+    def write(path):
+        with pa.OSFile(path, 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table, max_chunksize=max(len(table), 1))
+
+    _replace_file(os.path.join(directory, partition_name(day)), write)
+
+def read_manifest(directory=None):
+    """Manifest of the store, or None when it has not been written"""
+    path = os.path.join(directory or store_dir(), MANIFEST_NAME)
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    cached = _manifest_cache.get(path)
+    if cached is None or cached[0] != mtime_ns:
+        with open(path) as f:
+            cached = _manifest_cache[path] = (mtime_ns, json.load(f))
+    return cached[1]
+
+def write_manifest(directory, days):
+    """Recording the stored days and the data generation they match"""
+    manifest = {'generation': database.get_data_generation(), 'days': sorted(days)}
+
+    def write(path):
+        with open(path, 'w') as f:
+            json.dump(manifest, f)
+
+    _replace_file(os.path.join(directory, MANIFEST_NAME), write)
+
+def rebuild_store():
+    """Rewriting every partition from the transactions table"""
+    if not is_enabled():
+        return
+    directory = store_dir()
+    os.makedirs(directory, exist_ok=True)
+    days = set()
+    conn = database.get_connection()
+    # Streaming the table in processed_ts order and writing each day once it is complete
+    pending = None
+    for chunk in pd.read_sql_query(EXPORT_SQL, conn, params=[np.iinfo('int64').min, np.iinfo('int64').max],
+                                   chunksize=200000):
+        pending = chunk if pending is None else pd.concat([pending, chunk], ignore_index=True)
+        day_numbers = pending['processed_ts'].to_numpy() // DAY_SECONDS
+        last_day = day_numbers[-1]
+        for day, frame in pending[day_numbers < last_day].groupby(day_numbers[day_numbers < last_day]):
+            write_partition(directory, int(day), frame)
+            days.add(int(day))
+        pending = pending[day_numbers == last_day]
+    if pending is not None and len(pending):
+        day = int(pending['processed_ts'].iloc[0] // DAY_SECONDS)
+        write_partition(directory, day, pending)
+        days.add(day)
+    conn.close()
+
+    for name in os.listdir(directory):
+        if name.startswith('day=') and name not in {partition_name(day) for day in days}:
+            os.remove(os.path.join(directory, name))
+    write_manifest(directory, days)
+
+def refresh_store(hours):
+    """Rewriting the partitions of the UTC days containing the given hours (epoch seconds)"""
+    if not is_enabled():
+        return
+    directory = store_dir()
+    manifest = read_manifest(directory)
+    days = set(manifest['days'])
+    conn = database.get_connection()
+    for day in sorted({hour // DAY_SECONDS for hour in hours}):
+        frame = pd.read_sql_query(EXPORT_SQL, conn, params=[day * DAY_SECONDS, (day + 1) * DAY_SECONDS])
+        path = os.path.join(directory, partition_name(day))
+        if len(frame):
+            write_partition(directory, day, frame)
+            days.add(day)
+        elif os.path.exists(path):
+            os.remove(path)
+            days.discard(day)
+    conn.close()
+    write_manifest(directory, days)
+
+def sync_store(previous_generation, hours=None):
+    """
+    Bringing the store up to date after an ingest.
+    Only the touched days are rewritten when the store matched the database before the ingest
+    (previous_generation); otherwise, or when hours is None, the whole store is rebuilt.
+    """
+    if not is_enabled():
+        return
+    manifest = read_manifest()
+    if hours is not None and manifest is not None and manifest['generation'] == previous_generation:
+        refresh_store(hours)
+    else:
+        rebuild_store()
+
+def ensure_store():
+    """Rebuilding the store when it is missing or older than the database"""
+    manifest = read_manifest() if is_enabled() else None
+    if is_enabled() and (manifest is None or manifest['generation'] != database.get_data_generation()):
+        rebuild_store()
+
+def open_partition(path):
+    """Memory-mapped table of a partition file, kept open while the file is unchanged"""
+    mtime_ns = os.stat(path).st_mtime_ns
+    cached = _open_partitions.get(path)
+    if cached is not None and cached[0] == mtime_ns:
+        _open_partitions.move_to_end(path)
+        return cached[1]
+    table = pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+    _open_partitions[path] = (mtime_ns, table)
+    _open_partitions.move_to_end(path)
+    while len(_open_partitions) > MAX_OPEN_PARTITIONS:
+        _open_partitions.popitem(last=False)
+    return table
+
+def _column(table, name):
+    """Single array of a column (zero-copy for the single-batch files written here)"""
+    column = table.column(name)
+    return column.chunk(0) if column.num_chunks == 1 else column.combine_chunks()
+
+def _sum_buckets(ts, codes, amounts, base_amounts, bucket_seconds, group_count):
+    """(bucket_ts, amount, amount_base, code, count) arrays of the non-empty (bucket, group) pairs of one partition"""
+    first = ts[0] - ts[0] % bucket_seconds
+    keys = (ts - first) // bucket_seconds * group_count + codes
+    counts = np.bincount(keys)
+    present = np.flatnonzero(counts)
+    return (first + present // group_count * bucket_seconds, np.bincount(keys, weights=amounts)[present],
+            np.bincount(keys, weights=np.nan_to_num(base_amounts))[present], present % group_count, counts[present])
+
+def read_sales(start_ts, end_ts, filters=None, group_by=None, bucket_seconds=None):
+    """
+    Sales in [start_ts, end_ts) as (processed_ts, amount, amount_base, transaction_count) rows, plus the
+    group_by column (categorical) when given, reading only the partitions of the UTC days the range overlaps.
+    filters maps DICTIONARY_COLUMNS to a required value (None keeps every value), by default completed sales.
+    Grouped rows are summed per bucket_seconds bucket and group when it is given, otherwise one row per sale.
+    None when the store is disabled, does not match the database or does not hold a filtered column.
+    """
+    filters = {'status': 'completed'} if filters is None else filters
+    stored = all(name in DICTIONARY_COLUMNS for name, value in filters.items() if value is not None)
+    if not is_enabled() or not stored or group_by not in (None, *DICTIONARY_COLUMNS):
+        return None
+    directory = store_dir()
+    manifest = read_manifest(directory)
+    if manifest is None or manifest['generation'] != database.get_data_generation():
+        return None
+
+    stored_days = set(manifest['days'])
+    timestamps, amounts, base_amounts, counts, groups = [], [], [], [], []
+    for day in range(start_ts // DAY_SECONDS, (end_ts - 1) // DAY_SECONDS + 1):
+        if day not in stored_days:
+            continue
+        table = open_partition(os.path.join(directory, partition_name(day)))
+        ts = _column(table, 'processed_ts').to_numpy()
+        lo, hi = np.searchsorted(ts, [start_ts, end_ts])
+        if lo == hi:
+            continue
+        mask = np.ones(hi - lo, dtype=bool)
+        for name, value in filters.items():
+            if value is None:
+                continue
+            column = _column(table, name).slice(lo, hi - lo)
+            code = column.dictionary.index(value).as_py()
+            if code < 0:
+                mask[:] = False
+                break
+            mask &= column.indices.to_numpy(zero_copy_only=False) == code
+        if not mask.any():
+            continue
+        columns = (ts[lo:hi][mask], _column(table, 'amount').to_numpy()[lo:hi][mask],
+                   _column(table, 'amount_base').to_numpy()[lo:hi][mask])
+        if group_by:
+            column = _column(table, group_by).slice(lo, hi - lo)
+            codes = column.indices.to_numpy(zero_copy_only=False)[mask].astype('int64')
+            if bucket_seconds:
+                *columns, codes, count = _sum_buckets(columns[0], codes, columns[1], columns[2], bucket_seconds,
+                                                     len(column.dictionary))
+                counts.append(count)
+            groups.append(pd.Categorical.from_codes(codes, column.dictionary.to_pylist()))
+        timestamps.append(columns[0])
+        amounts.append(columns[1])
+        base_amounts.append(columns[2])
+
+    processed_ts = np.concatenate(timestamps) if timestamps else np.array([], dtype='int64')
+    frame = {'processed_ts': processed_ts}
+    if group_by:
+        frame[group_by] = union_categoricals(groups) if groups else pd.Categorical([])
+    frame.update({
+        'amount': np.concatenate(amounts) if amounts else np.array([], dtype='float64'),
+        'amount_base': np.concatenate(base_amounts) if base_amounts else np.array([], dtype='float64'),
+        'transaction_count': np.concatenate(counts) if counts else np.ones(len(processed_ts), dtype='int64'),
+    })
+    return pd.DataFrame(frame)
@@ -1,12 +1,58 @@
 # Database Configuration
 DB_PATH = 'data/ecommerce.db'
 CSV_PATH = 'data/transactions.csv'
+DB_POOL_SIZE = 8  # Read-only connections kept open for the API
+DB_POOL_TIMEOUT_SECONDS = 5  # Longest wait for a free pooled connection before the request fails
+DB_POOL_HEALTH_CHECK_SECONDS = 30  # Pooled connections idle this long are pinged before reuse
+DB_MMAP_SIZE = 268435456  # Bytes of the database file memory-mapped by each read-only connection
 
 # API Settings
 HOST = '0.0.0.0'
 PORT = 5000
 DEBUG = True
 
+# ASGI Settings (app/asgi.py)
+ASGI_THREADS = 8  # Threads running the views, matching DB_POOL_SIZE so none waits for a connection
+ASGI_MAX_PENDING = 64  # Requests admitted at once (running or waiting for a thread); later ones get 503
+ASGI_REQUEST_TIMEOUT_SECONDS = 10  # Requests not answered in time get 504
+
+# WSGI Settings (gunicorn -c app/gunicorn.conf.py)
+WSGI_WORKERS = None  # Pre-forked worker processes, None uses 2 * cores + 1
+WSGI_PIDFILE = 'data/gunicorn.pid'  # Master pid; HUP reloads the workers after an ingest
+WSGI_GRACEFUL_TIMEOUT_SECONDS = 30  # Old workers get this long to finish their requests on reload
+WARM_TIMEZONES = ('UTC', 'America/New_York', 'America/Los_Angeles', 'Europe/London', 'Asia/Tokyo')
+WARM_DAYS = 31  # Days up to the newest transaction requested per warm timezone before a worker serves
+
 # Business Logic Constants
 DUPLICATE_TIME_SECONDS = 60  # Duplicate time threshold in seconds
-DEFAULT_TIMEZONE = 'UTC'
\ No newline at end of file
+DEFAULT_TIMEZONE = 'UTC'
+
+# Ingest Settings
+INGEST_MODES = ('full', 'streaming', 'incremental', 'parallel')
+INGEST_MODE = 'full'  # 'full', 'streaming' (chunked commits), 'incremental' (appended rows) or 'parallel' (worker processes)
+INGEST_CHUNK_SIZE = 50000  # Rows per chunk in streaming mode
+INGEST_WORKERS = None  # Worker processes in parallel mode, None uses every core
+STREAM_DEDUP_HORIZON_SECONDS = None  # Forget dedup state this far behind the newest row; None keeps all (exact, as 'full')
+OUT_OF_ORDER_LATENESS_SECONDS = 3600  # Rows this far behind the newest event time earlier in the file count as out of order
+QUALITY_FLAGS_JSON = True  # Also write the data_quality_flags JSON detail (issues are always in the quality_issues bitmask)
+
+# Currency Settings
+BASE_CURRENCY = 'USD'  # Currency of the stored amount_base column; fx_rates hold units of it per unit of a currency
+FX_RATES_PATH = 'data/fx_rates.csv'  # Daily rates (date,currency,rate), loaded into an empty rate table by ensure_schema() or ingest.py --fx-rates
+
+# Analytics Settings
+USE_SALES_ROLLUP = True  # Answer whole-hour timezone queries from sales_rollup_hourly instead of raw rows
+USE_COLUMNAR_STORE = True  # Write and read the Arrow columnar copy of the sales columns (needs pyarrow)
+COLUMNAR_DIR = None  # Directory of the columnar store, None puts it in 'columnar' next to DB_PATH
+COMPARE_MAX_PERIODS = 48  # Periods (offset copies included) one /api/sales/compare request may ask for
+TOP_CUSTOMERS_SUMMARY_SIZE = 100  # Customers kept per UTC day and metric in customer_topk_daily (also the largest limit)
+TOP_CUSTOMERS_EXACT_MAX_DAYS = 7  # /api/customers/top ranks ranges up to this many days exactly from transactions
+
+# Response Cache Settings
+RESPONSE_CACHE_MAX_ENTRIES = 1024  # Least recently used responses are evicted beyond this (0 disables the cache)
+RESPONSE_CACHE_TTL_SECONDS = 300  # Entries older than this are recomputed even if the data has not changed
+
+# Processor Cache Settings (0 disables a cache)
+TIMEZONE_CACHE_MAX_ENTRIES = 1024  # Resolved pytz zones, including unknown names
+TIMESTAMP_FORMAT_CACHE_MAX_ENTRIES = 256  # Timestamp shapes per source mapped to their strptime format
+TIMESTAMP_MEMO_MAX_ENTRIES = 0  # (timestamp, timezone) -> UTC epoch memo for feeds that repeat values
@@ -1,51 +1,764 @@
 import sqlite3
+import json
+import csv
 import os
-from config import DB_PATH
+import hashlib
+import time
+import atexit
+import threading
+from contextlib import contextmanager
+from urllib.parse import quote
+from datetime import datetime, timezone
+from config import (
+    DB_PATH, DB_POOL_SIZE, DB_POOL_TIMEOUT_SECONDS, DB_POOL_HEALTH_CHECK_SECONDS, DB_MMAP_SIZE,
+    BASE_CURRENCY, FX_RATES_PATH, TOP_CUSTOMERS_SUMMARY_SIZE
+)
 
 def get_connection():
-    """Obtaining database path"""
+    """Obtaining a read-write connection (ingest and schema changes)"""
     return sqlite3.connect(DB_PATH)
 
+# ---------------- Connection Pool ----------------
+# Read-only connections shared by the API. Each one stays open across requests, keeping its parsed
+# schema and page cache warm; a thread gets back the connection it used last when that one is idle.
+
+READ_ONLY_PRAGMAS = (
+    'PRAGMA query_only=ON',
+    f'PRAGMA mmap_size={DB_MMAP_SIZE}',
+)
+
+class ConnectionPool:
+    """
+    Bounded pool of read-only connections to one database file.
+    Connections open with a mode=ro shared-cache URI; acquire() waits up to timeout seconds when all
+    max_size connections are in use. Connections idle longer than health_check_seconds are pinged
+    before reuse, and a forked worker drops the connections it inherited instead of sharing them.
+    """
+
+    def __init__(self, db_path, max_size=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT_SECONDS,
+                 health_check_seconds=DB_POOL_HEALTH_CHECK_SECONDS):
+        self.db_path = db_path
+        self.uri = f"file:{quote(os.path.abspath(db_path))}?mode=ro&cache=shared"
+        self.max_size = max_size
+        self.timeout = timeout
+        self.health_check_seconds = health_check_seconds
+        self._cond = threading.Condition()
+        self._local = threading.local()
+        self._reset()
+        self.acquisitions = 0
+        self.waits = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.health_check_failures = 0
+
+    def _reset(self):
+        self.pid = os.getpid()
+        self._idle = []  # (connection, last released at), most recently released last
+        self._size = 0
+        self.closed = False
+
+    def _connect(self):
+        conn = sqlite3.connect(self.uri, uri=True, check_same_thread=False)
+        for pragma in READ_ONLY_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def _is_healthy(self, conn):
+        try:
+            conn.execute('SELECT 1').fetchone()
+            return True
+        except sqlite3.Error:
+            self.health_check_failures += 1
+            return False
+
+    def _take_idle(self):
+        """Idle connection to reuse, preferring the one this thread used last"""
+        preferred = getattr(self._local, 'conn', None)
+        for i in range(len(self._idle) - 1, -1, -1):
+            if self._idle[i][0] is preferred:
+                return self._idle.pop(i)
+        return self._idle.pop()
+
+    def acquire(self):
+        """Checking out a connection, opening one while below max_size"""
+        started = time.monotonic()
+        with self._cond:
+            if self.pid != os.getpid():
+                # Connections inherited across fork belong to the parent and must not be used or closed here
+                self._reset()
+            if self.closed:
+                raise sqlite3.ProgrammingError('Connection pool is closed')
+            waited = False
+            while not self._idle and self._size >= self.max_size:
+                waited = True
+                remaining = self.timeout - (time.monotonic() - started)
+                if remaining <= 0 or not self._cond.wait(remaining):
+                    if not self._idle and self._size >= self.max_size:
+                        self.timeouts += 1
+                        raise sqlite3.OperationalError(
+                            f"No database connection available after {self.timeout}s (pool size {self.max_size})"
+                        )
+            if self._idle:
+                conn, released_at = self._take_idle()
+                if time.monotonic() - released_at >= self.health_check_seconds and not self._is_healthy(conn):
+                    # Replacing a broken connection keeps its slot
+                    conn.close()
+                    conn = self._connect()
+            else:
+                conn = self._connect()
+                self._size += 1
+
+            waited_seconds = time.monotonic() - started
+            self.acquisitions += 1
+            if waited:
+                self.waits += 1
+                self.wait_seconds_total += waited_seconds
+                self.wait_seconds_max = max(self.wait_seconds_max, waited_seconds)
+        self._local.conn = conn
+        return conn
+
+    def release(self, conn):
+        """Returning a connection, closing it instead when the pool was closed or forked meanwhile"""
+        with self._cond:
+            if conn.in_transaction:
+                conn.rollback()
+            if self.closed or self.pid != os.getpid():
+                conn.close()
+                return
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def discard(self, conn):
+        """Closing a broken connection and freeing its slot"""
+        with self._cond:
+            conn.close()
+            if self.pid == os.getpid():
+                self._size -= 1
+                self._cond.notify()
+
+    def health_check(self):
+        """Pinging idle connections, closing the broken ones; True when the database answers"""
+        with self._cond:
+            healthy = []
+            for conn, released_at in self._idle:
+                if self._is_healthy(conn):
+                    healthy.append((conn, released_at))
+                else:
+                    conn.close()
+                    self._size -= 1
+            self._idle = healthy
+        try:
+            with self.connection() as conn:
+                return self._is_healthy(conn)
+        except sqlite3.Error:
+            return False
+
+    def close(self):
+        """Closing idle connections; connections in use are closed when released"""
+        with self._cond:
+            if self.pid == os.getpid():
+                for conn, _ in self._idle:
+                    conn.close()
+            self._idle = []
+            self.closed = True
+            self._cond.notify_all()
+
+    @contextmanager
+    def connection(self):
+        """Connection checked out for the duration of a with block"""
+        conn = self.acquire()
+        try:
+            yield conn
+        except sqlite3.DatabaseError:
+            if self._is_healthy(conn):
+                self.release(conn)
+            else:
+                self.discard(conn)
+            raise
+        except BaseException:
+            self.release(conn)
+            raise
+        else:
+            self.release(conn)
+
+    def stats(self):
+        """Counters for the metrics endpoint"""
+        with self._cond:
+            return {
+                'db_path': self.db_path,
+                'max_size': self.max_size,
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+                'acquisitions': self.acquisitions,
+                'waits': self.waits,
+                'timeouts': self.timeouts,
+                'wait_ms_total': round(self.wait_seconds_total * 1000, 3),
+                'wait_ms_max': round(self.wait_seconds_max * 1000, 3),
+                'health_check_failures': self.health_check_failures
+            }
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_pool():
+    """Connection pool of the current DB_PATH"""
+    pool = _pools.get(DB_PATH)
+    if pool is None or pool.closed:
+        with _pools_lock:
+            pool = _pools.get(DB_PATH)
+            if pool is None or pool.closed:
+                pool = _pools[DB_PATH] = ConnectionPool(DB_PATH)
+    return pool
+
+def read_connection():
+    """Pooled read-only connection, used as `with read_connection() as conn:`"""
+    return get_pool().connection()
+
+@atexit.register
+def close_pools():
+    """Closing every connection pool (process shutdown and tests)"""
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
+
 def database_exists():
     """Checking if the database file exists""" 
     return os.path.exists(DB_PATH)
 
 def get_transaction_count():
     """Obtaining the count of processed transactions"""
-    conn = get_connection()
-    count = conn.execute('SELECT COUNT(*) FROM transactions').fetchone()[0]
-    conn.close()
-    return count
+    with read_connection() as conn:
+        return conn.execute('SELECT COUNT(*) FROM transactions').fetchone()[0]
 
 def clear_transactions():
     """Clearing existing transaction data"""
     conn = get_connection()
     conn.execute('DELETE FROM transactions')
+    bump_data_generation(conn)
     conn.commit()
     conn.close()
 
-def insert_many_transactions(records):
-    """Inserting multiple transaction records"""
+# ---------------- Schema ----------------
+# Tables and indexes added after setup_db.py, created on demand by ensure_schema()
+SCHEMA_MIGRATIONS = (
+    '''
+    CREATE TABLE IF NOT EXISTS ingest_state (
+        source_path TEXT PRIMARY KEY,
+        byte_offset INTEGER NOT NULL,
+        row_count INTEGER NOT NULL,
+        fingerprint TEXT NOT NULL,
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS sales_rollup_hourly (
+        hour_ts INTEGER NOT NULL,  -- Start of the UTC hour, epoch seconds
+        status TEXT NOT NULL,
+        currency TEXT NOT NULL,
+        product_category TEXT NOT NULL,
+        total_amount REAL NOT NULL,
+        total_amount_base REAL,  -- SUM(amount_base), NULL when no row of the group has a rate
+        transaction_count INTEGER NOT NULL,
+        min_amount REAL NOT NULL,
+        max_amount REAL NOT NULL,
+        PRIMARY KEY (hour_ts, status, currency, product_category)
+    ) WITHOUT ROWID
+    ''',
+    # Covers the sales endpoints' reads of one status, which would otherwise visit every status of each hour
+    '''
+    CREATE INDEX IF NOT EXISTS idx_rollup_status_hour ON sales_rollup_hourly(
+        status, hour_ts, product_category, currency, total_amount, total_amount_base, transaction_count
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS customer_topk_daily (
+        metric TEXT NOT NULL,  -- Key of TOP_CUSTOMER_METRICS
+        day_ts INTEGER NOT NULL,  -- Start of the UTC day, epoch seconds
+        customer_id TEXT NOT NULL,
+        value REAL NOT NULL,  -- The customer's metric over the day's completed sales
+        day_floor REAL NOT NULL,  -- Largest value of a customer left out of the day (0 when none was)
+        PRIMARY KEY (metric, day_ts, customer_id)
+    ) WITHOUT ROWID
+    ''',
+    # Rowid table: sketches of up to 4 KB would make WITHOUT ROWID index pages overflow
+    '''
+    CREATE TABLE IF NOT EXISTS customer_sketch_hourly (
+        hour_ts INTEGER NOT NULL,  -- Start of the UTC hour, epoch seconds
+        status TEXT NOT NULL,
+        registers BLOB NOT NULL,  -- HyperLogLog sketch of the hour's customer_ids (sketches.encode)
+        PRIMARY KEY (hour_ts, status)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS data_generation (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        generation INTEGER NOT NULL
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS arrival_order (
+        source_path TEXT PRIMARY KEY,
+        newest_event_us INTEGER,  -- Running max event time in file order
+        out_of_order_records INTEGER NOT NULL DEFAULT 0,
+        lateness_histogram TEXT NOT NULL  -- JSON list of row counts per lateness bucket
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS ingest_batches (
+        batch_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        source_path TEXT NOT NULL,
+        mode TEXT NOT NULL,
+        total_records INTEGER NOT NULL,
+        finished_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS quality_counters_daily (
+        day_ts INTEGER NOT NULL,  -- Start of the UTC day, epoch seconds (UNDATED_DAY for rows without a timestamp)
+        batch_id INTEGER NOT NULL,
+        total_records INTEGER NOT NULL DEFAULT 0,
+        invalid_dates INTEGER NOT NULL DEFAULT 0,
+        missing_timezones INTEGER NOT NULL DEFAULT 0,
+        duplicate_transactions INTEGER NOT NULL DEFAULT 0,
+        dst_ambiguous INTEGER NOT NULL DEFAULT 0,
+        dst_nonexistent INTEGER NOT NULL DEFAULT 0,
+        out_of_order_records INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (day_ts, batch_id)
+    ) WITHOUT ROWID
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS fx_rates (
+        currency TEXT NOT NULL,
+        day_ts INTEGER NOT NULL,  -- Start of the UTC day the rate applies from, epoch seconds
+        rate REAL NOT NULL,  -- Units of BASE_CURRENCY per unit of currency
+        PRIMARY KEY (currency, day_ts)
+    ) WITHOUT ROWID
+    ''',
+)
+
+# Bits of transactions.quality_issues, in the order their names are listed in data_quality_flags
+ISSUE_BITS = {
+    'missing_timezone': 1,
+    'invalid_timezone': 2,
+    'empty_timestamp': 4,
+    'invalid_date_format': 8,
+    'out_of_order': 16,
+}
+
+# amount in BASE_CURRENCY at the rate of the row's UTC day: the latest fx_rates row on or before it,
+# or the earliest one for days before the table starts (processors.FxRates.to_base gives the same values).
+# NULL for currencies without rates.
+BASE_AMOUNT_SQL = f'''
+    CASE WHEN currency = '{BASE_CURRENCY}' THEN amount ELSE amount * COALESCE(
+        (SELECT rate FROM fx_rates r WHERE r.currency = transactions.currency AND r.day_ts <= transactions.processed_ts
+         ORDER BY r.day_ts DESC LIMIT 1),
+        (SELECT rate FROM fx_rates r WHERE r.currency = transactions.currency ORDER BY r.day_ts LIMIT 1)
+    ) END
+'''
+
+# Columns added to transactions after setup_db.py: name -> (type, backfill statement)
+COLUMN_MIGRATIONS = {
+    'processed_ts': (
+        'INTEGER',
+        "UPDATE transactions SET processed_ts = CAST(strftime('%s', processed_timestamp) AS INTEGER) "
+        "WHERE processed_timestamp IS NOT NULL",
+    ),
+    'quality_issues': (
+        'INTEGER NOT NULL DEFAULT 0',
+        "UPDATE transactions SET quality_issues = "
+        + ' | '.join(f"(CASE WHEN instr(data_quality_flags, '\"{name}\"') THEN {bit} ELSE 0 END)"
+                     for name, bit in ISSUE_BITS.items())
+        + " WHERE data_quality_flags IS NOT NULL",
+    ),
+    'amount_base': ('REAL', f"UPDATE transactions SET amount_base = {BASE_AMOUNT_SQL}"),
+}
+
+# Columns added to derived tables; a derived table without one is dropped and rebuilt
+DERIVED_COLUMN_MIGRATIONS = {
+    'sales_rollup_hourly': ('total_amount_base',),
+}
+
+def ensure_schema():
+    """Bringing an existing database up to the current schema"""
     conn = get_connection()
-    cursor = conn.cursor()
-    
-    for record in records:
-        cursor.execute('''
-            INSERT INTO transactions (
-                transaction_id, customer_id, amount, currency,
-                original_timestamp, original_timezone, processed_timestamp,
-                processed_timezone, status, product_category, data_quality_flags, created_at
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            record['transaction_id'], record['customer_id'], record['amount'],
-            record['currency'], record['original_timestamp'], record['original_timezone'],
-            record['processed_timestamp'], record['processed_timezone'],
-            record['status'], record['product_category'], record['data_quality_flags'],record['created_at']
-        ))
-    
+    existing_tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    migrated = False
+    for table, columns in DERIVED_COLUMN_MIGRATIONS.items():
+        if table in existing_tables:
+            existing = {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+            if not existing.issuperset(columns):
+                conn.execute(f'DROP TABLE {table}')
+                existing_tables.discard(table)
+    for statement in SCHEMA_MIGRATIONS:
+        conn.execute(statement)
+
+    # Rates come first: the amount_base backfill and the derived tables are computed from them
+    rates_loaded = ensure_fx_rates(conn, FX_RATES_PATH)
+    existing = {row[1] for row in conn.execute('PRAGMA table_info(transactions)')}
+    for name, (column_type, backfill_sql) in COLUMN_MIGRATIONS.items():
+        if name not in existing:
+            conn.execute(f'ALTER TABLE transactions ADD COLUMN {name} {column_type}')
+            conn.execute(backfill_sql)
+            migrated = True
+    if rates_loaded and 'amount_base' in existing:
+        # Base amounts stored while the rate table was empty; the tables summing them are rebuilt below
+        conn.execute(f"UPDATE transactions SET amount_base = {BASE_AMOUNT_SQL}")
+        existing_tables -= {'sales_rollup_hourly', 'customer_topk_daily'}
+        migrated = True
+
+    for name in REDUNDANT_INDEXES:
+        conn.execute(f'DROP INDEX IF EXISTS {name}')
+    create_secondary_indexes(conn)
+    if backfill_quality_counters(conn):
+        migrated = True
+
+    # Derived tables created just now are filled from the stored transactions
+    for table, rebuild in DERIVED_TABLES.items():
+        if table not in existing_tables:
+            rebuild(conn)
+            migrated = True
+    if migrated:
+        bump_data_generation(conn)  # Cached responses and the columnar store predate the new columns
     conn.commit()
     conn.close()
 
+def insert_many_transactions(records):
+    """Inserting multiple transaction records"""
+    with BulkWriter() as writer:
+        writer.write({name: [record[name] for record in records] for name in TRANSACTION_COLUMNS})
+
+# ---------------- Bulk Loading ----------------
+TRANSACTION_COLUMNS = (
+    'transaction_id', 'customer_id', 'amount', 'amount_base', 'currency',
+    'original_timestamp', 'original_timezone', 'processed_timestamp', 'processed_ts',
+    'processed_timezone', 'status', 'product_category', 'data_quality_flags', 'quality_issues', 'created_at'
+)
+
+INSERT_TRANSACTION_SQL = f'''
+    INSERT INTO transactions ({', '.join(TRANSACTION_COLUMNS)})
+    VALUES ({', '.join('?' * len(TRANSACTION_COLUMNS))})
+'''
+
+# Secondary indexes on transactions, dropped during a full reload and rebuilt afterwards
+SECONDARY_INDEXES = {
+    'idx_processed_timestamp': 'CREATE INDEX IF NOT EXISTS idx_processed_timestamp ON transactions(processed_timestamp)',
+    # Half-open processed_ts range scans of the sales endpoints
+    'idx_status_processed_ts': 'CREATE INDEX IF NOT EXISTS idx_status_processed_ts ON transactions(status, processed_ts)',
+    # Recomputing the rollup hours touched by an ingest
+    'idx_processed_ts': 'CREATE INDEX IF NOT EXISTS idx_processed_ts ON transactions(processed_ts)',
+    'idx_customer_id': 'CREATE INDEX IF NOT EXISTS idx_customer_id ON transactions(customer_id)',
+    'idx_status': 'CREATE INDEX IF NOT EXISTS idx_status ON transactions(status)',
+    # Category and currency filters of the sales endpoints on raw rows, one range per status
+    'idx_category_status_ts': '''
+        CREATE INDEX IF NOT EXISTS idx_category_status_ts ON transactions(product_category, status, processed_ts)
+    ''',
+    'idx_currency_status_ts': '''
+        CREATE INDEX IF NOT EXISTS idx_currency_status_ts ON transactions(currency, status, processed_ts)
+    ''',
+    # Lookup of stored duplicate candidates during incremental ingest
+    'idx_dedup_ts': 'CREATE INDEX IF NOT EXISTS idx_dedup_ts ON transactions(customer_id, amount, processed_ts)',
+    # Data quality report: covers the rows with issues only, which are a small part of the table
+    'idx_quality_issues': '''
+        CREATE INDEX IF NOT EXISTS idx_quality_issues
+        ON transactions(processed_ts, quality_issues, product_category, currency) WHERE quality_issues != 0
+    ''',
+}
+
+# Duplicate the UNIQUE index on transaction_id or prefix a composite index, or were replaced (idx_dedup by
+# idx_dedup_ts), so they are dropped and not rebuilt
+REDUNDANT_INDEXES = ('idx_transaction_id', 'idx_category', 'idx_currency', 'idx_dedup')
+
+UPSERT_TRANSACTION_SQL = INSERT_TRANSACTION_SQL + f'''
+    ON CONFLICT(transaction_id) DO UPDATE SET
+    {', '.join(f'{name} = excluded.{name}' for name in TRANSACTION_COLUMNS[1:])},
+    updated_at = CURRENT_TIMESTAMP
+'''
+
+BULK_LOAD_PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA cache_size=-262144',  # 256 MB page cache
+    'PRAGMA temp_store=MEMORY',
+)
+
+WRITE_SLICE_ROWS = 50000  # Rows of a RecordBatch turned back into text values at a time
+
+def drop_secondary_indexes(conn):
+    """Dropping secondary indexes before a full reload"""
+    for name in (*SECONDARY_INDEXES, *REDUNDANT_INDEXES):
+        conn.execute(f'DROP INDEX IF EXISTS {name}')
+
+def create_secondary_indexes(conn):
+    """Rebuilding secondary indexes after a full reload"""
+    for index_sql in SECONDARY_INDEXES.values():
+        conn.execute(index_sql)
+
+def _column_values(column):
+    """Plain Python values for a column (lists pass through, pandas/numpy columns are converted)"""
+    return column.tolist() if hasattr(column, 'tolist') else column
+
+class BulkWriter:
+    """
+    Bulk transaction writer for ingest.
+    Rows are written with executemany from column arrays (or RecordBatch slices) on a connection tuned for loading;
+    a full reload clears the table and drops secondary indexes until close(),
+    upsert mode updates rows whose transaction_id is already stored.
+    The hourly sales rollup, customer sketches and daily top customers are kept in step: hours (and days)
+    touched by a batch are recomputed in the same commit, and a full reload rebuilds them on close().
+    touched_hours collects the UTC hours changed by incremental writes.
+    """
+
+    def __init__(self, full_reload=False, upsert=False):
+        self.full_reload = full_reload
+        self.insert_sql = UPSERT_TRANSACTION_SQL if upsert else INSERT_TRANSACTION_SQL
+        self.rows_written = 0
+        self.touched_hours = set()
+        self.conn = get_connection()
+        for pragma in BULK_LOAD_PRAGMAS:
+            self.conn.execute(pragma)
+
+        if full_reload:
+            drop_secondary_indexes(self.conn)
+            self.conn.execute('DELETE FROM transactions')
+            self.conn.execute('DELETE FROM sales_rollup_hourly')
+            self.conn.execute('DELETE FROM customer_topk_daily')
+            self.conn.execute('DELETE FROM customer_sketch_hourly')
+            bump_data_generation(self.conn)
+            self.conn.commit()
+
+    def write(self, columns):
+        """Inserting and committing one batch given as a mapping of column name -> values or a RecordBatch"""
+        parts = columns.column_slices(WRITE_SLICE_ROWS) if hasattr(columns, 'column_slices') else [columns]
+        count = 0
+        hours = set()
+        for part in parts:
+            rows = list(zip(*(_column_values(part[name]) for name in TRANSACTION_COLUMNS)))
+            if not self.full_reload:
+                # Hours of the new rows and of any stored rows they replace
+                hours |= {ts - ts % 3600 for ts in _column_values(part['processed_ts']) if ts is not None}
+                hours |= get_stored_hours(self.conn, _column_values(part['transaction_id']))
+            self.conn.executemany(self.insert_sql, rows)
+            count += len(rows)
+
+        if not self.full_reload:
+            refresh_sales_rollup(self.conn, hours)
+            refresh_customer_topk(self.conn, {hour - hour % 86400 for hour in hours})
+            refresh_customer_sketches(self.conn, hours)
+            self.touched_hours |= hours
+        bump_data_generation(self.conn)
+        self.conn.commit()
+        self.rows_written += count
+        return count
+
+    def close(self):
+        """Rebuilding indexes and the derived tables after a full reload and closing the connection"""
+        if self.full_reload:
+            create_secondary_indexes(self.conn)
+            rebuild_sales_rollup(self.conn)
+            rebuild_customer_topk(self.conn)
+            rebuild_customer_sketches(self.conn)
+            bump_data_generation(self.conn)
+            self.conn.commit()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+# ---------------- Sales Rollup ----------------
+ROLLUP_INSERT_SQL = '''
+    INSERT INTO sales_rollup_hourly (
+        hour_ts, status, currency, product_category,
+        total_amount, total_amount_base, transaction_count, min_amount, max_amount
+    )
+    SELECT processed_ts - processed_ts % 3600, status, currency, product_category,
+           SUM(amount), SUM(amount_base), COUNT(*), MIN(amount), MAX(amount)
+    FROM transactions
+    WHERE {where}
+    GROUP BY 1, 2, 3, 4
+'''
+
+def rebuild_sales_rollup(conn):
+    """Recomputing the whole hourly sales rollup from transactions"""
+    conn.execute('DELETE FROM sales_rollup_hourly')
+    conn.execute(ROLLUP_INSERT_SQL.format(where='processed_ts IS NOT NULL'))
+
+def refresh_sales_rollup(conn, hours):
+    """Recomputing the rollup rows of the given UTC hours (epoch seconds) from transactions"""
+    hours = sorted(hours)
+    conn.executemany('DELETE FROM sales_rollup_hourly WHERE hour_ts = ?', ((hour,) for hour in hours))
+    conn.executemany(
+        ROLLUP_INSERT_SQL.format(where='processed_ts >= ? AND processed_ts < ?'),
+        ((hour, hour + 3600) for hour in hours)
+    )
+
+def get_stored_hours(conn, transaction_ids, batch_size=500):
+    """UTC hours of the stored rows with the given transaction ids"""
+    hours = set()
+    for start in range(0, len(transaction_ids), batch_size):
+        batch = transaction_ids[start:start + batch_size]
+        hours.update(row[0] for row in conn.execute(f'''
+            SELECT DISTINCT processed_ts - processed_ts % 3600 FROM transactions
+            WHERE processed_ts IS NOT NULL
+            AND transaction_id IN ({', '.join('?' * len(batch))})
+        ''', batch))
+    return hours
+
+# ---------------- Top Customers ----------------
+# Per UTC day and metric, the TOP_CUSTOMERS_SUMMARY_SIZE customers with the highest value and the largest
+# value of the customers left out (day_floor), recomputed from transactions like the rollup. Summing the
+# days of a range overstates a customer by at most the floors of the days it is missing from, so every
+# estimate is within the sum of the floors, at most the range's total / (TOP_CUSTOMERS_SUMMARY_SIZE + 1).
+
+TOP_CUSTOMER_METRICS = {
+    'spend': 'SUM(amount_base)',  # BASE_CURRENCY, rows of currencies without rates add nothing
+    'transactions': 'COUNT(*)',
+}
+
+CUSTOMER_TOPK_INSERT_SQL = '''
+    INSERT INTO customer_topk_daily (metric, day_ts, customer_id, value, day_floor)
+    WITH customer_days AS MATERIALIZED (
+        SELECT processed_ts - processed_ts % 86400 AS day_ts, customer_id, {metric_columns}
+        FROM transactions
+        WHERE status = 'completed' AND {{where}}
+        GROUP BY 1, 2
+    ), ranked AS (
+        {ranked}
+    )
+    SELECT metric, day_ts, customer_id, value, COALESCE(day_floor, 0)
+    FROM ranked
+    WHERE position <= {{size}}
+'''.format(
+    metric_columns=', '.join(f"{expression} AS {metric}" for metric, expression in TOP_CUSTOMER_METRICS.items()),
+    ranked=' UNION ALL '.join(f'''
+        SELECT '{metric}' AS metric, day_ts, customer_id, {metric} AS value,
+               ROW_NUMBER() OVER day AS position, NTH_VALUE({metric}, {{size}} + 1) OVER day AS day_floor
+        FROM customer_days
+        WHERE {metric} IS NOT NULL
+        WINDOW day AS (PARTITION BY day_ts ORDER BY {metric} DESC, customer_id
+                       ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING)
+    ''' for metric in TOP_CUSTOMER_METRICS),
+)
+
+def rebuild_customer_topk(conn):
+    """Recomputing the top customers of every day from transactions"""
+    conn.execute('DELETE FROM customer_topk_daily')
+    conn.execute(CUSTOMER_TOPK_INSERT_SQL.format(where='processed_ts IS NOT NULL', size=TOP_CUSTOMERS_SUMMARY_SIZE))
+
+def refresh_customer_topk(conn, days):
+    """Recomputing the top customers of the given UTC days (epoch seconds) from transactions"""
+    days = sorted(days)
+    conn.executemany(
+        f"DELETE FROM customer_topk_daily WHERE metric IN ({', '.join('?' * len(TOP_CUSTOMER_METRICS))}) AND day_ts = ?",
+        ((*TOP_CUSTOMER_METRICS, day) for day in days)
+    )
+    conn.executemany(
+        CUSTOMER_TOPK_INSERT_SQL.format(where='processed_ts >= ? AND processed_ts < ?',
+                                        size=TOP_CUSTOMERS_SUMMARY_SIZE),
+        ((day, day + 86400) for day in days)
+    )
+
+# ---------------- Customer Sketches ----------------
+# HyperLogLog sketch of the customer_ids of each UTC hour and status (see sketches.py), so distinct
+# customers of any range are a merge of a few KB per hour instead of a COUNT(DISTINCT) over its rows.
+
+CUSTOMER_SKETCH_ROWS_SQL = '''
+    SELECT processed_ts - processed_ts % 3600, status, customer_id
+    FROM transactions
+    WHERE processed_ts >= ? AND processed_ts < ?
+'''
+
+CUSTOMER_SKETCH_SCAN_SQL = '''
+    SELECT processed_ts - processed_ts % 3600 AS hour_ts, status, customer_id
+    FROM transactions
+    WHERE +processed_ts IS NOT NULL
+    ORDER BY hour_ts
+'''
+CUSTOMER_SKETCH_SCAN_BATCH = 200_000  # Rows read per fetch while rebuilding
+
+def insert_customer_sketches(conn, rows):
+    """Inserting the sketches of (hour_ts, status, customer_id) rows, which must cover whole hours"""
+    import sketches  # numpy and pandas, kept out of the ingest CLI's startup
+    if not rows:
+        return
+    hours, statuses, customer_ids = zip(*rows)
+    groups = sorted(set(zip(hours, statuses)))
+    codes = {group: code for code, group in enumerate(groups)}
+    registers = sketches.build([codes[group] for group in zip(hours, statuses)], len(groups), customer_ids)
+    conn.executemany(
+        'INSERT INTO customer_sketch_hourly (hour_ts, status, registers) VALUES (?, ?, ?)',
+        ((hour, status, sketches.encode(row)) for (hour, status), row in zip(groups, registers))
+    )
+
+def write_customer_sketches(conn, start_ts, end_ts):
+    """Recomputing the customer sketches of the UTC hours in [start_ts, end_ts) from transactions"""
+    conn.execute('DELETE FROM customer_sketch_hourly WHERE hour_ts >= ? AND hour_ts < ?', (start_ts, end_ts))
+    insert_customer_sketches(conn, conn.execute(CUSTOMER_SKETCH_ROWS_SQL, (start_ts, end_ts)).fetchall())
+
+def refresh_customer_sketches(conn, hours):
+    """Recomputing the customer sketches of the given UTC hours (epoch seconds), one run of hours at a time"""
+    run_start = run_end = None
+    for hour in sorted(hours):
+        if hour != run_end:
+            if run_start is not None:
+                write_customer_sketches(conn, run_start, run_end)
+            run_start = hour
+        run_end = hour + 3600
+    if run_start is not None:
+        write_customer_sketches(conn, run_start, run_end)
+
+def rebuild_customer_sketches(conn):
+    """
+    Recomputing every customer sketch from one sequential scan of transactions sorted by hour (about twice
+    as fast as reading day ranges through idx_processed_ts), a batch of whole hours at a time.
+    """
+    conn.execute('DELETE FROM customer_sketch_hourly')
+    cursor = conn.execute(CUSTOMER_SKETCH_SCAN_SQL)
+    pending = []
+    while True:
+        batch = cursor.fetchmany(CUSTOMER_SKETCH_SCAN_BATCH)
+        if not batch:
+            break
+        # Rows of the batch's last hour may continue into the next batch
+        last_hour = batch[-1][0]
+        split = len(batch)
+        while split and batch[split - 1][0] == last_hour:
+            split -= 1
+        if split:
+            pending.extend(batch[:split])
+            insert_customer_sketches(conn, pending)
+            pending = []
+        pending.extend(batch[split:])
+    insert_customer_sketches(conn, pending)
+
+# Tables derived from transactions, rebuilt when ensure_schema() first creates them
+DERIVED_TABLES = {
+    'sales_rollup_hourly': rebuild_sales_rollup,
+    'customer_topk_daily': rebuild_customer_topk,
+    'customer_sketch_hourly': rebuild_customer_sketches,
+}
+
+# ---------------- Data Generation ----------------
+# Counter bumped in the same transaction as every change to transactions or the quality summary,
+# so cached API responses keyed on it are never served after the data they were built from changes
+
+def bump_data_generation(conn):
+    """Incrementing the data generation inside the caller's transaction"""
+    updated = conn.execute('UPDATE data_generation SET generation = generation + 1 WHERE id = 1').rowcount
+    if not updated:
+        conn.execute('INSERT INTO data_generation (id, generation) VALUES (1, 1)')
+
+def get_data_generation():
+    """Current data generation (0 before the first ingest)"""
+    with read_connection() as conn:
+        row = conn.execute('SELECT generation FROM data_generation WHERE id = 1').fetchone()
+    return row[0] if row else 0
+
 def update_quality_summary(stats):
     """Updating data quality summary""" 
     conn = get_connection()
@@ -62,27 +775,295 @@ def update_quality_summary(stats):
         stats['invalid_dates'],
         stats['missing_timezones'],
         stats['duplicate_transactions'],
-        0
+        stats['out_of_order_records']
     ))
     
+    bump_data_generation(conn)
+    conn.commit()
+    conn.close()
+
+def apply_quality_delta(stats):
+    """Adding the counts of an incremental ingest to the data quality summary"""
+    conn = get_connection()
+    values = (
+        stats['total_processed'],
+        stats['invalid_dates'],
+        stats['missing_timezones'],
+        stats['duplicate_transactions'],
+        stats['out_of_order_records']
+    )
+    updated = conn.execute('''
+        UPDATE data_quality_summary SET
+            total_records = total_records + ?,
+            invalid_dates = invalid_dates + ?,
+            missing_timezones = missing_timezones + ?,
+            duplicate_transactions = duplicate_transactions + ?,
+            out_of_order_records = out_of_order_records + ?,
+            last_updated = CURRENT_TIMESTAMP
+    ''', values).rowcount
+    if not updated:
+        conn.execute('''
+            INSERT INTO data_quality_summary (
+                total_records, invalid_dates, missing_timezones,
+                duplicate_transactions, out_of_order_records
+            ) VALUES (?, ?, ?, ?, ?)
+        ''', values)
+    bump_data_generation(conn)
+    conn.commit()
+    conn.close()
+
+# ---------------- Quality Counters ----------------
+# Data quality counts of every ingest batch per UTC day. The data quality report sums these
+# pre-aggregated rows instead of scanning transactions; a full reload replaces all of them.
+
+QUALITY_COUNTER_COLUMNS = (
+    'total_records', 'invalid_dates', 'missing_timezones', 'duplicate_transactions',
+    'dst_ambiguous', 'dst_nonexistent', 'out_of_order_records'
+)
+UNDATED_DAY = -1  # day_ts of rows without a timestamp
+
+def insert_quality_batch(conn, source_path, mode, day_counts):
+    """Inserting one ingest batch and its (day_ts, *QUALITY_COUNTER_COLUMNS) rows; returns the batch id"""
+    total_records = sum(row[1] for row in day_counts)
+    batch_id = conn.execute('''
+        INSERT INTO ingest_batches (source_path, mode, total_records) VALUES (?, ?, ?)
+    ''', (source_path, mode, total_records)).lastrowid
+    conn.executemany(f'''
+        INSERT INTO quality_counters_daily (day_ts, batch_id, {', '.join(QUALITY_COUNTER_COLUMNS)})
+        VALUES (?, ?, {', '.join('?' * len(QUALITY_COUNTER_COLUMNS))})
+    ''', ((row[0], batch_id, *row[1:]) for row in day_counts))
+    return batch_id
+
+def save_quality_counters(source_path, mode, day_counts, replace=False):
+    """
+    Recording one ingest batch and its counters, given as (day_ts, *QUALITY_COUNTER_COLUMNS) rows.
+    replace drops the batches of earlier loads first. Returns the batch id.
+    """
+    conn = get_connection()
+    if replace:
+        conn.execute('DELETE FROM quality_counters_daily')
+        conn.execute('DELETE FROM ingest_batches')
+    batch_id = insert_quality_batch(conn, source_path, mode, day_counts)
+    bump_data_generation(conn)
+    conn.commit()
+    conn.close()
+    return batch_id
+
+# Transactions loaded before the counters existed have no ingest batch. ensure_schema() recounts them into
+# one batch with mode BACKFILL_MODE: totals, missing timezones and out-of-order rows from quality_issues,
+# DST transitions from the original timestamps and invalid dates (never stored) from data_quality_summary,
+# under UNDATED_DAY. Dropped duplicates left no trace, so that batch counts none.
+BACKFILL_MODE = 'backfill'
+BACKFILL_BATCH_ROWS = 200_000  # Rows re-normalized at a time for the DST counts
+
+BACKFILL_COUNTS_SQL = f'''
+    SELECT COALESCE(processed_ts - processed_ts % 86400, {UNDATED_DAY}), COUNT(*),
+           SUM((quality_issues & {ISSUE_BITS['missing_timezone']}) != 0),
+           SUM((quality_issues & {ISSUE_BITS['out_of_order']}) != 0)
+    FROM transactions
+    GROUP BY 1
+'''
+
+BACKFILL_DST_SQL = f'''
+    SELECT COALESCE(processed_ts - processed_ts % 86400, {UNDATED_DAY}), original_timestamp, original_timezone,
+           instr(lower(transaction_id), 'dst') > 0
+    FROM transactions
+    WHERE TRIM(COALESCE(original_timezone, '')) NOT IN ('', 'UTC')
+'''
+
+def backfill_quality_counters(conn):
+    """Recording a backfill batch when transactions are stored but no ingest batch is; True when one was"""
+    if conn.execute('SELECT 1 FROM ingest_batches LIMIT 1').fetchone() is not None:
+        return False
+    days = {
+        day: dict(dict.fromkeys(QUALITY_COUNTER_COLUMNS, 0),
+                  total_records=total, missing_timezones=missing, out_of_order_records=late)
+        for day, total, missing, late in conn.execute(BACKFILL_COUNTS_SQL)
+    }
+    if not days:
+        return False
+    summary = conn.execute('SELECT invalid_dates FROM data_quality_summary ORDER BY id DESC LIMIT 1').fetchone()
+    if summary and summary[0]:
+        undated = days.setdefault(UNDATED_DAY, dict.fromkeys(QUALITY_COUNTER_COLUMNS, 0))
+        undated['total_records'] += summary[0]
+        undated['invalid_dates'] += summary[0]
+
+    import pandas as pd  # kept out of the ingest CLI's startup, like processors
+    import processors
+    cursor = conn.execute(BACKFILL_DST_SQL)
+    while True:
+        rows = cursor.fetchmany(BACKFILL_BATCH_ROWS)
+        if not rows:
+            break
+        day_ts, timestamps, timezones, dst_checks = (pd.Series(column, dtype=object) for column in zip(*rows))
+        dst = processors.normalize_timestamps(timestamps, timezones, dst_checks.astype(bool))['dst']
+        for day, kind in zip(day_ts[dst != ''], dst[dst != '']):
+            days[day][f'dst_{kind}'] += 1
+
+    insert_quality_batch(conn, 'transactions', BACKFILL_MODE, [
+        (day, *(days[day][name] for name in QUALITY_COUNTER_COLUMNS)) for day in sorted(days)
+    ])
+    return True
+
+# ---------------- FX Rates ----------------
+# Daily rates to BASE_CURRENCY. Ingest stores each row's amount_base from them, so the sales queries sum
+# base amounts (the rollup keeps total_amount_base) and only convert the sums into the reporting currency.
+
+def read_fx_rates_file(path):
+    """(currency, day_ts, rate) rows of a date,currency,rate CSV file (dates in YYYY-MM-DD)"""
+    with open(path, newline='') as f:
+        rows = []
+        for record in csv.DictReader(f):
+            day = datetime.strptime(record['date'].strip(), '%Y-%m-%d').replace(tzinfo=timezone.utc)
+            rate = float(record['rate'])
+            if rate <= 0:
+                raise ValueError(f"FX rate must be positive: {record}")
+            rows.append((record['currency'].strip().upper(), int(day.timestamp()), rate))
+    return rows
+
+def replace_fx_rates(rows):
+    """
+    Replacing the rate table with (currency, day_ts, rate) rows and recomputing amount_base of every
+    stored transaction and the rollup from it, in one commit
+    """
+    conn = get_connection()
+    conn.execute('DELETE FROM fx_rates')
+    conn.executemany('INSERT OR REPLACE INTO fx_rates (currency, day_ts, rate) VALUES (?, ?, ?)', rows)
+    conn.execute(f"UPDATE transactions SET amount_base = {BASE_AMOUNT_SQL}")
+    rebuild_sales_rollup(conn)
+    rebuild_customer_topk(conn)
+    bump_data_generation(conn)
+    conn.commit()
+    conn.close()
+
+def ensure_fx_rates(conn, path):
+    """Loading the rates file into an empty rate table, in the caller's transaction; True when rates were loaded"""
+    if conn.execute('SELECT 1 FROM fx_rates LIMIT 1').fetchone() is not None or not os.path.exists(path):
+        return False
+    conn.executemany('INSERT OR REPLACE INTO fx_rates (currency, day_ts, rate) VALUES (?, ?, ?)',
+                     read_fx_rates_file(path))
+    return True
+
+def get_fx_rates():
+    """Every stored rate as (currency, day_ts, rate) rows ordered by currency and day"""
+    with read_connection() as conn:
+        try:
+            return conn.execute('SELECT currency, day_ts, rate FROM fx_rates ORDER BY currency, day_ts').fetchall()
+        except sqlite3.OperationalError:
+            return []  # Database from before multi-currency reporting, ensure_schema adds the table
+
+def find_stored_duplicate(conn, customer_id, amount, lower_ts, upper_ts, transaction_id):
+    """Processed timestamps of other stored records with the same key and processed_ts in [lower_ts, upper_ts] (idx_dedup_ts)"""
+    rows = conn.execute('''
+        SELECT processed_timestamp FROM transactions
+        WHERE customer_id = ? AND amount = ?
+        AND processed_ts BETWEEN ? AND ?
+        AND transaction_id != ?
+    ''', (customer_id, amount, lower_ts, upper_ts, transaction_id)).fetchall()
+    return [row[0] for row in rows]
+
+# ---------------- Ingest State ----------------
+FINGERPRINT_BYTES = 4096
+
+def source_fingerprint(csv_path, byte_offset):
+    """Hash of the header line and the bytes just before a high-water mark"""
+    digest = hashlib.sha256()
+    with open(csv_path, 'rb') as f:
+        digest.update(f.readline())
+        f.seek(max(0, byte_offset - FINGERPRINT_BYTES))
+        digest.update(f.read(min(byte_offset, FINGERPRINT_BYTES)))
+    return digest.hexdigest()
+
+def can_resume(csv_path, state):
+    """Checking that the source file still starts with the data behind its high-water mark"""
+    if state is None:
+        return False
+    byte_offset, _, fingerprint = state
+    return byte_offset <= os.path.getsize(csv_path) and source_fingerprint(csv_path, byte_offset) == fingerprint
+
+def has_new_lines(csv_path, byte_offset, block_size=65536):
+    """Checking whether a complete line has been appended after byte_offset"""
+    with open(csv_path, 'rb') as f:
+        f.seek(byte_offset)
+        while True:
+            block = f.read(block_size)
+            if not block:
+                return False
+            if b'\n' in block:
+                return True
+
+def get_ingest_state(source_path):
+    """High-water mark of a source file as (byte_offset, row_count, fingerprint), or None"""
+    conn = get_connection()
+    row = conn.execute('''
+        SELECT byte_offset, row_count, fingerprint FROM ingest_state WHERE source_path = ?
+    ''', (source_path,)).fetchone()
+    conn.close()
+    return row
+
+def save_ingest_state(source_path, byte_offset, row_count, fingerprint):
+    """Recording the high-water mark of a source file"""
+    conn = get_connection()
+    conn.execute('''
+        INSERT INTO ingest_state (source_path, byte_offset, row_count, fingerprint)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT(source_path) DO UPDATE SET
+            byte_offset = excluded.byte_offset,
+            row_count = excluded.row_count,
+            fingerprint = excluded.fingerprint,
+            updated_at = CURRENT_TIMESTAMP
+    ''', (source_path, byte_offset, row_count, fingerprint))
+    conn.commit()
+    conn.close()
+
+def get_arrival_state(source_path):
+    """Out-of-order detector state of a source file as (newest_event_us, out_of_order_records, histogram), or None"""
+    conn = get_connection()
+    row = conn.execute('''
+        SELECT newest_event_us, out_of_order_records, lateness_histogram FROM arrival_order WHERE source_path = ?
+    ''', (source_path,)).fetchone()
+    conn.close()
+    return None if row is None else (row[0], row[1], json.loads(row[2]))
+
+def save_arrival_state(source_path, newest_event_us, out_of_order_records, histogram, replace=False):
+    """Recording the out-of-order detector state of a source file; replace drops the state of every other source"""
+    conn = get_connection()
+    if replace:
+        conn.execute('DELETE FROM arrival_order')
+    conn.execute('''
+        INSERT INTO arrival_order (source_path, newest_event_us, out_of_order_records, lateness_histogram)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT(source_path) DO UPDATE SET
+            newest_event_us = excluded.newest_event_us,
+            out_of_order_records = excluded.out_of_order_records,
+            lateness_histogram = excluded.lateness_histogram
+    ''', (source_path, newest_event_us, out_of_order_records, json.dumps(histogram)))
     conn.commit()
     conn.close()
 
+def get_lateness_histogram():
+    """Lateness histogram summed over every ingested source (empty list before the first ingest)"""
+    with read_connection() as conn:
+        try:
+            rows = conn.execute('SELECT lateness_histogram FROM arrival_order').fetchall()
+        except sqlite3.OperationalError:
+            rows = []  # Database from before out-of-order detection, ensure_schema adds the table
+    histograms = [json.loads(row[0]) for row in rows]
+    return [sum(counts) for counts in zip(*histograms)]
+
 def get_quality_summary():
     """Retrieving data quality summary"""
-    conn = get_connection()
-    
-    quality_data = conn.execute('''
-        SELECT total_records, invalid_dates, missing_timezones, 
-               duplicate_transactions, out_of_order_records
-        FROM data_quality_summary
-        ORDER BY last_updated DESC
-        LIMIT 1
-    ''').fetchone()
+    with read_connection() as conn:
+        quality_data = conn.execute('''
+            SELECT total_records, invalid_dates, missing_timezones, 
+                   duplicate_transactions, out_of_order_records
+            FROM data_quality_summary
+            ORDER BY last_updated DESC
+            LIMIT 1
+        ''').fetchone()
+        
+        processed_count = conn.execute('''
+            SELECT COUNT(*) FROM transactions WHERE processed_timestamp IS NOT NULL
+        ''').fetchone()[0]
     
-    processed_count = conn.execute('''
-        SELECT COUNT(*) FROM transactions WHERE processed_timestamp IS NOT NULL
-    ''').fetchone()[0]
-    
-    conn.close()
     return quality_data, processed_count
\ No newline at end of file
@@ -0,0 +1,28 @@
+# Gunicorn configuration for the production WSGI entry point (app/wsgi.py)
+# Usage: gunicorn -c app/gunicorn.conf.py
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Names only: module-level names of this file are read as gunicorn settings ('config' is one of them)
+from config import HOST, PORT, WSGI_WORKERS, WSGI_PIDFILE, WSGI_GRACEFUL_TIMEOUT_SECONDS
+
+wsgi_app = 'wsgi:application'
+bind = f"{HOST}:{PORT}"
+workers = WSGI_WORKERS or 2 * (os.cpu_count() or 1) + 1
+pidfile = WSGI_PIDFILE
+graceful_timeout = WSGI_GRACEFUL_TIMEOUT_SECONDS
+
+# Importing the app once in the master, so pandas and the app modules are shared by the forked workers
+preload_app = True
+
+def on_starting(server):
+    """Master: bringing the schema and the columnar store up to date before any worker starts"""
+    from app import prepare_database
+    prepare_database()
+
+def post_worker_init(worker):
+    """Worker: warming caches before the worker accepts connections"""
+    import wsgi
+    wsgi.init_worker()
@@ -1,11 +1,35 @@
 import pandas as pd
+import numpy as np
 import pytz
-import json
 import os
-from datetime import datetime, timedelta
+import io
+import re
+import sys
+import time
+from bisect import bisect_left, insort
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from datetime import date, datetime, timedelta
 from dateutil import parser as date_parser
-from config import CSV_PATH, DUPLICATE_TIME_SECONDS
+from config import (
+    CSV_PATH, BASE_CURRENCY, DUPLICATE_TIME_SECONDS, INGEST_MODES, INGEST_MODE, INGEST_CHUNK_SIZE, STREAM_DEDUP_HORIZON_SECONDS,
+    INGEST_WORKERS, OUT_OF_ORDER_LATENESS_SECONDS, TIMEZONE_CACHE_MAX_ENTRIES, TIMESTAMP_FORMAT_CACHE_MAX_ENTRIES, TIMESTAMP_MEMO_MAX_ENTRIES
+)
 import database
+import columnar
+from records import NO_TIME, RecordBatch, RecordDictionaries
+from cache import MemoCache, MISSING
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+# Text columns are read as strings so every chunk gets the same dtypes
+CSV_DTYPES = {
+    'transaction_id': str, 'customer_id': str, 'currency': str, 'timestamp': str,
+    'timezone': str, 'status': str, 'product_category': str,
+}
 
 # ---------------- Vaildating Parameters ----------------
 def validate_date(date_str):
@@ -20,11 +44,7 @@ def validate_timezone(tz_str):
     """Vaildating Timezone"""
     if not tz_str:
         return True
-    try:
-        pytz.timezone(tz_str)
-        return True
-    except pytz.exceptions.UnknownTimeZoneError:
-        return False
+    return resolve_timezone(tz_str) is not None
 
 def safe_string(value):
     """Safe String Conversion"""
@@ -34,9 +54,18 @@ def safe_string(value):
     return str(value).strip()  
 
 # ---------------- Time Processing ----------------
-def parse_timestamp(timestamp_str, timezone_str=None, dst_check=False):
+def parse_timestamp(timestamp_str, timezone_str=None, dst_check=False, formats=None):
     """
     Analyze the timestamp (UTC time, list of issues)
+    Shapes of the known formats are parsed with strptime through the format cache (formats, by default
+    the process-wide one); anything else goes through dateutil.
+    """
+    return parse_timestamp_details(timestamp_str, timezone_str, dst_check, formats)[:2]
+
+def parse_timestamp_details(timestamp_str, timezone_str=None, dst_check=False, formats=None):
+    """
+    parse_timestamp plus the DST transition the local time fell into:
+    (UTC time, list of issues, 'ambiguous' / 'nonexistent' / '')
     """
     issues = []
     timestamp_str = safe_string(timestamp_str)
@@ -47,49 +76,306 @@ def parse_timestamp(timestamp_str, timezone_str=None, dst_check=False):
         issues.append('missing_timezone')
 
     if not timestamp_str:
-        return None, ['empty_timestamp']
+        return None, ['empty_timestamp'], ''
     
     try:
-        # Processing UTC Tag
-        if timestamp_str.endswith('Z'):
-            dt = date_parser.parse(timestamp_str.replace('Z', '+00:00'))
-            return dt.astimezone(pytz.UTC), issues
-        
-        # Analyze timestamp
-        dt = date_parser.parse(timestamp_str)
+        dt = (formats or timestamp_formats).parse(timestamp_str)
+        if dt is None:
+            # Processing UTC Tag
+            if timestamp_str.endswith('Z'):
+                dt = date_parser.parse(timestamp_str.replace('Z', '+00:00'))
+                return dt.astimezone(pytz.UTC), issues, ''
+            
+            # Analyze timestamp
+            dt = date_parser.parse(timestamp_str)
+        elif dt.tzinfo is not None:
+            return dt, issues, ''
         
         # Process timezone if provided
         if timezone_str:
-            try:
-                tz = pytz.timezone(timezone_str)
+            tz = resolve_timezone(timezone_str)
+            if tz is not None:
+                transition = ''
                 try:
                     dt_localized = tz.localize(dt,is_dst=None)
                 except pytz.exceptions.NonExistentTimeError:
                     dt_localized = tz.localize(dt)
+                    transition = 'nonexistent'
                 except pytz.exceptions.AmbiguousTimeError:
                     dt_localized = tz.localize(dt, is_dst=dst_check)
+                    transition = 'ambiguous'
                 
-                return dt_localized.astimezone(pytz.UTC), issues
+                return dt_localized.astimezone(pytz.UTC), issues, transition
                 
-            except pytz.exceptions.UnknownTimeZoneError:
-                issues.append('invalid_timezone')
+            issues.append('invalid_timezone')
         
         utc_dt = pytz.UTC.localize(dt) if dt.tzinfo is None else dt.astimezone(pytz.UTC)
-        return utc_dt, issues
+        return utc_dt, issues, ''
         
     except (ValueError, TypeError):
-        return None, ['invalid_date_format']
+        return None, ['invalid_date_format'], ''
+
+def parse_timestamp_epoch(timestamp_str, timezone_str=None, dst_check=False, formats=None):
+    """
+    parse_timestamp as (UTC epoch microseconds or None, issues),
+    memoized on the raw values when TIMESTAMP_MEMO_MAX_ENTRIES allows it
+    """
+    epoch_us, issues, _ = _memoized_details(timestamp_str, timezone_str, dst_check, formats)
+    return epoch_us, list(issues)
+
+def _memoized_details(timestamp_str, timezone_str, dst_check, formats):
+    """parse_timestamp_details as (epoch microseconds or None, issues tuple, transition) through epoch_memo"""
+    key = (timestamp_str, timezone_str, bool(dst_check))
+    result = epoch_memo.get(key)
+    if result is MISSING:
+        utc_dt, issues, transition = parse_timestamp_details(timestamp_str, timezone_str, dst_check, formats)
+        result = (None if utc_dt is None else to_epoch_us(utc_dt), tuple(issues), transition)
+        epoch_memo.put(key, result)
+    return result
+
+# ---------------- Batch Time Processing ----------------
+def _matching_two_digit_years():
+    """Two-digit years that dateutil and strptime('%y') resolve to the same century"""
+    info = date_parser.parserinfo()
+    return [yy for yy in range(100) if info.convertyear(yy) == datetime.strptime(f'{yy:02d}', '%y').year]
+
+# Known formats from data/schema.md: (shape pattern, strptime format, already in UTC)
+KNOWN_TIMESTAMP_FORMATS = [
+    (r'\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}Z', '%Y-%m-%dT%H:%M:%SZ', True),
+    (r'\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}', '%Y-%m-%d %H:%M:%S', False),
+    (r'\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}', '%Y-%m-%dT%H:%M:%S', False),
+    (r'\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}\.\d{1,6}', '%Y-%m-%d %H:%M:%S.%f', False),
+    (r'\d{2}/\d{2}/(?:%s) \d{1,2}:\d{2} [AP]M' % '|'.join(f'{yy:02d}' for yy in _matching_two_digit_years()),
+     '%m/%d/%y %I:%M %p', False),
+    (r'\d{1,2}-[A-Za-z]{3}-\d{4} \d{2}:\d{2}', '%d-%b-%Y %H:%M', False),
+    (r'\d{4}-\d{2}-\d{2}', '%Y-%m-%d', False),
+]
+
+# ---------------- Processor Caches ----------------
+# Zone objects, timestamp formats and (optionally) whole results are memoized in bounded LRU caches,
+# so repeated values skip pytz.timezone() and dateutil. Every cache reports its hit rate at /api/metrics.
+
+timezone_cache = MemoCache(TIMEZONE_CACHE_MAX_ENTRIES)
+epoch_memo = MemoCache(TIMESTAMP_MEMO_MAX_ENTRIES)
+
+def resolve_timezone(tz_str):
+    """pytz zone of a timezone name through the timezone cache, None for unknown names"""
+    zone = timezone_cache.get(tz_str)
+    if zone is MISSING:
+        try:
+            zone = pytz.timezone(tz_str)
+        except pytz.exceptions.UnknownTimeZoneError:
+            zone = None
+        timezone_cache.put(tz_str, zone)
+    return zone
+
+# Digits and letters collapse to 9 and a, keeping separators: '01/15/24 2:30 PM' -> '99/99/99 9:99 aa'
+SHAPE_TABLE = str.maketrans('0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ', '9' * 10 + 'a' * 52)
+COMPILED_TIMESTAMP_FORMATS = [(re.compile(pattern), fmt, is_utc) for pattern, fmt, is_utc in KNOWN_TIMESTAMP_FORMATS]
+
+def timestamp_shape(timestamp_str):
+    """Digit/separator pattern of a timestamp string"""
+    return timestamp_str.translate(SHAPE_TABLE)
+
+class TimestampFormats:
+    """
+    Per-source cache of timestamp shape -> known format.
+    The first string of each shape is matched against KNOWN_TIMESTAMP_FORMATS; later strings of that shape
+    go straight to its strptime format. Each string is still checked against the format's pattern,
+    so values the pattern excludes (such as two-digit years dateutil reads differently) fall back to dateutil.
+    """
+
+    def __init__(self, max_entries=TIMESTAMP_FORMAT_CACHE_MAX_ENTRIES):
+        self.shapes = MemoCache(max_entries)
+
+    def lookup(self, timestamp_str):
+        """(compiled pattern, strptime format, already in UTC) of a string's known format, or None"""
+        if self.shapes.max_entries <= 0:
+            return None
+        shape = timestamp_shape(timestamp_str)
+        known = self.shapes.get(shape)
+        if known is MISSING:
+            known = next((entry for entry in COMPILED_TIMESTAMP_FORMATS if entry[0].fullmatch(timestamp_str)), None)
+            self.shapes.put(shape, known)
+        if known is None or not known[0].fullmatch(timestamp_str):
+            return None
+        return known
+
+    def parse(self, timestamp_str):
+        """Datetime of a string in a known format (aware UTC when the format says so), None otherwise"""
+        known = self.lookup(timestamp_str)
+        if known is None:
+            return None
+        _, fmt, is_utc = known
+        try:
+            dt = datetime.strptime(timestamp_str, fmt)
+        except ValueError:
+            return None
+        return pytz.UTC.localize(dt) if is_utc else dt
+
+    def stats(self):
+        """Counters for the metrics endpoint"""
+        return self.shapes.stats()
+
+timestamp_formats = TimestampFormats()
+
+def cache_stats():
+    """Counters of the process-wide processor caches"""
+    return {
+        'timezones': timezone_cache.stats(),
+        'timestamp_formats': timestamp_formats.stats(),
+        'timestamp_epochs': epoch_memo.stats(),
+    }
+
+def _clean_strings(values, index):
+    """Column version of safe_string"""
+    if values is None:
+        return pd.Series('', index=index, dtype=object)
+    return values.where(values.notna(), '').astype(str).str.strip()
+
+def normalize_timestamps(timestamps, timezones=None, dst_checks=None, formats=None):
+    """
+    Batch version of parse_timestamp working on whole columns.
+    Returns a DataFrame with 'utc' (UTC datetime, NaT when not parsed), 'issue' ('' when clean)
+    and 'dst' ('ambiguous' / 'nonexistent' for local times in a DST transition, '' otherwise).
+    Each row gets the same result and issue as parse_timestamp; rows matching none of the
+    known formats go through parse_timestamp itself, with the source's format cache.
+    """
+    index = timestamps.index
+    ts = _clean_strings(timestamps, index)
+    tz = _clean_strings(timezones, index)
+    if dst_checks is None:
+        dst_checks = pd.Series(False, index=index)
+
+    utc = pd.Series(pd.NaT, index=index, dtype='datetime64[ns, UTC]')
+    naive = pd.Series(pd.NaT, index=index, dtype='datetime64[ns]')
+    issue = pd.Series(np.where(tz == '', 'missing_timezone', ''), index=index, dtype=object)
+    dst = pd.Series('', index=index, dtype=object)
+
+    empty = ts == ''
+    issue[empty] = 'empty_timestamp'
+    pending = ~empty
+
+    # Detecting each known format and parsing its rows in one call
+    for pattern, fmt, is_utc in KNOWN_TIMESTAMP_FORMATS:
+        remaining = ts[pending]
+        candidates = remaining[remaining.str.fullmatch(pattern)]
+        if candidates.empty:
+            continue
+        parsed = pd.to_datetime(candidates, format=fmt, errors='coerce').dropna()
+        if is_utc:
+            utc[parsed.index] = parsed.dt.tz_localize('UTC')
+        else:
+            naive[parsed.index] = parsed
+        pending[parsed.index] = False
+
+    # Localizing each timezone group in one call
+    has_naive = naive.notna()
+    for tz_name, group_index in naive[has_naive].groupby(tz[has_naive]).groups.items():
+        values = naive[group_index]
+        zone = resolve_timezone(tz_name) if tz_name else pytz.UTC
+        if zone is None:
+            issue[group_index] = 'invalid_timezone'
+            zone = pytz.UTC
+
+        # Ambiguous times follow dst_check; nonexistent times are resolved like tz.localize(dt)
+        localized = values.dt.tz_localize(
+            zone, ambiguous=dst_checks[group_index].to_numpy(dtype=bool), nonexistent='NaT'
+        ).dt.tz_convert('UTC')
+        utc[group_index] = localized
+        nonexistent = localized.isna()
+        for idx in localized.index[nonexistent]:
+            utc[idx] = zone.localize(values[idx].to_pydatetime()).astimezone(pytz.UTC)
+        if zone is not pytz.UTC:
+            dst[localized.index[nonexistent]] = 'nonexistent'
+            strict = values.dt.tz_localize(zone, ambiguous='NaT', nonexistent='NaT')
+            dst[localized.index[strict.isna() & ~nonexistent]] = 'ambiguous'
+
+    # Unknown formats take the slow path
+    for idx in pending.index[pending]:
+        parsed_us, issues, dst[idx] = _memoized_details(ts[idx], tz[idx], bool(dst_checks[idx]), formats)
+        if parsed_us is not None:
+            utc[idx] = pd.Timestamp(parsed_us, unit='us', tz='UTC')
+        issue[idx] = issues[0] if issues else ''
+
+    return pd.DataFrame({'utc': utc, 'issue': issue, 'dst': dst})
+
+def issue_list(issue):
+    """Turning a normalized issue back into the parse_timestamp issues list"""
+    return [issue] if issue else []
+
+def _utc_microseconds(utc):
+    """UTC datetime column as a numpy datetime64[us] array (NaT kept)"""
+    return utc.dt.tz_localize(None).to_numpy().astype('datetime64[us]')
+
+def format_utc_isoformat(utc):
+    """Column version of datetime.isoformat() for UTC values, None for NaT"""
+    text = pd.Series(np.datetime_as_string(_utc_microseconds(utc), unit='us'), index=utc.index)
+    text = text.str.replace('.000000', '', regex=False) + '+00:00'
+    return text.where(utc.notna(), None)
+
+def epoch_microseconds(utc):
+    """UTC datetime column as integer epoch microseconds, None for NaT"""
+    epoch = pd.Series(_utc_microseconds(utc).astype('int64'), index=utc.index, dtype=object)
+    return epoch.where(utc.notna(), None)
 
 def convert_timezone(utc_dt, target_timezone):
     """Conversion of UTC to Target Timezone"""
     if not target_timezone or target_timezone == 'UTC':
         return utc_dt
     
-    try:
-        tz = pytz.timezone(target_timezone)
-        return utc_dt.astimezone(tz)
-    except pytz.exceptions.UnknownTimeZoneError:
-        return utc_dt
+    tz = resolve_timezone(target_timezone)
+    return utc_dt if tz is None else utc_dt.astimezone(tz)
+
+def local_day_start(date_str, timezone_str):
+    """UTC epoch seconds of local midnight starting a YYYY-MM-DD date in a timezone"""
+    local_midnight = pd.Timestamp(date_str).tz_localize(
+        timezone_str or 'UTC', ambiguous=True, nonexistent='shift_forward'
+    )
+    return int(local_midnight.timestamp())
+
+# Local dates whose midnights pandas timestamps can hold; ranges are clamped to them (no transaction lies outside)
+MIN_SUPPORTED_DATE = date(1678, 1, 1)
+MAX_SUPPORTED_DATE = date(2261, 12, 31)
+
+def local_date_range(start_date, end_date, timezone_str):
+    """
+    Half-open UTC epoch range [start, end) covering local dates start_date..end_date,
+    empty at the nearest bound for dates past MIN_SUPPORTED_DATE..MAX_SUPPORTED_DATE
+    """
+    one_day = timedelta(days=1)
+    first = min(max(datetime.strptime(start_date, '%Y-%m-%d').date(), MIN_SUPPORTED_DATE), MAX_SUPPORTED_DATE + one_day)
+    after = max(min(datetime.strptime(end_date, '%Y-%m-%d').date(), MAX_SUPPORTED_DATE) + one_day, first)
+    return local_day_start(first.isoformat(), timezone_str), local_day_start(after.isoformat(), timezone_str)
+
+# ---------------- Time Bucketing ----------------
+def local_day_buckets(utc, timezone_str):
+    """Local calendar day (as naive midnight) of each value in a UTC datetime column"""
+    return utc.dt.tz_convert(timezone_str or 'UTC').dt.tz_localize(None).dt.normalize()
+
+def local_hour_buckets(utc, timezone_str):
+    """
+    Start of the local clock hour containing each value in a UTC datetime column, as a UTC instant.
+    Keying on the instant keeps the repeated hour of a DST fall back in two separate buckets
+    and handles zones with fractional offsets.
+    """
+    local = utc.dt.tz_convert(timezone_str or 'UTC').dt.tz_localize(None)
+    return utc - (local - local.dt.floor('h'))
+
+def has_whole_hour_offsets(timezone_str, start_ts, end_ts):
+    """Checking that UTC hours map onto local clock hours across [start_ts, end_ts)"""
+    return has_aligned_offsets(timezone_str, start_ts, end_ts, 3600)
+
+def has_aligned_offsets(timezone_str, start_ts, end_ts, seconds):
+    """Checking that UTC buckets of the given length map onto local buckets across [start_ts, end_ts)"""
+    if start_ts % seconds or end_ts % seconds:
+        return False
+    hours = pd.date_range(
+        pd.Timestamp(start_ts, unit='s', tz='UTC'), pd.Timestamp(end_ts, unit='s', tz='UTC'),
+        freq='h', inclusive='left'
+    )
+    offsets = hours.tz_convert(timezone_str or 'UTC').tz_localize(None) - hours.tz_localize(None)
+    return bool((offsets.total_seconds() % seconds == 0).all())
 
 def get_period_bounds(period_str):
     """Obtaining the period between Start Date and End Date (YYYY-MM -> YYYY-MM-DD)"""
@@ -102,6 +388,125 @@ def get_period_bounds(period_str):
     
     return start_date, end_date
 
+# ---------------- Comparison Periods ----------------
+# Calendar periods as inclusive local dates (YYYY-MM-DD) and offsets that shift them, for /api/sales/compare
+PERIOD_OFFSET_PATTERN = re.compile(r'^([+-])(\d+)([ymwd])$')
+
+def parse_period(period_str):
+    """
+    (start_date, end_date) of a period: YYYY, YYYY-Qn, YYYY-MM, ISO week YYYY-Www, a day YYYY-MM-DD
+    or an inclusive range YYYY-MM-DD..YYYY-MM-DD. Raises ValueError for anything else.
+    """
+    period_str = period_str.strip()
+    if '..' in period_str:
+        start_date, end_date = (part.strip() for part in period_str.split('..', 1))
+        if not validate_date(start_date) or not validate_date(end_date) or end_date < start_date:
+            raise ValueError(f"Invalid date range: {period_str}")
+        return start_date, end_date
+    if re.fullmatch(r'\d{4}', period_str):
+        return f"{period_str}-01-01", f"{period_str}-12-31"
+    quarter = re.fullmatch(r'(\d{4})-Q([1-4])', period_str, re.IGNORECASE)
+    if quarter:
+        first_month = 3 * int(quarter.group(2)) - 2
+        start_date = get_period_bounds(f"{quarter.group(1)}-{first_month:02d}")[0]
+        return start_date, get_period_bounds(f"{quarter.group(1)}-{first_month + 2:02d}")[1]
+    if re.fullmatch(r'\d{4}-W\d{2}', period_str, re.IGNORECASE):
+        monday = datetime.strptime(period_str.upper() + '-1', '%G-W%V-%u')
+        return monday.strftime('%Y-%m-%d'), (monday + timedelta(days=6)).strftime('%Y-%m-%d')
+    if re.fullmatch(r'\d{4}-\d{2}', period_str):
+        return get_period_bounds(period_str)
+    if re.fullmatch(r'\d{4}-\d{2}-\d{2}', period_str) and validate_date(period_str):
+        return period_str, period_str
+    raise ValueError(f"Invalid period: {period_str}")
+
+def shift_period(start_date, end_date, offset):
+    """
+    Period moved by an offset such as -1y, +3m, -1w or -7d. Periods ending on a month end keep ending
+    on one, so shifting a month or quarter always gives the whole earlier month or quarter.
+    """
+    match = PERIOD_OFFSET_PATTERN.match(offset.strip())
+    if not match:
+        raise ValueError(f"Invalid offset: {offset}")
+    sign, count, unit = match.groups()
+    count = int(count) * (-1 if sign == '-' else 1)
+    step = {
+        'y': pd.DateOffset(years=count), 'm': pd.DateOffset(months=count),
+        'w': pd.DateOffset(weeks=count), 'd': pd.DateOffset(days=count),
+    }[unit]
+    start, end = pd.Timestamp(start_date) + step, pd.Timestamp(end_date) + step
+    if unit in 'ym' and pd.Timestamp(end_date).is_month_end:
+        end = end + pd.offsets.MonthEnd(0)
+    return start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d')
+
+def expand_periods(period_strs, offsets=()):
+    """
+    (label, start_date, end_date) of each period followed by each period shifted by each offset,
+    labelled like '2024-01 -1y'. Raises ValueError for a malformed period or offset.
+    """
+    periods = [(period_str.strip(), *parse_period(period_str)) for period_str in period_strs]
+    shifted = [
+        (f"{label} {offset.strip()}", *shift_period(start_date, end_date, offset))
+        for offset in offsets for label, start_date, end_date in periods
+    ]
+    return periods + shifted
+
+# ---------------- Currency Conversion ----------------
+class FxRates:
+    """
+    Daily FX rates to BASE_CURRENCY (from database.get_fx_rates) as a dense currency x day table, filled
+    as of each day: the latest rate on or before it, or the currency's earliest rate before its first one
+    (the same rule as database.BASE_AMOUNT_SQL). Days past the table use its last day. Converting a column
+    is one fancy-indexing join on (currency row, day) instead of a lookup per row; currencies without
+    rates convert to NaN.
+    """
+
+    def __init__(self, rows):
+        frame = pd.DataFrame(rows, columns=['currency', 'day_ts', 'rate'])
+        frame = frame[frame['currency'] != BASE_CURRENCY]
+        currencies = sorted(frame['currency'].unique())
+        self.first_day = int(frame['day_ts'].min()) // 86400 if len(frame) else 0
+        days = np.arange(self.first_day, (int(frame['day_ts'].max()) // 86400 if len(frame) else 0) + 1)
+        # Rows: every currency with rates, then BASE_CURRENCY (1.0) and unknown currencies (NaN)
+        self.table = np.empty((len(currencies) + 2, len(days)))
+        for row, (currency, group) in enumerate(frame.sort_values('day_ts').groupby('currency')):
+            positions = np.searchsorted(group['day_ts'].to_numpy() // 86400, days, side='right') - 1
+            self.table[row] = group['rate'].to_numpy('float64')[np.maximum(positions, 0)]
+        self.table[-2], self.table[-1] = 1.0, np.nan
+        self.rows = {currency: row for row, currency in enumerate(currencies)}
+        self.rows[BASE_CURRENCY] = len(currencies)
+
+    def currencies(self):
+        """Currencies amounts can be reported in"""
+        return sorted(self.rows)
+
+    def _day_columns(self, epoch_s):
+        days = np.asarray(epoch_s, dtype='int64') // 86400 - self.first_day
+        return np.clip(days, 0, self.table.shape[1] - 1)
+
+    def rate(self, currency, epoch_s):
+        """Rate of one currency at each epoch second (array), NaN when the currency has no rates"""
+        return self.table[self.rows.get(currency, -1), self._day_columns(epoch_s)]
+
+    def to_base(self, amounts, currencies, epoch_s):
+        """Amounts in their row's currency converted to BASE_CURRENCY"""
+        codes, uniques = pd.factorize(np.asarray(currencies, dtype=object))
+        rows = np.array([self.rows.get(currency, -1) for currency in uniques] + [-1], dtype='int64')
+        return np.asarray(amounts, dtype='float64') * self.table[rows[codes], self._day_columns(epoch_s)]
+
+    def from_base(self, amounts, currency, epoch_s):
+        """BASE_CURRENCY amounts converted to one reporting currency at each value's day"""
+        return np.asarray(amounts, dtype='float64') / self.rate(currency, epoch_s)
+
+_fx_rates = {}  # DB_PATH -> (data generation, FxRates)
+
+def current_fx_rates():
+    """FxRates of the database, reread only after the data generation changes"""
+    generation = database.get_data_generation()
+    cached = _fx_rates.get(database.DB_PATH)
+    if cached is None or cached[0] != generation:
+        cached = _fx_rates[database.DB_PATH] = (generation, FxRates(database.get_fx_rates()))
+    return cached[1]
+
 # ---------------- Data Handling ----------------
 def is_duplicate(new_record, existing_records, new_dt):
     """Checking for duplicate transactions"""
@@ -121,82 +526,492 @@ def is_duplicate(new_record, existing_records, new_dt):
     
     return False
 
-def process_csv_data():
-    """Processing CSV Data"""
-    print("Start processing CSV Data...")
-    if not os.path.exists(CSV_PATH):
-        print(f"CSV file not found: {CSV_PATH}")
-        return
-    
-    # Read CSV
-    df = pd.read_csv(CSV_PATH)
-    print(f"Loaded {len(df)} rows of raw data from CSV")
-    
-    # Cleaning Existing Transactions
-    database.clear_transactions()
-    
-    # Statistics for information
-    stats = {
+EPOCH = datetime(1970, 1, 1, tzinfo=pytz.UTC)
+ONE_MICROSECOND = timedelta(microseconds=1)
+
+def to_epoch_us(utc_dt):
+    """Converting an aware datetime to integer microseconds since the epoch"""
+    return (utc_dt - EPOCH) // ONE_MICROSECOND
+
+class DuplicateDetector:
+    """
+    Indexed duplicate detection keyed on (customer_id, amount).
+    Each key keeps a sorted list of epoch microseconds for the records kept so far,
+    so every check is a binary search instead of a scan over all processed records.
+    Flags exactly the same rows as is_duplicate.
+    """
+
+    def __init__(self, window_seconds=DUPLICATE_TIME_SECONDS):
+        self.window_us = int(window_seconds * 1_000_000)
+        self.newest_us = None
+        self.pruned_before_us = None
+        self.unchecked_count = 0
+        self._times = {}
+
+    def __len__(self):
+        return sum(len(times) for times in self._times.values())
+
+    def is_duplicate(self, customer_id, amount, epoch_us):
+        """Checking whether a kept record with the same key lies within the window"""
+        if epoch_us is None:
+            return False
+        times = self._times.get((customer_id, amount))
+        if not times:
+            return False
+        idx = bisect_left(times, epoch_us - self.window_us)
+        return idx < len(times) and times[idx] <= epoch_us + self.window_us
+
+    def add(self, customer_id, amount, epoch_us):
+        """Remembering a kept record"""
+        if epoch_us is None:
+            return
+        insort(self._times.setdefault((customer_id, amount), []), epoch_us)
+        if self.newest_us is None or epoch_us > self.newest_us:
+            self.newest_us = epoch_us
+
+    def check_and_add(self, customer_id, amount, epoch_us, transaction_id=None):
+        """Returning True for a duplicate, otherwise keeping the record for later checks"""
+        if self.is_duplicate(customer_id, amount, epoch_us):
+            return True
+        if self.pruned_before_us is not None and epoch_us is not None and epoch_us - self.window_us < self.pruned_before_us:
+            # Its window reaches into forgotten records, so an earlier twin may have been missed
+            self.unchecked_count += 1
+        self.add(customer_id, amount, epoch_us)
+        return False
+
+    def prune(self, before_us):
+        """Forgetting kept records older than before_us to bound memory; later rows reaching behind it are counted"""
+        if self.pruned_before_us is None or before_us > self.pruned_before_us:
+            self.pruned_before_us = before_us
+        for key in list(self._times):
+            times = self._times[key]
+            cut = bisect_left(times, before_us)
+            if cut == len(times):
+                del self._times[key]
+            elif cut:
+                del times[:cut]
+
+class StoredDuplicateDetector(DuplicateDetector):
+    """
+    Duplicate detection for incremental ingest.
+    Rows are checked against the new rows kept so far and, through idx_dedup_ts,
+    against the records already stored in the database.
+    """
+
+    def __init__(self, conn, window_seconds=DUPLICATE_TIME_SECONDS):
+        super().__init__(window_seconds)
+        self.conn = conn
+
+    def check_and_add(self, customer_id, amount, epoch_us, transaction_id=None):
+        if epoch_us is not None and self.is_stored_duplicate(customer_id, amount, epoch_us, transaction_id):
+            return True
+        return super().check_and_add(customer_id, amount, epoch_us, transaction_id)
+
+    def is_stored_duplicate(self, customer_id, amount, epoch_us, transaction_id):
+        """Checking stored records (other than this transaction_id) within the window"""
+        # processed_ts keeps whole seconds, so the index range is widened by a second and candidates are rechecked
+        stored = database.find_stored_duplicate(
+            self.conn, customer_id, amount,
+            (epoch_us - self.window_us) // 1_000_000 - 1, (epoch_us + self.window_us) // 1_000_000 + 1,
+            transaction_id
+        )
+        return any(
+            abs(to_epoch_us(datetime.fromisoformat(timestamp)) - epoch_us) <= self.window_us
+            for timestamp in stored
+        )
+
+# Upper bounds (seconds behind the running max) of the lateness histogram buckets; the last bucket is open
+LATENESS_BUCKETS = (60, 300, 3600, 21600, 86400, 604800)
+LATENESS_BUCKET_LABELS = ('<=1m', '<=5m', '<=1h', '<=6h', '<=1d', '<=7d', '>7d')
+
+class OutOfOrderDetector:
+    """
+    Out-of-order arrival detection in file order.
+    Keeps the newest event time seen so far; a row whose event time lies more than lateness_seconds
+    behind it arrived out of order. Every row behind the running max is counted in a fixed-size
+    lateness histogram, so the state is O(1) however long the stream is.
+    """
+
+    def __init__(self, lateness_seconds=OUT_OF_ORDER_LATENESS_SECONDS, newest_us=None, late_count=0, histogram=None):
+        self.lateness_us = int(lateness_seconds * 1_000_000)
+        self.newest_us = newest_us
+        self.late_count = late_count
+        self.histogram = list(histogram) if histogram else [0] * len(LATENESS_BUCKET_LABELS)
+        self._edges = np.array(LATENESS_BUCKETS, dtype='int64') * 1_000_000
+
+    def observe(self, epoch_us):
+        """Late mask of the next rows of the stream (epoch microseconds, NO_TIME rows are never late)"""
+        epoch_us = np.asarray(epoch_us, dtype='int64')
+        late = np.zeros(len(epoch_us), dtype=bool)
+        dated = np.flatnonzero(epoch_us != NO_TIME)
+        if not len(dated):
+            return late
+        times = epoch_us[dated]
+        start = times[0] if self.newest_us is None else max(self.newest_us, times[0])
+        # Newest event time before each row
+        running = np.maximum.accumulate(np.concatenate(([start], times)))
+        lateness = running[:-1] - times
+        self.newest_us = int(running[-1])
+
+        behind = lateness[lateness > 0]
+        buckets = np.searchsorted(self._edges, behind, side='left')
+        for bucket, count in enumerate(np.bincount(buckets, minlength=len(self.histogram)).tolist()):
+            self.histogram[bucket] += count
+        late[dated[lateness > self.lateness_us]] = True
+        self.late_count += int(late.sum())
+        return late
+
+def flag_out_of_order(batch, arrivals, stats, counters=None):
+    """Flagging the late arrivals of a batch (in file order) in its issue bitmask"""
+    late = arrivals.observe(batch.epoch_us)
+    batch.issues[late] |= database.ISSUE_BITS['out_of_order']
+    stats['out_of_order_records'] += int(late.sum())
+    if counters is not None:
+        counters.add(utc_days(batch.epoch_us[late]), out_of_order_records=np.ones(int(late.sum()), dtype='int64'))
+
+def peak_memory_mb():
+    """Peak resident memory of this process in MB (None where unsupported)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def new_stats():
+    """Statistics for information"""
+    return {
         'total_processed': 0,
         'invalid_dates': 0,
         'missing_timezones': 0,
         'duplicate_transactions': 0,
+        'out_of_order_records': 0,
     }
-    
-    processed_records = []
-    
-    # Handling each row in the DataFrame
-    for _, row in df.iterrows():
-        stats['total_processed'] += 1
-        dst_check = False
-
-        # Validating required fields
-        if 'dst' in row['transaction_id'].lower():
-            dst_check = True
-
-        # Analyze timestamp
-        parsed_dt, issues = parse_timestamp(
-            row['timestamp'], 
-            row.get('timezone', ''),
-            dst_check
+
+DAY_US = 86_400_000_000
+
+def utc_days(epoch_us):
+    """Start of the UTC day (epoch seconds) of each epoch microsecond value, UNDATED_DAY for rows without one"""
+    epoch_us = np.asarray(epoch_us, dtype='int64')
+    return np.where(epoch_us == NO_TIME, database.UNDATED_DAY, epoch_us // DAY_US * 86400)
+
+class QualityCounters:
+    """
+    Data quality counts of one ingest batch per UTC day, in database.QUALITY_COUNTER_COLUMNS.
+    Filled alongside the stats dict while rows are processed and saved once the ingest finishes.
+    """
+
+    def __init__(self):
+        self.days = {}  # day_ts -> {counter column: count}
+
+    def add(self, days, **columns):
+        """Adding per-row counts (arrays aligned with days) to the day of each row"""
+        if not len(days):
+            return
+        sums = pd.DataFrame({name: np.asarray(values, dtype='int64') for name, values in columns.items()})
+        sums = sums.groupby(np.asarray(days)).sum()
+        for day, counts in zip(sums.index.tolist(), sums.to_dict('records')):
+            totals = self.days.setdefault(day, dict.fromkeys(database.QUALITY_COUNTER_COLUMNS, 0))
+            for name, count in counts.items():
+                totals[name] += count
+
+    def merge(self, other):
+        for day, counts in other.days.items():
+            totals = self.days.setdefault(day, dict.fromkeys(database.QUALITY_COUNTER_COLUMNS, 0))
+            for name, count in counts.items():
+                totals[name] += count
+
+    def totals(self):
+        """Counts summed over all days"""
+        return {name: sum(counts[name] for counts in self.days.values()) for name in database.QUALITY_COUNTER_COLUMNS}
+
+    def rows(self):
+        """(day_ts, *QUALITY_COUNTER_COLUMNS) rows for database.save_quality_counters"""
+        return [(day, *(self.days[day][name] for name in database.QUALITY_COUNTER_COLUMNS))
+                for day in sorted(self.days)]
+
+def prepare_frame(df, stats, formats=None, dictionaries=None, counters=None, rates=None):
+    """
+    Normalizing one DataFrame of raw CSV rows without deduplicating it.
+    Returns the processed transactions as a RecordBatch, interning text through the source's dictionaries;
+    counters, when given, gets the rows' quality counts per UTC day. Amounts are converted to BASE_CURRENCY
+    with rates (the database's current FxRates by default).
+    """
+    # Analyze all timestamps at once
+    timezones = _clean_strings(df.get('timezone'), df.index)
+    dst_checks = df['transaction_id'].str.lower().str.contains('dst', regex=False)
+    normalized = normalize_timestamps(df['timestamp'], timezones, dst_checks, formats)
+    utc_us = _utc_microseconds(normalized['utc']).astype('int64')
+    stats['total_processed'] += len(df)
+
+    # Skip invalid records
+    invalid = normalized['issue'] == 'invalid_date_format'
+    stats['invalid_dates'] += int(invalid.sum())
+    stats['missing_timezones'] += int((normalized['issue'] == 'missing_timezone').sum())
+    if counters is not None:
+        counters.add(
+            utc_days(utc_us),
+            total_records=np.ones(len(df), dtype='int64'),
+            invalid_dates=invalid.to_numpy(),
+            missing_timezones=(normalized['issue'] == 'missing_timezone').to_numpy(),
+            dst_ambiguous=(normalized['dst'] == 'ambiguous').to_numpy(),
+            dst_nonexistent=(normalized['dst'] == 'nonexistent').to_numpy(),
         )
-        
-        # Skip invalid records
-        if 'invalid_date_format' in issues:
-            stats['invalid_dates'] += 1
-            continue
-        if 'missing_timezone' in issues:
-            stats['missing_timezones'] += 1
-        
-        # Creating Processed Record
-        record = {
-            'transaction_id': str(row['transaction_id']),
-            'customer_id': str(row['customer_id']),
-            'amount': float(row['amount']),
-            'currency': str(row['currency']),
-            'original_timestamp': str(row['timestamp']),
-            'original_timezone': safe_string(row.get('timezone', '')),
-            'processed_timestamp': parsed_dt.isoformat() if parsed_dt else None,
-            'processed_timezone': 'UTC',
-            'status': str(row['status']),
-            'product_category': str(row['product_category']),
-            'data_quality_flags': json.dumps({'issues': issues}),
-            'created_at': datetime.utcnow().isoformat() + 'Z'
-        }
-        
-        # Checking for duplicates
-        if is_duplicate(record, processed_records, parsed_dt):
-            stats['duplicate_transactions'] += 1
-            continue
-        
-        processed_records.append(record)
-    # Inserting processed records into the database
-    database.insert_many_transactions(processed_records)
+    df, normalized, timezones = df[~invalid], normalized[~invalid], timezones[~invalid]
+    utc_us = utc_us[~invalid.to_numpy()]
+
+    # Converting every amount to the base currency in one join against the rate table
+    amounts = df['amount'].astype(float)
+    currencies = df['currency'].astype(str)
+    rates = rates or current_fx_rates()
+
+    # Creating Processed Records
+    return RecordBatch.from_columns({
+        'transaction_id': df['transaction_id'].astype(str),
+        'customer_id': df['customer_id'].astype(str),
+        'amount': amounts,
+        'amount_base': rates.to_base(amounts, currencies, utc_us // 1_000_000),
+        'currency': currencies,
+        'original_timestamp': df['timestamp'].astype(str),
+        'original_timezone': timezones,
+        'epoch_us': epoch_microseconds(normalized['utc']),
+        'status': df['status'].astype(str),
+        'product_category': df['product_category'].astype(str),
+        'issue': normalized['issue'],
+    }, dictionaries or RecordDictionaries(), datetime.utcnow().isoformat() + 'Z')
+
+def process_frame(df, detector, stats, formats=None, dictionaries=None, counters=None, arrivals=None):
+    """
+    Normalizing and deduplicating one DataFrame of raw CSV rows.
+    arrivals, when given, is the stream's OutOfOrderDetector; late rows are flagged before deduplication.
+    Returns the kept transactions as a RecordBatch.
+    """
+    batch = prepare_frame(df, stats, formats, dictionaries, counters)
+    if arrivals is not None:
+        flag_out_of_order(batch, arrivals, stats, counters)
+
+    # Checking for duplicates
+    keep = np.array([
+        not detector.check_and_add(customer_id, amount, epoch_us, transaction_id)
+        for customer_id, amount, epoch_us, transaction_id in zip(
+            batch.column('customer_id'), batch.amount.tolist(), batch.epoch_values(), batch.transaction_id.tolist()
+        )
+    ], dtype=bool)
+    stats['duplicate_transactions'] += int(len(keep) - keep.sum())
+    if counters is not None:
+        dropped = batch.epoch_us[~keep]
+        counters.add(utc_days(dropped), duplicate_transactions=np.ones(len(dropped), dtype='int64'))
+
+    return batch.take(keep)
+
+# ---------------- Parallel Ingest ----------------
+SHARDS_PER_WORKER = 4  # More shards than workers so a slow shard does not hold up the pool
+
+def split_csv(csv_path, shard_count):
+    """Byte ranges [start, end) of the data rows, cut into up to shard_count shards on line boundaries"""
+    size = os.path.getsize(csv_path)
+    with open(csv_path, 'rb') as f:
+        f.readline()
+        bounds = [f.tell()]
+        data_start = bounds[0]
+        for i in range(1, shard_count):
+            f.seek(max(data_start + (size - data_start) * i // shard_count - 1, bounds[-1]))
+            f.readline()  # Moving to the start of the next line
+            if bounds[-1] < f.tell() < size:
+                bounds.append(f.tell())
+        bounds.append(size)
+    return [(start, end) for start, end in zip(bounds, bounds[1:]) if start < end]
+
+def normalize_shard(csv_path, start, end):
+    """Worker: normalizing the rows in one byte range of the CSV file"""
+    with open(csv_path, 'rb') as f:
+        header = f.readline()
+        f.seek(start)
+        data = f.read(end - start)
+    stats = new_stats()
+    counters = QualityCounters()
+    df = pd.read_csv(io.BytesIO(header + data), dtype=CSV_DTYPES)
+    return prepare_frame(df, stats, counters=counters), stats, counters
+
+def find_duplicates(customer_ids, amounts, epoch_us, window_seconds=DUPLICATE_TIME_SECONDS):
+    """
+    Duplicate mask for rows in file order, flagging exactly what DuplicateDetector would.
+    One sort over (customer_id, amount, epoch) finds the keys that have two rows within the window;
+    only those keys are replayed through a DuplicateDetector in file order, all other rows are kept.
+    """
+    window_us = int(window_seconds * 1_000_000)
+    epoch_us = pd.Series(epoch_us, dtype=object).reset_index(drop=True)
+    valid = (epoch_us.notna() & pd.Series(amounts).notna().reset_index(drop=True)).to_numpy()
+    times = np.where(valid, epoch_us.to_numpy(), 0).astype('int64')
+    customer_codes = pd.factorize(pd.Series(customer_ids))[0].astype('int64')
+    amount_codes = pd.factorize(pd.Series(amounts))[0].astype('int64')
+    keys = customer_codes * (int(amount_codes.max(initial=0)) + 1) + amount_codes
+
+    rows = np.flatnonzero(valid)
+    order = rows[np.lexsort((times[rows], keys[rows]))]
+    sorted_keys, sorted_times = keys[order], times[order]
+    close = (sorted_keys[1:] == sorted_keys[:-1]) & (sorted_times[1:] - sorted_times[:-1] <= window_us)
+    candidates = np.flatnonzero(valid & np.isin(keys, sorted_keys[1:][close]))
+
+    duplicate = np.zeros(len(keys), dtype=bool)
+    detector = DuplicateDetector(window_seconds)
+    for i in candidates:
+        duplicate[i] = detector.check_and_add(customer_codes[i], amount_codes[i], int(times[i]))
+    return duplicate
+
+def normalize_in_parallel(csv_path, stats, workers=None, counters=None, arrivals=None):
+    """
+    Normalizing the CSV file in worker processes, one byte-range shard at a time,
+    then detecting late arrivals and duplicates across shards. Returns the kept rows in file order.
+    """
+    workers = workers or INGEST_WORKERS or os.cpu_count() or 1
+    shards = split_csv(csv_path, workers * SHARDS_PER_WORKER)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(
+            normalize_shard, repeat(csv_path), [start for start, _ in shards], [end for _, end in shards]
+        ))
+    for _, shard_stats, shard_counters in results:
+        for key in stats:
+            stats[key] += shard_stats[key]
+        if counters is not None:
+            counters.merge(shard_counters)
+    print(f"Normalized {len(shards)} shards in {workers} worker processes")
+
+    # Merging the shard dictionaries so equal customer ids share a code
+    batch = RecordBatch.concat([shard for shard, _, _ in results])
+    if arrivals is not None:
+        # The running max has to see the shards in file order, so this pass stays in this process
+        flag_out_of_order(batch, arrivals, stats, counters)
+    duplicate = find_duplicates(batch.codes['customer_id'], batch.amount, batch.epoch_values())
+    stats['duplicate_transactions'] += int(duplicate.sum())
+    if counters is not None:
+        dropped = batch.epoch_us[duplicate]
+        counters.add(utc_days(dropped), duplicate_transactions=np.ones(len(dropped), dtype='int64'))
+    batch.created_at = datetime.utcnow().isoformat() + 'Z'
+    return batch.take(~duplicate)
+
+# ---------------- Ingest ----------------
+def read_new_rows(csv_path, byte_offset):
+    """
+    Reading the complete lines appended after byte_offset.
+    Returns (DataFrame, new byte offset); a partly written last line is left for the next run.
+    """
+    with open(csv_path, 'rb') as f:
+        header = f.readline()
+        f.seek(byte_offset)
+        data = f.read()
+    data = data[:data.rfind(b'\n') + 1]
+    if not data.strip():
+        return None, byte_offset
+    df = pd.read_csv(io.BytesIO(header + data), dtype=CSV_DTYPES)
+    return df, byte_offset + len(data)
+
+INGEST_DISABLED = None  # Why this process must not ingest (set by the web server entry points), None allows it
+
+def process_csv_data(csv_path=None, mode=None, chunk_size=None, workers=None):
+    """
+    Processing CSV Data
+    'full' loads the whole file, 'streaming' reads and commits it in chunks,
+    'incremental' only parses rows appended since the last run and upserts them,
+    'parallel' normalizes byte-range shards in worker processes and loads them from this process.
+    """
+    if INGEST_DISABLED:
+        raise RuntimeError(f"Ingest is disabled in this process ({INGEST_DISABLED}), run it separately")
+    csv_path = csv_path or CSV_PATH
+    mode = mode or INGEST_MODE
+    print("Start processing CSV Data...")
+    if not os.path.exists(csv_path):
+        print(f"CSV file not found: {csv_path}")
+        return
+    if mode not in INGEST_MODES:
+        raise ValueError(f"Unknown ingest mode: {mode}")
+
+    database.ensure_schema()  # Also loads FX_RATES_PATH into an empty rate table
+    generation = database.get_data_generation()
+    source = os.path.abspath(csv_path)
+    state = database.get_ingest_state(source)
+    if mode == 'incremental' and not database.can_resume(csv_path, state):
+        print("No usable high-water mark for this file, running a full load")
+        mode = 'full'
     
-    # Updating data quality summary
-    database.update_quality_summary(stats)
+    stats = new_stats()
+    formats = TimestampFormats()
+    dictionaries = RecordDictionaries()
+    counters = QualityCounters()
+    arrivals = OutOfOrderDetector()
+    started = time.perf_counter()
+
+    if mode == 'incremental':
+        byte_offset, row_count, _ = state
+        # Continuing the running max where the last run of this file stopped
+        arrival_state = database.get_arrival_state(source)
+        if arrival_state is not None:
+            arrivals = OutOfOrderDetector(OUT_OF_ORDER_LATENESS_SECONDS, *arrival_state)
+        df, new_offset = read_new_rows(csv_path, byte_offset)
+        stored = 0
+        touched_hours = set()
+        if df is not None:
+            print(f"Loaded {len(df)} new rows of raw data from CSV")
+            with database.BulkWriter(upsert=True) as writer:
+                detector = StoredDuplicateDetector(writer.conn)
+                stored = writer.write(process_frame(df, detector, stats, formats, dictionaries, counters, arrivals))
+                touched_hours = writer.touched_hours
+            # Updating data quality summary with the deltas
+            database.apply_quality_delta(stats)
+            database.save_arrival_state(source, arrivals.newest_us, arrivals.late_count, arrivals.histogram)
+            database.save_quality_counters(source, mode, counters.rows())
+        row_count += stats['total_processed']
+        # Rewriting the columnar partitions of the days that changed
+        columnar.sync_store(generation, touched_hours)
+    else:
+        detector = DuplicateDetector()
+        new_offset = os.path.getsize(csv_path)
+        if mode == 'parallel':
+            # Normalizing in worker processes before the table is cleared
+            processed = normalize_in_parallel(csv_path, stats, workers, counters, arrivals)
+        # Cleaning Existing Transactions and loading through the bulk writer
+        with database.BulkWriter(full_reload=True) as writer:
+            if mode == 'parallel':
+                writer.write(processed)
+            elif mode == 'streaming':
+                horizon_us = None if STREAM_DEDUP_HORIZON_SECONDS is None else STREAM_DEDUP_HORIZON_SECONDS * 1_000_000
+                for chunk in pd.read_csv(csv_path, dtype=CSV_DTYPES, chunksize=chunk_size or INGEST_CHUNK_SIZE):
+                    # Committing each chunk as it finishes
+                    writer.write(process_frame(chunk, detector, stats, formats, dictionaries, counters, arrivals))
+
+                    if horizon_us is not None and detector.newest_us is not None:
+                        detector.prune(detector.newest_us - horizon_us)
+                if detector.unchecked_count:
+                    print(f"Warning: {detector.unchecked_count} rows arrived more than STREAM_DEDUP_HORIZON_SECONDS "
+                          f"behind the newest row and were only checked for duplicates inside the horizon")
+            else:
+                # Read CSV
+                df = pd.read_csv(csv_path, dtype=CSV_DTYPES)
+                print(f"Loaded {len(df)} rows of raw data from CSV")
+                # Inserting processed records into the database
+                writer.write(process_frame(df, detector, stats, formats, dictionaries, counters, arrivals))
+            stored = writer.rows_written
+
+        # Updating data quality summary
+        database.update_quality_summary(stats)
+        # A full load starts the out-of-order state and quality counter history over
+        database.save_arrival_state(
+            source, arrivals.newest_us, arrivals.late_count, arrivals.histogram, replace=True
+        )
+        database.save_quality_counters(source, mode, counters.rows(), replace=True)
+        row_count = stats['total_processed']
+        columnar.sync_store(generation)
+
+    # Remembering how far this file has been ingested
+    database.save_ingest_state(source, new_offset, row_count, database.source_fingerprint(csv_path, new_offset))
+    elapsed = time.perf_counter() - started
     
-    print(f"Process Completed：{len(processed_records)} rows of vaild transactions")
+    print(f"Process Completed：{stored} rows of vaild transactions")
     print(f"Skip Invaild Date：{stats['invalid_dates']} rows")
     print(f"Skip Duplicated Records：{stats['duplicate_transactions']} rows")
-    print(f"Missing Timezone：{stats['missing_timezones']} rows")
\ No newline at end of file
+    print(f"Missing Timezone：{stats['missing_timezones']} rows")
+    print(f"Out of Order：{stats['out_of_order_records']} rows")
+    if mode in ('streaming', 'parallel'):
+        peak = peak_memory_mb()
+        print(f"Throughput：{stats['total_processed'] / elapsed if elapsed else 0:.0f} rows/sec")
+        print(f"Peak Memory：{peak:.1f} MB" if peak is not None else "Peak Memory：unavailable")
+    return stats
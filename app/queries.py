@@ -0,0 +1,381 @@
+import heapq
+import numpy as np
+import pandas as pd
+import config
+import database
+import processors
+import columnar
+import sketches
+
+# ---------------- Sales Queries ----------------
+# Every filter is a half-open range on processed_ts (UTC epoch seconds) so that
+# SQLite can search idx_status_processed_ts instead of scanning the table.
+# Ranges made of whole UTC hours are answered from sales_rollup_hourly, whose
+# size does not grow with the number of transactions. Other ranges read raw rows
+# from the columnar store when it is current, and from SQLite otherwise.
+# Every row carries its amount_base (BASE_CURRENCY, stored at ingest) next to the raw amount, so a
+# reporting currency only costs one vectorized division of the summed rows by the day's rate.
+# Filters and group_by on status, currency and product_category are answered by the rollup (they are
+# part of its primary key) and the columnar store (dictionary columns), otherwise transactions are read
+# through idx_status_processed_ts, idx_category_status_ts, idx_currency_status_ts or, for one customer,
+# an index on customer_id, and grouped rows are summed per group in SQL.
+
+SALES_DIMENSIONS = {'category': 'product_category', 'currency': 'currency', 'status': 'status', 'customer': 'customer_id'}
+ROLLUP_DIMENSIONS = ('status', 'currency', 'product_category')
+DEFAULT_SALES_FILTERS = {'status': 'completed'}
+RAW_BUCKET_SECONDS = 900  # Grouped raw rows are summed per UTC quarter hour when local days and hours align with it
+
+SALES_SQL = '''
+    SELECT {columns}
+    FROM {table}
+    WHERE {where}
+    {group_by}
+    ORDER BY {order_by}
+'''
+
+def sales_query(start_ts, end_ts, filters=None, group_by=None, rollup=False, bucket_seconds=None):
+    """
+    SQL and parameters reading sales in [start_ts, end_ts) as (processed_ts, [group_by,] amount, amount_base,
+    transaction_count) rows in processed_ts order. filters maps SALES_DIMENSIONS columns to a required value
+    (None keeps every value), by default completed sales. Rollup rows are summed per UTC hour; transactions
+    are one row each, or summed per bucket_seconds bucket (per second without one) when grouped.
+    """
+    filters = DEFAULT_SALES_FILTERS if filters is None else filters
+    # A customer's rows are few, so its filter leads through an index on customer_id and the others are
+    # written as +column to keep SQLite from reading the whole range through idx_status_processed_ts instead
+    prefix = '+' if filters.get('customer_id') is not None else ''
+    ts_column = 'hour_ts' if rollup else f'{prefix}processed_ts'
+    clauses, params = [f"{ts_column} >= ? AND {ts_column} < ?"], [start_ts, end_ts]
+    for name, value in filters.items():
+        if value is not None:
+            clauses.append(f"{'' if name == 'customer_id' else prefix}{name} = ?")
+            params.append(value)
+    group_column = f", {group_by}" if group_by else ''
+    if rollup:
+        columns = (f"hour_ts AS processed_ts{group_column}, SUM(total_amount) AS amount, "
+                   "SUM(total_amount_base) AS amount_base, SUM(transaction_count) AS transaction_count")
+        group_sql = f"GROUP BY hour_ts{group_column}"
+    elif group_by:
+        bucket = f"processed_ts - processed_ts % {int(bucket_seconds)}" if bucket_seconds else 'processed_ts'
+        columns = (f"{bucket} AS processed_ts{group_column}, SUM(amount) AS amount, "
+                   "SUM(amount_base) AS amount_base, COUNT(*) AS transaction_count")
+        group_sql = 'GROUP BY 1, 2'
+    else:
+        columns = 'processed_ts, amount, amount_base, 1 AS transaction_count'
+        group_sql = ''
+    # Ordering grouped rows by their group too lets SQLite sort them once, for the GROUP BY
+    sql = SALES_SQL.format(columns=columns, table='sales_rollup_hourly' if rollup else 'transactions',
+                           where=' AND '.join(clauses), group_by=group_sql, order_by='1, 2' if group_by else '1')
+    return sql, params
+
+def use_rollup(start_ts, end_ts, timezone_str='UTC'):
+    """Checking whether a range can be answered from the hourly rollup"""
+    return config.USE_SALES_ROLLUP and processors.has_whole_hour_offsets(timezone_str, start_ts, end_ts)
+
+def get_sales(start_ts, end_ts, timezone_str='UTC', currency=None, filters=None, group_by=None):
+    """
+    Sales in [start_ts, end_ts) as (processed_ts, [group_by,] amount, amount_base, transaction_count) rows:
+    one row per UTC hour (and group) from the rollup when the timezone and columns allow it, otherwise
+    one row per transaction, or per quarter hour and group when grouped (per second when the timezone's
+    offsets are not whole quarter hours). filters and group_by use
+    column names (see sales_query); by default completed sales of every group are summed together.
+    With a currency, amount is amount_base converted at each row's daily rate (NaN without a rate).
+    """
+    filters = DEFAULT_SALES_FILTERS if filters is None else filters
+    rollup_columns = all(name in ROLLUP_DIMENSIONS for name, value in filters.items() if value is not None) \
+        and group_by in (None, *ROLLUP_DIMENSIONS)
+    df = None
+    if rollup_columns and use_rollup(start_ts, end_ts, timezone_str):
+        sql, params = sales_query(start_ts, end_ts, filters, group_by, rollup=True)
+    else:
+        aligned = processors.has_aligned_offsets(timezone_str, start_ts, end_ts, RAW_BUCKET_SECONDS)
+        bucket_seconds = RAW_BUCKET_SECONDS if aligned else None
+        df = columnar.read_sales(start_ts, end_ts, filters, group_by, bucket_seconds)
+        sql, params = sales_query(start_ts, end_ts, filters, group_by, bucket_seconds=bucket_seconds)
+    if df is None:
+        with database.read_connection() as conn:
+            df = pd.read_sql_query(sql, conn, params=params)
+    if currency is not None:
+        rates = processors.current_fx_rates()
+        df['amount'] = rates.from_base(df['amount_base'].astype(float), currency, df['processed_ts'])
+    return df
+
+def merge_ranges(ranges):
+    """Sorted, non-overlapping (start_ts, end_ts) spans covering every range"""
+    spans = []
+    for start_ts, end_ts in sorted(ranges):
+        if spans and start_ts <= spans[-1][1]:
+            spans[-1][1] = max(spans[-1][1], end_ts)
+        else:
+            spans.append([start_ts, end_ts])
+    return [tuple(span) for span in spans]
+
+def _range_positions(ranges, currency, timezone_str, filters, group_by):
+    """Sales of the merged ranges read once in processed_ts order, with each range's (lo, hi) positions in them"""
+    frames = [get_sales(start_ts, end_ts, timezone_str, currency, filters, group_by)
+              for start_ts, end_ts in merge_ranges(ranges)]
+    frames = [frame for frame in frames if len(frame)]
+    if not frames:
+        frames = [pd.DataFrame({'processed_ts': np.array([], 'int64'), 'amount': np.array([]),
+                                'transaction_count': np.array([], 'int64')})]
+    df = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+    ts = df['processed_ts'].to_numpy('int64')
+    starts = np.searchsorted(ts, [start_ts for start_ts, _ in ranges])
+    ends = np.searchsorted(ts, [end_ts for _, end_ts in ranges])
+    return df, zip(starts, ends)
+
+def get_period_totals(ranges, currency=None, timezone_str='UTC', filters=None):
+    """
+    (total_sales, transaction_count) of the sales matching filters (completed by default) for each
+    (start_ts, end_ts) range. The sales of the merged ranges are read once in processed_ts order and every
+    range is the difference of two prefix sums, so the number of ranges (and their overlaps) adds no queries.
+    Without a currency amounts are summed as stored; with one, base amounts are converted at each row's
+    daily rate (rows of currencies without rates add nothing).
+    """
+    df, positions = _range_positions(ranges, currency, timezone_str, filters, None)
+    sales = np.zeros(len(df) + 1)
+    counts = np.zeros(len(df) + 1, dtype='int64')
+    np.cumsum(np.nan_to_num(df['amount'].to_numpy('float64')), out=sales[1:])
+    np.cumsum(df['transaction_count'].to_numpy('int64'), out=counts[1:])
+    return [(float(sales[hi] - sales[lo]), int(counts[hi] - counts[lo])) for lo, hi in positions]
+
+def get_period_groups(ranges, group_by, currency=None, timezone_str='UTC', filters=None):
+    """
+    [(group, total_sales, transaction_count)] of each (start_ts, end_ts) range split by a column, largest
+    sales first, from the same single read as get_period_totals (each range sums its own slice per group).
+    """
+    df, positions = _range_positions(ranges, currency, timezone_str, filters, group_by)
+    codes, groups = pd.factorize(df[group_by]) if len(df) else (np.array([], 'int64'), [])
+    amounts = np.nan_to_num(df['amount'].to_numpy('float64'))
+    counts = df['transaction_count'].to_numpy('int64')
+    results = []
+    for lo, hi in positions:
+        sales = np.bincount(codes[lo:hi], weights=amounts[lo:hi], minlength=len(groups))
+        transactions = np.bincount(codes[lo:hi], weights=counts[lo:hi], minlength=len(groups))
+        order = [i for i in np.lexsort((np.arange(len(groups)), -sales)) if transactions[i]]
+        results.append([(groups[i], float(sales[i]), int(transactions[i])) for i in order])
+    return results
+
+# ---------------- Unique Customers ----------------
+# Distinct customers of a range merge the HyperLogLog sketches of the whole UTC hours it covers
+# (customer_sketch_hourly, searched by its (hour_ts, status) key) with sketches built from the raw rows of
+# the partial hours at its edges, which only local days of fractional-offset timezones have.
+
+CUSTOMER_SKETCHES_SQL = '''
+    SELECT registers FROM customer_sketch_hourly
+    WHERE hour_ts >= ? AND hour_ts < ? {status}
+'''
+
+RAW_CUSTOMERS_SQL = '''
+    SELECT customer_id FROM transactions
+    WHERE {status} processed_ts >= ? AND processed_ts < ?
+'''
+
+def has_customer_sketches(filters):
+    """Whether the customer sketches answer filters: they split customers by status only"""
+    return all(value is None for name, value in filters.items() if name != 'status')
+
+def get_unique_customers(ranges, filters=None):
+    """
+    Estimated distinct customers of the sales matching filters (completed by default) in each
+    (start_ts, end_ts) range, within about 1.6% (see sketches.py). The ranges are cut into the disjoint
+    pieces between their bounds, each piece is sketched once and every range merges its pieces.
+    None when the sketches cannot answer filters (see has_customer_sketches).
+    """
+    filters = DEFAULT_SALES_FILTERS if filters is None else filters
+    if not has_customer_sketches(filters):
+        return None
+    status = filters.get('status')
+    sketch_sql = CUSTOMER_SKETCHES_SQL.format(status='AND status = ?' if status else '')
+    raw_sql = RAW_CUSTOMERS_SQL.format(status='status = ? AND' if status else '')
+    status_params = [status] if status else []
+
+    bounds = np.unique([ts for start_ts, end_ts in ranges for ts in (start_ts, end_ts)])
+    pieces = np.zeros((max(len(bounds) - 1, 0), sketches.REGISTER_COUNT), dtype='uint8')
+    needed = np.zeros(len(pieces), dtype=bool)
+    for start_ts, end_ts in ranges:
+        needed[np.searchsorted(bounds, start_ts):np.searchsorted(bounds, end_ts)] = True
+
+    with database.read_connection() as conn:
+        for i in np.flatnonzero(needed):
+            start_ts, end_ts = int(bounds[i]), int(bounds[i + 1])
+            first_hour, last_hour = -(-start_ts // 3600) * 3600, end_ts - end_ts % 3600
+            if first_hour < last_hour:
+                for registers, in conn.execute(sketch_sql, (first_hour, last_hour, *status_params)):
+                    sketches.merge_into(pieces[i], registers)
+                partial = [(start_ts, first_hour), (last_hour, end_ts)]
+            else:
+                partial = [(start_ts, end_ts)]
+            customer_ids = [row[0] for lo, hi in partial if lo < hi
+                            for row in conn.execute(raw_sql, (*status_params, lo, hi))]
+            if customer_ids:
+                np.maximum(pieces[i], sketches.build(np.zeros(len(customer_ids), 'int64'), 1, customer_ids)[0],
+                           out=pieces[i])
+
+    merged = [pieces[np.searchsorted(bounds, start_ts):np.searchsorted(bounds, end_ts)].max(axis=0, initial=0)
+              for start_ts, end_ts in ranges]
+    return [int(round(count)) for count in sketches.estimate(np.array(merged).reshape(-1, sketches.REGISTER_COUNT))]
+
+# ---------------- Top Customers ----------------
+# Whole UTC days of a range are ranked from customer_topk_daily (see database.py for the error bound),
+# partial days at its edges and ranges of at most TOP_CUSTOMERS_EXACT_MAX_DAYS days from the completed
+# sales themselves, read through idx_status_processed_ts and summed per customer.
+
+TOPK_DAYS_SQL = '''
+    SELECT customer_id, SUM(value), SUM(day_floor)
+    FROM customer_topk_daily
+    WHERE metric = ? AND day_ts >= ? AND day_ts < ?
+    GROUP BY customer_id
+'''
+
+TOPK_FLOORS_SQL = '''
+    SELECT SUM(day_floor) FROM (
+        SELECT MAX(day_floor) AS day_floor
+        FROM customer_topk_daily
+        WHERE metric = ? AND day_ts >= ? AND day_ts < ?
+        GROUP BY day_ts
+    )
+'''
+
+CUSTOMER_TOTALS_SQL = '''
+    SELECT customer_id, {expression}
+    FROM transactions
+    WHERE status = 'completed' AND processed_ts >= ? AND processed_ts < ?
+    GROUP BY customer_id
+'''
+
+def use_exact_top_customers(start_ts, end_ts):
+    """Whether a range is short enough to rank its customers from transactions"""
+    return end_ts - start_ts <= config.TOP_CUSTOMERS_EXACT_MAX_DAYS * 86400
+
+def get_top_customers(start_ts, end_ts, metric='spend', limit=10, exact=False):
+    """
+    The limit customers with the highest metric (a database.TOP_CUSTOMER_METRICS key) over the completed
+    sales in [start_ts, end_ts), as ([(customer_id, value, max_error)], error_bound), highest first.
+    exact sums the range's transactions. Otherwise whole UTC days come from the daily summaries: a customer
+    missing from a day is credited with that day's floor, so value may overstate the true value by up to
+    max_error (and never understates it), and error_bound is the largest max_error any customer can get.
+    """
+    first_day = -(-start_ts // 86400) * 86400
+    last_day = end_ts - end_ts % 86400
+    if exact or first_day >= last_day:
+        first_day = last_day = end_ts
+    values, errors, error_bound = {}, {}, 0.0
+    with database.read_connection() as conn:
+        if first_day < last_day:
+            error_bound = conn.execute(TOPK_FLOORS_SQL, (metric, first_day, last_day)).fetchone()[0] or 0.0
+            for customer_id, value, floors in conn.execute(TOPK_DAYS_SQL, (metric, first_day, last_day)):
+                values[customer_id] = value
+                errors[customer_id] = error_bound - floors
+        totals_sql = CUSTOMER_TOTALS_SQL.format(expression=database.TOP_CUSTOMER_METRICS[metric])
+        for lo, hi in ((start_ts, first_day), (last_day, end_ts)):
+            if lo >= hi:
+                continue
+            for customer_id, value in conn.execute(totals_sql, (lo, hi)):
+                if value is not None:
+                    values[customer_id] = values.get(customer_id, 0) + value
+                    errors.setdefault(customer_id, error_bound)
+    ranked = heapq.nsmallest(limit, values, key=lambda customer_id: (-(values[customer_id] + errors[customer_id]),
+                                                                     customer_id))
+    return [(customer_id, values[customer_id] + errors[customer_id], errors[customer_id])
+            for customer_id in ranked], error_bound
+
+# ---------------- Data Quality Queries ----------------
+# Per-issue counts come from the quality_issues bitmask with one bit test per issue, reading only
+# idx_quality_issues (a partial index over the rows with issues). Its category and currency filters are
+# written as +column so SQLite does not pick idx_category_status_ts or idx_currency_status_ts, which would
+# visit every row of that value. Record totals for the same filter come from sales_rollup_hourly when the range is made
+# of whole UTC hours.
+
+ISSUE_COUNTS_SQL = '''
+    SELECT COUNT(*), {issue_columns}
+    FROM transactions
+    WHERE {{where}} AND quality_issues != 0
+'''.format(issue_columns=', '.join(f"SUM((quality_issues & {bit}) != 0)" for bit in database.ISSUE_BITS.values()))
+
+def _quality_filters(start_ts, end_ts, category, currency, ts_column, dimension_prefix=''):
+    """WHERE clauses and parameters shared by the data quality queries"""
+    clauses, params = [], []
+    if start_ts is not None:
+        clauses.append(f"{ts_column} >= ? AND {ts_column} < ?")
+        params += [start_ts, end_ts]
+    if category:
+        clauses.append(f"{dimension_prefix}product_category = ?")
+        params.append(category)
+    if currency:
+        clauses.append(f"{dimension_prefix}currency = ?")
+        params.append(currency)
+    return clauses, params
+
+def get_issue_counts(start_ts=None, end_ts=None, category=None, currency=None):
+    """
+    Stored records and per-issue counts matching the filters, as
+    (total_records, records_with_issues, {issue: count}). Without a range every stored row counts,
+    including rows without a timestamp.
+    """
+    issue_clauses, issue_params = _quality_filters(start_ts, end_ts, category, currency, 'processed_ts', '+')
+    issue_sql = ISSUE_COUNTS_SQL.format(where=' AND '.join(issue_clauses) or '1')
+    if start_ts is not None and use_rollup(start_ts, end_ts):
+        rollup_clauses, rollup_params = _quality_filters(start_ts, end_ts, category, currency, 'hour_ts')
+        total_sql = f"SELECT SUM(transaction_count) FROM sales_rollup_hourly WHERE {' AND '.join(rollup_clauses)}"
+        total_params = rollup_params
+    else:
+        clauses, params = _quality_filters(start_ts, end_ts, category, currency, 'processed_ts')
+        total_sql = f"SELECT COUNT(*) FROM transactions {'WHERE ' + ' AND '.join(clauses) if clauses else ''}"
+        total_params = params
+    with database.read_connection() as conn:
+        with_issues, *counts = conn.execute(issue_sql, issue_params).fetchone()
+        total_records = conn.execute(total_sql, total_params).fetchone()[0]
+    return int(total_records or 0), int(with_issues), {
+        name: int(count or 0) for name, count in zip(database.ISSUE_BITS, counts)
+    }
+
+# ---------------- Quality Counter Queries ----------------
+# Quality counts of UTC day ranges are sums over quality_counters_daily, a few rows per day and ingest
+# batch, read in primary key order (day_ts, batch_id) instead of scanning transactions.
+
+QUALITY_GROUPS = ('day', 'ingest')
+
+QUALITY_COUNTERS_SQL = '''
+    SELECT {{group_columns}} {sums}
+    FROM quality_counters_daily c JOIN ingest_batches b ON b.batch_id = c.batch_id
+    WHERE {{where}}
+    {{group_by}}
+'''.format(sums=', '.join(f"SUM(c.{name})" for name in database.QUALITY_COUNTER_COLUMNS))
+
+def get_quality_counters(start_ts=None, end_ts=None, group_by=None):
+    """
+    Quality counters of the UTC days in [start_ts, end_ts) summed per group, as a list of
+    (group, {counter column: count}). group is None without group_by, the day_ts for 'day'
+    (UNDATED_DAY for rows without a timestamp) and (batch_id, mode, finished_at) for 'ingest'.
+    Without a range every day counts, including the undated rows.
+    """
+    if start_ts is None:
+        where, params = '1', []
+    else:
+        where, params = 'c.day_ts >= ? AND c.day_ts < ?', [start_ts, end_ts]
+    group_columns, group_sql, group_width = {
+        None: ('', '', 0),
+        'day': ('c.day_ts,', 'GROUP BY c.day_ts ORDER BY c.day_ts', 1),
+        'ingest': ('c.batch_id, b.mode, b.finished_at,', 'GROUP BY c.batch_id ORDER BY c.batch_id', 3),
+    }[group_by]
+    sql = QUALITY_COUNTERS_SQL.format(group_columns=group_columns, where=where, group_by=group_sql)
+    with database.read_connection() as conn:
+        rows = conn.execute(sql, params).fetchall()
+
+    groups = []
+    for row in rows:
+        group = None if group_width == 0 else row[0] if group_width == 1 else tuple(row[:group_width])
+        groups.append((group, {
+            name: int(count or 0) for name, count in zip(database.QUALITY_COUNTER_COLUMNS, row[group_width:])
+        }))
+    return groups
+
+def has_backfilled_counters(start_ts=None, end_ts=None):
+    """Whether any counted day of [start_ts, end_ts) comes from a backfill batch (which counts no duplicates)"""
+    where, params = ('1', []) if start_ts is None else ('c.day_ts >= ? AND c.day_ts < ?', [start_ts, end_ts])
+    with database.read_connection() as conn:
+        return conn.execute(f'''
+            SELECT 1 FROM quality_counters_daily c JOIN ingest_batches b ON b.batch_id = c.batch_id
+            WHERE b.mode = ? AND {where} LIMIT 1
+        ''', [database.BACKFILL_MODE, *params]).fetchone() is not None
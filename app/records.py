@@ -0,0 +1,264 @@
+import sys
+import json
+import numpy as np
+import pandas as pd
+
+import config
+from database import ISSUE_BITS
+
+# ---------------- Record Batches ----------------
+# Compact hand-off format between the parser, duplicate detection and the bulk writer.
+# Rows are held as typed column arrays instead of one Python object per value: int64 epoch microseconds,
+# float64 amounts (as read and in the base currency, NaN without a rate), a uint8 issue bitmask, small
+# unsigned codes into per-column string dictionaries for the columns whose values repeat, and one packed
+# UTF-8 buffer for each column whose values do not.
+# Text columns for the database are only rebuilt slice by slice while writing.
+
+NO_TIME = np.iinfo('int64').min  # epoch_us of rows without a timestamp
+
+DICTIONARY_COLUMNS = ('customer_id', 'currency', 'original_timezone', 'status', 'product_category')
+
+def issue_mask(issues):
+    """Bitmask column (uint8) of a column of single issue names ('' when clean)"""
+    issues = pd.Series(issues, dtype=object)
+    bits = {issue: ISSUE_BITS.get(issue, 0) for issue in issues.unique()}
+    return issues.map(bits).to_numpy('uint8')
+
+def issue_names(mask):
+    """Issue names set in a bitmask"""
+    return [name for name, bit in ISSUE_BITS.items() if mask & bit]
+
+class StringDictionary:
+    """
+    Interning dictionary of one text column.
+    Each distinct string is stored once and rows refer to it by position; codes stay stable
+    for the lifetime of the dictionary, so batches sharing it can be compared and concatenated directly.
+    """
+
+    __slots__ = ('values', 'codes', '_array')
+
+    def __init__(self):
+        self.values = []
+        self.codes = {}
+        self._array = np.array([], dtype=object)
+
+    def __len__(self):
+        return len(self.values)
+
+    def encode(self, column):
+        """Codes of a column of strings, in the smallest unsigned dtype that fits the dictionary"""
+        inverse, uniques = pd.factorize(np.asarray(column, dtype=object))
+        mapping = np.empty(len(uniques), dtype='int64')
+        for i, value in enumerate(uniques):
+            code = self.codes.get(value)
+            if code is None:
+                code = self.codes[value] = len(self.values)
+                self.values.append(sys.intern(value))
+            mapping[i] = code
+        return mapping[inverse].astype(np.min_scalar_type(max(len(self.values) - 1, 0)))
+
+    def decode(self, codes):
+        """Object array of the interned strings of some codes"""
+        if len(self._array) != len(self.values):
+            self._array = np.array(self.values, dtype=object)
+        return self._array[codes]
+
+class PackedStrings:
+    """
+    Column of distinct strings packed into one UTF-8 buffer with int64 end offsets,
+    for the columns whose values rarely repeat (transaction ids, raw timestamps).
+    """
+
+    __slots__ = ('data', 'offsets')
+
+    def __init__(self, data, offsets):
+        self.data = data  # uint8 array of the concatenated UTF-8 values
+        self.offsets = offsets  # int64 array, value i is data[offsets[i]:offsets[i + 1]]
+
+    @classmethod
+    def from_strings(cls, values):
+        encoded = [value.encode('utf-8') for value in values]
+        offsets = np.zeros(len(encoded) + 1, dtype='int64')
+        np.cumsum([len(value) for value in encoded], out=offsets[1:])
+        return cls(np.frombuffer(b''.join(encoded), dtype='uint8'), offsets)
+
+    @classmethod
+    def concat(cls, columns):
+        offsets = [np.zeros(1, dtype='int64')]
+        shift = 0
+        for column in columns:
+            offsets.append(column.offsets[1:] + shift)
+            shift += column.offsets[-1]
+        data = [column.data for column in columns]
+        return cls(np.concatenate(data) if data else np.array([], dtype='uint8'), np.concatenate(offsets))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, rows):
+        """Packed column of the selected rows (boolean mask or positions)"""
+        positions = np.arange(len(self))[rows]
+        starts = self.offsets[positions]
+        lengths = self.offsets[positions + 1] - starts
+        offsets = np.zeros(len(positions) + 1, dtype='int64')
+        np.cumsum(lengths, out=offsets[1:])
+        index = np.repeat(starts - offsets[:-1], lengths) + np.arange(offsets[-1])
+        return PackedStrings(self.data[index], offsets)
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes + self.offsets.nbytes
+
+    def tolist(self, start=0, stop=None):
+        """Strings of rows start:stop"""
+        offsets = self.offsets[start:(len(self) if stop is None else min(stop, len(self))) + 1].tolist()
+        if len(offsets) < 2:
+            return []
+        raw = self.data[offsets[0]:offsets[-1]].tobytes()
+        base = offsets[0]
+        return [raw[begin - base:end - base].decode('utf-8') for begin, end in zip(offsets, offsets[1:])]
+
+class RecordDictionaries:
+    """String dictionaries of one source, shared by every batch read from it"""
+
+    __slots__ = DICTIONARY_COLUMNS
+
+    def __init__(self):
+        for name in DICTIONARY_COLUMNS:
+            setattr(self, name, StringDictionary())
+
+class RecordBatch:
+    """
+    Processed transactions as typed column arrays (see database.TRANSACTION_COLUMNS for the stored form).
+    transaction_id and original_timestamp are PackedStrings; the columns in DICTIONARY_COLUMNS are codes
+    into the batch's RecordDictionaries. created_at is one value per batch.
+    """
+
+    __slots__ = ('transaction_id', 'original_timestamp', 'amount', 'amount_base', 'epoch_us', 'issues', 'codes',
+                 'dictionaries', 'created_at')
+
+    def __init__(self, transaction_id, original_timestamp, amount, amount_base, epoch_us, issues, codes,
+                 dictionaries, created_at):
+        self.transaction_id = transaction_id
+        self.original_timestamp = original_timestamp
+        self.amount = amount
+        self.amount_base = amount_base
+        self.epoch_us = epoch_us
+        self.issues = issues
+        self.codes = codes  # column name -> codes into dictionaries
+        self.dictionaries = dictionaries
+        self.created_at = created_at
+
+    @classmethod
+    def from_columns(cls, columns, dictionaries, created_at):
+        """
+        Encoding processed columns: transaction_id, original_timestamp and the DICTIONARY_COLUMNS as strings,
+        amount and amount_base (optional, NaN without a rate) as floats, epoch_us as epoch microseconds
+        (None for rows without a timestamp) and issue as single issue names
+        """
+        epoch_us = pd.Series(columns['epoch_us'], dtype=object)
+        amount = np.asarray(columns['amount'], dtype='float64')
+        amount_base = columns.get('amount_base')
+        return cls(
+            transaction_id=PackedStrings.from_strings(columns['transaction_id']),
+            original_timestamp=PackedStrings.from_strings(columns['original_timestamp']),
+            amount=amount,
+            amount_base=np.full(len(amount), np.nan) if amount_base is None else np.asarray(amount_base, 'float64'),
+            epoch_us=epoch_us.where(epoch_us.notna(), NO_TIME).to_numpy('int64'),
+            issues=issue_mask(columns['issue']),
+            codes={name: getattr(dictionaries, name).encode(columns[name]) for name in DICTIONARY_COLUMNS},
+            dictionaries=dictionaries,
+            created_at=created_at,
+        )
+
+    def __len__(self):
+        return len(self.transaction_id)
+
+    def column(self, name, rows=slice(None)):
+        """Object array of the interned strings of a dictionary column (optionally only some rows)"""
+        return getattr(self.dictionaries, name).decode(self.codes[name][rows])
+
+    def epoch_values(self):
+        """epoch_us as a list of ints, None for rows without a timestamp"""
+        return [None if value == NO_TIME else value for value in self.epoch_us.tolist()]
+
+    def take(self, rows):
+        """Batch of the selected rows (boolean mask or positions), sharing this batch's dictionaries"""
+        return RecordBatch(
+            self.transaction_id[rows], self.original_timestamp[rows], self.amount[rows], self.amount_base[rows],
+            self.epoch_us[rows], self.issues[rows], {name: codes[rows] for name, codes in self.codes.items()},
+            self.dictionaries, self.created_at
+        )
+
+    @classmethod
+    def concat(cls, batches, dictionaries=None):
+        """Batches in order as one batch, re-encoding their codes into one set of dictionaries"""
+        dictionaries = dictionaries or RecordDictionaries()
+        codes = {}
+        for name in DICTIONARY_COLUMNS:
+            target = getattr(dictionaries, name)
+            parts = []
+            for batch in batches:
+                source = getattr(batch.dictionaries, name)
+                mapping = target.encode(source.values).astype('int64') if len(source) else np.array([], 'int64')
+                parts.append(mapping[batch.codes[name]])
+            merged = np.concatenate(parts) if parts else np.array([], dtype='int64')
+            codes[name] = merged.astype(np.min_scalar_type(max(len(target) - 1, 0)))
+
+        def join(attr, dtype):
+            arrays = [getattr(batch, attr) for batch in batches]
+            return np.concatenate(arrays) if arrays else np.array([], dtype=dtype)
+
+        return cls(
+            PackedStrings.concat([batch.transaction_id for batch in batches]),
+            PackedStrings.concat([batch.original_timestamp for batch in batches]), join('amount', 'float64'),
+            join('amount_base', 'float64'), join('epoch_us', 'int64'), join('issues', 'uint8'), codes, dictionaries,
+            batches[0].created_at if batches else None
+        )
+
+    def nbytes(self):
+        """Bytes held by the batch: arrays plus each dictionary string once"""
+        arrays = (self.transaction_id, self.original_timestamp, self.amount, self.amount_base, self.epoch_us,
+                  self.issues, *self.codes.values())
+        strings = sum(sys.getsizeof(value) for name in DICTIONARY_COLUMNS
+                       for value in getattr(self.dictionaries, name).values)
+        return sum(array.nbytes for array in arrays) + strings
+
+    def to_columns(self, start=0, stop=None):
+        """Rows start:stop in the stored form, as a mapping of database.TRANSACTION_COLUMNS -> lists"""
+        rows = slice(start, stop)
+        epoch_us = self.epoch_us[rows]
+        missing = epoch_us == NO_TIME
+        text = np.datetime_as_string(epoch_us.astype('datetime64[us]'), unit='us')
+        processed_timestamp = pd.Series(text).str.replace('.000000', '', regex=False) + '+00:00'
+        processed_ts = pd.Series(epoch_us // 1_000_000, dtype=object)
+        amount_base = self.amount_base[rows]
+        issues = self.issues[rows].tolist()
+        if config.QUALITY_FLAGS_JSON:
+            flags = {mask: json.dumps({'issues': issue_names(mask)}) for mask in set(issues)}
+            quality_flags = [flags[mask] for mask in issues]
+        else:
+            quality_flags = [None] * len(issues)
+        count = len(epoch_us)
+        return {
+            'transaction_id': self.transaction_id.tolist(start, stop),
+            'customer_id': self.column('customer_id', rows).tolist(),
+            'amount': self.amount[rows].tolist(),
+            'amount_base': pd.Series(amount_base, dtype=object).where(~np.isnan(amount_base), None).tolist(),
+            'currency': self.column('currency', rows).tolist(),
+            'original_timestamp': self.original_timestamp.tolist(start, stop),
+            'original_timezone': self.column('original_timezone', rows).tolist(),
+            'processed_timestamp': processed_timestamp.where(~missing, None).tolist(),
+            'processed_ts': processed_ts.where(~missing, None).tolist(),
+            'processed_timezone': ['UTC'] * count,
+            'status': self.column('status', rows).tolist(),
+            'product_category': self.column('product_category', rows).tolist(),
+            'data_quality_flags': quality_flags,
+            'quality_issues': issues,
+            'created_at': [self.created_at] * count,
+        }
+
+    def column_slices(self, rows_per_slice):
+        """to_columns() of consecutive slices, so only one slice of text values exists at a time"""
+        for start in range(0, len(self), rows_per_slice):
+            yield self.to_columns(start, start + rows_per_slice)
@@ -0,0 +1,97 @@
+"""
+Production WSGI entry point for the analytics API.
+
+Usage: gunicorn -c app/gunicorn.conf.py
+Reload after an ingest: python app/wsgi.py --reload (or kill -HUP the pid in WSGI_PIDFILE)
+
+The gunicorn master prepares the database and imports the app once; pre-forked workers share those
+pages and each warms its own caches before it accepts requests. Web workers never ingest. On HUP the
+master starts freshly warmed workers and lets the old ones finish their requests on the shared socket,
+so a reload drops no requests.
+"""
+
+import os
+import sys
+import signal
+import logging
+from datetime import datetime, timedelta
+
+# Importing self-defined modules
+import config
+import database
+import processors
+from app import app
+
+logger = logging.getLogger(__name__)
+
+application = app
+
+# ---------------- Worker Warm-up ----------------
+
+def warm_requests(newest_ts):
+    """Paths of the most common requests around the newest stored transaction"""
+    newest = datetime.utcfromtimestamp(newest_ts)
+    start = (newest - timedelta(days=config.WARM_DAYS - 1)).strftime('%Y-%m-%d')
+    end = newest.strftime('%Y-%m-%d')
+    previous_month = (newest.replace(day=1) - timedelta(days=1)).strftime('%Y-%m')
+    paths = ['/api/data-quality', f"/api/sales/compare?period1={previous_month}&period2={newest.strftime('%Y-%m')}"]
+    for timezone in config.WARM_TIMEZONES:
+        paths += [
+            f"/api/sales/daily?start_date={start}&end_date={end}&timezone={timezone}",
+            f"/api/sales/hourly?date={end}&timezone={timezone}",
+        ]
+    return paths
+
+def warm_worker():
+    """
+    Filling this worker's caches before it serves: pytz zones, the SQLite page cache
+    (hourly rollup and the newest days of idx_processed_ts) and the responses of warm_requests.
+    Returns the number of responses cached.
+    """
+    for timezone in config.WARM_TIMEZONES:
+        processors.resolve_timezone(timezone)
+
+    with database.read_connection() as conn:
+        newest_ts = conn.execute('SELECT MAX(processed_ts) FROM transactions').fetchone()[0]
+        conn.execute('SELECT COUNT(*), SUM(total_amount) FROM sales_rollup_hourly').fetchone()
+        if newest_ts is not None:
+            conn.execute(
+                'SELECT COUNT(*) FROM transactions WHERE processed_ts >= ?',
+                (newest_ts - config.WARM_DAYS * 86400,)
+            ).fetchone()
+    if newest_ts is None:
+        return 0
+
+    warmed = 0
+    client = app.test_client()
+    for path in warm_requests(newest_ts):
+        warmed += client.get(path).status_code == 200
+    return warmed
+
+def init_worker():
+    """Gunicorn post_worker_init hook: a web worker only serves, then warms up"""
+    processors.INGEST_DISABLED = 'web worker'
+    warmed = warm_worker()
+    logger.info(f"Worker {os.getpid()} warmed {warmed} responses")
+
+# ---------------- Reload ----------------
+
+def reload_server(pidfile=config.WSGI_PIDFILE):
+    """Asking the gunicorn master to replace its workers (graceful HUP); False when no server is running"""
+    try:
+        with open(pidfile) as f:
+            pid = int(f.read().strip())
+        os.kill(pid, signal.SIGHUP)
+    except (OSError, ValueError):
+        return False
+    return True
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    if '--reload' in sys.argv[1:]:
+        if not reload_server():
+            logger.error(f"No running server found through {config.WSGI_PIDFILE}")
+            sys.exit(1)
+        logger.info("Server reload requested")
+    else:
+        print(__doc__)
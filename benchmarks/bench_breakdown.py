@@ -0,0 +1,80 @@
+# benchmarks/bench_breakdown.py
+"""
+Benchmark for filtered and grouped sales responses.
+Loads generated transactions in chunks, then times /api/sales/daily over 31 days with group_by and filters
+(response cache cleared before every request) from each source: the hourly rollup (UTC), the columnar
+store (Asia/Kolkata) and SQLite with both disabled, where filters search the composite indexes and
+groups are summed per quarter hour in SQL.
+
+Usage: python benchmarks/bench_breakdown.py [row count]
+"""
+
+import os
+import sys
+import time
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+
+import config
+import columnar
+import database
+from app import app, response_cache
+from bench_insert import generate_columns, fresh_database
+
+DEFAULT_ROWS = 10_000_000
+CHUNK_ROWS = 1_000_000
+REPEAT = 5
+
+QUERIES = [
+    'group_by=category',
+    'group_by=currency&category=books',
+    'category=books',
+    'group_by=status',
+    'customer_id=CUST-4242&status=all',
+]
+
+def load(count):
+    """Writing count generated rows in chunks with distinct transaction ids"""
+    with database.BulkWriter(full_reload=True) as writer:
+        for start in range(0, count, CHUNK_ROWS):
+            columns = generate_columns(min(CHUNK_ROWS, count - start), seed=start)
+            columns['transaction_id'] = [f"TXN-{start + i:09d}" for i in range(len(columns['transaction_id']))]
+            writer.write(columns)
+
+def best_of(client, url):
+    """Best wall time of REPEAT uncached requests"""
+    best = float('inf')
+    for _ in range(REPEAT):
+        response_cache.clear()
+        start = time.perf_counter()
+        assert client.get(url).status_code == 200
+        best = min(best, time.perf_counter() - start)
+    return best
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_ROWS
+    with tempfile.TemporaryDirectory() as directory:
+        fresh_database(directory, 'breakdown.db')
+        start = time.perf_counter()
+        load(count)
+        columnar.rebuild_store()
+        print(f"Rows: {count:,} (loaded in {time.perf_counter() - start:.0f} s)")
+
+        client = app.test_client()
+        sources = [
+            ('rollup UTC', 'UTC', True, True),
+            ('columnar IST', 'Asia/Kolkata', True, True),
+            ('SQLite UTC', 'UTC', False, False),
+            ('SQLite IST', 'Asia/Kolkata', False, False),
+        ]
+        print(f"{'Query (31 days)':<36}" + ''.join(f"{label:>15}" for label, *_ in sources))
+        for query in QUERIES:
+            times = []
+            for _, timezone_str, rollup, store in sources:
+                config.USE_SALES_ROLLUP, config.USE_COLUMNAR_STORE = rollup, store
+                url = f"/api/sales/daily?start_date=2024-02-01&end_date=2024-03-02&timezone={timezone_str}&{query}"
+                times.append(best_of(client, url))
+            print(f"{query:<36}" + ''.join(f"{seconds * 1000:>12.1f} ms" for seconds in times))
+        database.close_pools()
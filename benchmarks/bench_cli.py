@@ -0,0 +1,70 @@
+# benchmarks/bench_cli.py
+"""
+Cold-start benchmark for the ingest command line (app/ingest.py).
+Times fresh interpreter runs of --help, --dry-run, a cron run that finds no new rows and a cron run
+that loads a small appended delta, against importing the Flask app (what every ingest used to start with).
+
+Usage: python benchmarks/bench_cli.py [appended rows]
+"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import statistics
+import subprocess
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import setup_db
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+INGEST = os.path.join(ROOT, 'app', 'ingest.py')
+SAMPLE_CSV = os.path.join(ROOT, 'data', 'transactions.csv')
+DEFAULT_DELTA_ROWS = 100
+RUNS = 5
+
+def wall_time(args, prepare=None):
+    """Median wall time of RUNS fresh interpreter runs (prepare runs before each, untimed)"""
+    times = []
+    for _ in range(RUNS):
+        if prepare is not None:
+            prepare()
+        start = time.perf_counter()
+        subprocess.run([sys.executable] + args, check=True, cwd=ROOT, stdout=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+if __name__ == '__main__':
+    delta_rows = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_DELTA_ROWS
+
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = os.path.join(directory, 'cli.db')
+        csv_path = os.path.join(directory, 'transactions.csv')
+        setup_db.setup_database(db_path)
+        shutil.copy(SAMPLE_CSV, csv_path)
+        with open(SAMPLE_CSV) as f:
+            delta = f.readlines()[1:delta_rows + 1]
+        subprocess.run([sys.executable, INGEST, csv_path, '--db', db_path], check=True, stdout=subprocess.DEVNULL)
+
+        counter = [0]
+
+        def append_delta():
+            """Appending the delta rows under new transaction ids"""
+            counter[0] += 1
+            with open(csv_path, 'a') as f:
+                f.writelines(line.replace('TXN-', f"TXN-R{counter[0]}-", 1) for line in delta)
+
+        incremental = [INGEST, csv_path, '--db', db_path, '--mode', 'incremental']
+        cases = [
+            ('python (empty)', ['-c', 'pass'], None),
+            ('import Flask app', ['-c', "import sys; sys.path.insert(0, 'app'); import app"], None),
+            ('ingest --help', [INGEST, '--help'], None),
+            ('ingest --dry-run', incremental + ['--dry-run'], None),
+            ('incremental, no new rows', incremental, None),
+            (f"incremental, {delta_rows} new rows", incremental, append_delta),
+        ]
+        print(f"{'Command':<28}{'Median ms':>12}")
+        for label, args, prepare in cases:
+            print(f"{label:<28}{wall_time(args, prepare) * 1000:>12.0f}")
@@ -0,0 +1,72 @@
+# benchmarks/bench_columnar.py
+"""
+Read benchmark for the raw-row sales path.
+Compares the queries.sales_query SQL of completed sales through pd.read_sql_query with
+columnar.read_sales (memory-mapped Arrow day partitions) on the same ranges.
+
+Usage: python benchmarks/bench_columnar.py [row count]
+"""
+
+import os
+import sys
+import time
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+
+import pandas as pd
+import columnar
+import database
+import processors
+import queries
+from bench_insert import generate_columns, fresh_database
+
+DEFAULT_ROWS = 1_000_000
+REPEAT = 20
+
+# Asia/Kolkata has a fractional offset, so these ranges cannot be served from the hourly rollup
+RANGES = [
+    ('1 day', '2024-01-20', '2024-01-20'),
+    ('7 days', '2024-01-20', '2024-01-26'),
+    ('31 days', '2024-02-01', '2024-03-02'),
+]
+
+def sqlite_sales(start_ts, end_ts):
+    with database.read_connection() as conn:
+        sql, params = queries.sales_query(start_ts, end_ts)
+        return pd.read_sql_query(sql, conn, params=params)
+
+def best_of(function, *args):
+    """Best wall time of REPEAT calls, with the row count of the result"""
+    best = float('inf')
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        rows = len(function(*args))
+        best = min(best, time.perf_counter() - start)
+    return best, rows
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_ROWS
+    if not columnar.is_enabled():
+        sys.exit("pyarrow is not installed")
+
+    with tempfile.TemporaryDirectory() as directory:
+        fresh_database(directory, 'columnar.db')
+        with database.BulkWriter(full_reload=True) as writer:
+            writer.write(generate_columns(count))
+        start = time.perf_counter()
+        columnar.rebuild_store()
+        export = time.perf_counter() - start
+
+        print(f"Rows:        {count:,}")
+        print(f"Export:      {export:8.2f} s")
+        print(f"{'Range':<10}{'Rows':>10}{'SQLite ms':>12}{'Arrow ms':>12}{'Speedup':>10}")
+        for label, start_date, end_date in RANGES:
+            start_ts, end_ts = processors.local_date_range(start_date, end_date, 'Asia/Kolkata')
+            sqlite_time, rows = best_of(sqlite_sales, start_ts, end_ts)
+            arrow_time, arrow_rows = best_of(columnar.read_sales, start_ts, end_ts)
+            assert rows == arrow_rows
+            print(f"{label:<10}{rows:>10,}{sqlite_time * 1000:>12.2f}{arrow_time * 1000:>12.2f}"
+                  f"{sqlite_time / arrow_time:>9.1f}x")
+        database.close_pools()
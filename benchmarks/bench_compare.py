@@ -0,0 +1,102 @@
+# benchmarks/bench_compare.py
+"""
+Benchmark for /api/sales/compare with many periods.
+Totals N consecutive months (and N weeks, and a year with its quarters and months next to the year before)
+with one SUM query per period, as the two-month compare did, and with queries.get_period_totals,
+which reads the covered sales once and subtracts prefix sums.
+UTC periods read the hourly rollup, Asia/Kolkata periods read raw rows (columnar store, then SQLite).
+
+Usage: python benchmarks/bench_compare.py [row count]
+"""
+
+import os
+import sys
+import time
+import random
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+
+import columnar
+import database
+import processors
+import queries
+from bench_insert import generate_columns, fresh_database
+
+DEFAULT_ROWS = 1_000_000
+REPEAT = 5
+SPAN_DAYS = 730  # Two years of transactions from 2024-01-01
+PERIOD_COUNTS = (2, 6, 12, 24)
+
+PERIOD_TOTALS_SQL = '''
+    SELECT SUM(amount), COUNT(*)
+    FROM transactions
+    WHERE status = 'completed'
+    AND processed_ts >= ? AND processed_ts < ?
+'''
+
+ROLLUP_PERIOD_TOTALS_SQL = '''
+    SELECT SUM(total_amount), SUM(transaction_count)
+    FROM sales_rollup_hourly
+    WHERE status = 'completed'
+    AND hour_ts >= ? AND hour_ts < ?
+'''
+
+def per_period_totals(ranges, timezone_str):
+    """Reference: one SUM query per period"""
+    totals = []
+    with database.read_connection() as conn:
+        for start_ts, end_ts in ranges:
+            sql = ROLLUP_PERIOD_TOTALS_SQL if queries.use_rollup(start_ts, end_ts, timezone_str) else PERIOD_TOTALS_SQL
+            total_sales, transaction_count = conn.execute(sql, (start_ts, end_ts)).fetchone()
+            totals.append((float(total_sales or 0), int(transaction_count or 0)))
+    return totals
+
+def best_of(function, *args):
+    """Best wall time of REPEAT calls"""
+    best = float('inf')
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        function(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def period_ranges(period_strs, timezone_str):
+    return [processors.local_date_range(*processors.parse_period(period_str), timezone_str)
+            for period_str in period_strs]
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_ROWS
+    columns = generate_columns(count)
+    rng = random.Random(7)
+    columns['processed_ts'] = [1704067200 + rng.randrange(SPAN_DAYS * 86400) for _ in range(count)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        fresh_database(directory, 'compare.db')
+        with database.BulkWriter(full_reload=True) as writer:
+            writer.write(columns)
+        columnar.rebuild_store()
+
+        print(f"Rows: {count:,} over {SPAN_DAYS} days")
+        print(f"{'Periods':<24}{'Per-period ms':>15}{'Single pass ms':>16}")
+        for timezone_str in ('UTC', 'Asia/Kolkata'):
+            rows = []
+            for unit in ('months', 'weeks'):
+                for n in PERIOD_COUNTS:
+                    if unit == 'months':
+                        period_strs = [f"{2024 + i // 12}-{i % 12 + 1:02d}" for i in range(n)]
+                    else:
+                        period_strs = [f"2024-W{i + 1:02d}" for i in range(n)]
+                    rows.append((f"{n} {unit} {timezone_str}", period_ranges(period_strs, timezone_str)))
+            nested = ['2025'] + [f"2025-Q{q}" for q in range(1, 5)] + [f"2025-{m:02d}" for m in range(1, 13)]
+            periods = processors.expand_periods(nested, ['-1y'])
+            rows.append((f"{len(periods)} nested {timezone_str}",
+                         [processors.local_date_range(start, end, timezone_str) for _, start, end in periods]))
+            for label, ranges in rows:
+                assert [round(s, 2) for s, _ in per_period_totals(ranges, timezone_str)] == \
+                    [round(s, 2) for s, _ in queries.get_period_totals(ranges, None, timezone_str)]
+                per_period = best_of(per_period_totals, ranges, timezone_str)
+                single = best_of(queries.get_period_totals, ranges, None, timezone_str)
+                print(f"{label:<24}{per_period * 1000:>15.2f}{single * 1000:>16.2f}")
+        database.close_pools()
@@ -0,0 +1,100 @@
+# benchmarks/bench_currency.py
+"""
+Benchmark for multi-currency reporting.
+Converts a column of amounts to the base currency with processors.FxRates (one as-of join per currency)
+and with a per-row Python lookup, then times the sales queries with and without a reporting currency.
+
+Usage: python benchmarks/bench_currency.py [row count]
+"""
+
+import os
+import sys
+import time
+import bisect
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+
+import numpy as np
+import columnar
+import database
+import processors
+import queries
+from bench_insert import generate_columns, fresh_database
+
+DEFAULT_ROWS = 1_000_000
+REPEAT = 10
+RATES_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'fx_rates.csv')
+
+# (label, start_date, end_date, timezone): UTC ranges use the hourly rollup, Asia/Kolkata reads raw rows
+RANGES = [
+    ('31 days UTC', '2024-02-01', '2024-03-02', 'UTC'),
+    ('31 days IST', '2024-02-01', '2024-03-02', 'Asia/Kolkata'),
+]
+
+def per_row_to_base(rows, amounts, currencies, epoch_s):
+    """Reference conversion: one dictionary lookup and bisect per row"""
+    table = {}
+    for currency, day_ts, rate in rows:
+        days, rates = table.setdefault(currency, ([], []))
+        days.append(day_ts)
+        rates.append(rate)
+    converted = []
+    for amount, currency, ts in zip(amounts, currencies, epoch_s):
+        if currency == processors.BASE_CURRENCY:
+            converted.append(amount)
+        elif currency not in table:
+            converted.append(None)
+        else:
+            days, rates = table[currency]
+            converted.append(amount * rates[max(bisect.bisect_right(days, ts) - 1, 0)])
+    return converted
+
+def best_of(function, *args):
+    """Best wall time of REPEAT calls"""
+    best = float('inf')
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        function(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_ROWS
+    columns = generate_columns(count)
+    rows = database.read_fx_rates_file(RATES_PATH)
+    rates = processors.FxRates(rows)
+    amounts = np.array(columns['amount'])
+    currencies = np.array(columns['currency'], dtype=object)
+    epoch_s = np.array(columns['processed_ts'], dtype='int64')
+
+    start = time.perf_counter()
+    per_row_to_base(rows, columns['amount'], columns['currency'], columns['processed_ts'])
+    per_row = time.perf_counter() - start
+    vectorized = best_of(rates.to_base, amounts, currencies, epoch_s)
+    print(f"Rows:                  {count:,}")
+    print(f"Per-row conversion:    {per_row * 1000:10.1f} ms")
+    print(f"FxRates.to_base:       {vectorized * 1000:10.1f} ms ({per_row / vectorized:.0f}x)")
+
+    with tempfile.TemporaryDirectory() as directory:
+        fresh_database(directory, 'currency.db')
+        with database.BulkWriter(full_reload=True) as writer:
+            writer.write(generate_columns(count))
+        start = time.perf_counter()
+        database.replace_fx_rates(rows)
+        print(f"Rate reload (SQL):     {(time.perf_counter() - start) * 1000:10.1f} ms")
+        columnar.rebuild_store()
+
+        print(f"{'Query':<28}{'Raw sums ms':>14}{'EUR ms':>10}")
+        for label, start_date, end_date, timezone_str in RANGES:
+            start_ts, end_ts = processors.local_date_range(start_date, end_date, timezone_str)
+            raw = best_of(queries.get_sales, start_ts, end_ts, timezone_str)
+            converted = best_of(queries.get_sales, start_ts, end_ts, timezone_str, 'EUR')
+            print(f"{'sales ' + label:<28}{raw * 1000:>14.2f}{converted * 1000:>10.2f}")
+        periods = [processors.local_date_range('2024-01-01', '2024-01-31', 'UTC'),
+                   processors.local_date_range('2024-02-01', '2024-02-29', 'UTC')]
+        raw = best_of(queries.get_period_totals, periods)
+        converted = best_of(queries.get_period_totals, periods, 'EUR')
+        print(f"{'compare two months':<28}{raw * 1000:>14.2f}{converted * 1000:>10.2f}")
+        database.close_pools()
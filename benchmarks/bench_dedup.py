@@ -0,0 +1,63 @@
+# benchmarks/bench_dedup.py
+"""
+Scaling benchmark for duplicate detection during ingest.
+Compares the indexed DuplicateDetector with the legacy is_duplicate scan.
+
+Usage: python benchmarks/bench_dedup.py [row counts...]
+"""
+
+import os
+import sys
+import time
+import random
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+
+import pytz
+import processors
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000, 10_000_000]
+LEGACY_MAX_ROWS = 20_000  # The legacy scan is quadratic, so only time it on small inputs
+
+def generate_rows(count, seed=42):
+    """Generating (customer_id, amount, epoch_us) rows spread over 90 days"""
+    rng = random.Random(seed)
+    base = processors.to_epoch_us(datetime(2024, 1, 1, tzinfo=pytz.UTC))
+    span_us = 90 * 24 * 3600 * 1_000_000
+    for _ in range(count):
+        yield (
+            f"CUST-{rng.randint(1000, 9999)}",
+            round(rng.uniform(5.99, 999.99), 2),
+            base + rng.randrange(span_us),
+        )
+
+def bench_detector(count):
+    detector = processors.DuplicateDetector()
+    duplicates = 0
+    start = time.perf_counter()
+    for customer_id, amount, epoch_us in generate_rows(count):
+        if detector.check_and_add(customer_id, amount, epoch_us):
+            duplicates += 1
+    return time.perf_counter() - start, duplicates
+
+def bench_legacy(count):
+    kept = []
+    duplicates = 0
+    start = time.perf_counter()
+    for customer_id, amount, epoch_us in generate_rows(count):
+        new_dt = processors.EPOCH + timedelta(microseconds=epoch_us)
+        record = {'customer_id': customer_id, 'amount': amount, 'processed_timestamp': new_dt.isoformat()}
+        if processors.is_duplicate(record, kept, new_dt):
+            duplicates += 1
+            continue
+        kept.append(record)
+    return time.perf_counter() - start, duplicates
+
+if __name__ == '__main__':
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+    print(f"{'rows':>12} {'indexed (s)':>12} {'us/row':>8} {'legacy (s)':>12} {'duplicates':>11}")
+    for count in sizes:
+        elapsed, duplicates = bench_detector(count)
+        legacy = f"{bench_legacy(count)[0]:12.2f}" if count <= LEGACY_MAX_ROWS else f"{'-':>12}"
+        print(f"{count:>12,} {elapsed:12.2f} {elapsed / count * 1e6:8.2f} {legacy} {duplicates:>11,}")
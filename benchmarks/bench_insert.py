@@ -0,0 +1,92 @@
+# benchmarks/bench_insert.py
+"""
+Insert benchmark for the transactions table.
+Compares the original per-row cursor.execute loop with database.BulkWriter
+(executemany from column arrays, load pragmas, indexes rebuilt after the load).
+
+Usage: python benchmarks/bench_insert.py [row count]
+"""
+
+import os
+import sys
+import time
+import random
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+
+import database
+import setup_db
+
+DEFAULT_ROWS = 1_000_000
+
+def generate_columns(count, seed=42):
+    """Generating processed transaction columns"""
+    rng = random.Random(seed)
+    customer_ids = [f"CUST-{rng.randint(1000, 9999)}" for _ in range(count)]
+    amounts = [round(rng.uniform(5.99, 999.99), 2) for _ in range(count)]
+    return {
+        'transaction_id': [f"TXN-{i:08d}" for i in range(count)],
+        'customer_id': customer_ids,
+        'amount': amounts,
+        'amount_base': amounts,
+        'currency': [rng.choice(['USD', 'EUR', 'GBP', 'JPY', 'CAD', 'AUD']) for _ in range(count)],
+        'original_timestamp': ['2024-01-15 14:30:00'] * count,
+        'original_timezone': ['UTC'] * count,
+        'processed_timestamp': ['2024-01-15T14:30:00+00:00'] * count,
+        'processed_ts': [1705329000 + rng.randrange(90 * 86400) for _ in range(count)],
+        'processed_timezone': ['UTC'] * count,
+        'status': [rng.choice(['completed', 'pending', 'failed']) for _ in range(count)],
+        'product_category': [rng.choice(['electronics', 'clothing', 'home', 'books']) for _ in range(count)],
+        'data_quality_flags': ['{"issues": []}'] * count,
+        'quality_issues': [0] * count,
+        'created_at': ['2024-04-01T00:00:00Z'] * count,
+    }
+
+def legacy_insert(records):
+    """The original insert_many_transactions loop"""
+    conn = database.get_connection()
+    cursor = conn.cursor()
+    for record in records:
+        cursor.execute('''
+            INSERT INTO transactions (
+                transaction_id, customer_id, amount, currency,
+                original_timestamp, original_timezone, processed_timestamp,
+                processed_timezone, status, product_category, data_quality_flags, created_at
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            record['transaction_id'], record['customer_id'], record['amount'],
+            record['currency'], record['original_timestamp'], record['original_timezone'],
+            record['processed_timestamp'], record['processed_timezone'],
+            record['status'], record['product_category'], record['data_quality_flags'], record['created_at']
+        ))
+    conn.commit()
+    conn.close()
+
+def fresh_database(directory, name):
+    database.DB_PATH = os.path.join(directory, name)
+    setup_db.setup_database(database.DB_PATH)
+    database.ensure_schema()
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_ROWS
+    columns = generate_columns(count)
+    records = [dict(zip(columns, values)) for values in zip(*columns.values())]
+
+    with tempfile.TemporaryDirectory() as directory:
+        fresh_database(directory, 'legacy.db')
+        start = time.perf_counter()
+        legacy_insert(records)
+        legacy = time.perf_counter() - start
+
+        fresh_database(directory, 'bulk.db')
+        start = time.perf_counter()
+        with database.BulkWriter(full_reload=True) as writer:
+            writer.write(columns)
+        bulk = time.perf_counter() - start
+
+    print(f"Rows:        {count:,}")
+    print(f"Per-row:     {legacy:8.2f} s  ({count / legacy:,.0f} rows/sec)")
+    print(f"BulkWriter:  {bulk:8.2f} s  ({count / bulk:,.0f} rows/sec)")
+    print(f"Speedup:     {legacy / bulk:8.1f}x")
@@ -0,0 +1,76 @@
+# benchmarks/bench_parallel.py
+"""
+Ingest scaling benchmark.
+Loads a CSV built by repeating data/transactions.csv (with fresh transaction ids and shifted
+timestamps) serially in 'full' mode and in 'parallel' mode with increasing worker counts,
+and checks that every run stores the same rows and quality stats.
+
+Usage: python benchmarks/bench_parallel.py [row count] [max workers]
+"""
+
+import os
+import sys
+import time
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+
+import pandas as pd
+import database
+import processors
+from bench_insert import fresh_database
+
+DEFAULT_ROWS = 1_000_000
+SAMPLE_CSV = os.path.join(os.path.dirname(__file__), '..', 'data', 'transactions.csv')
+
+def build_csv(path, count):
+    """Repeating the sample rows until the file holds count rows"""
+    sample = pd.read_csv(SAMPLE_CSV, dtype=str)
+    with open(path, 'w') as f:
+        f.write(','.join(sample.columns) + '\n')
+        written, copy = 0, 0
+        while written < count:
+            batch = sample.head(count - written).copy()
+            batch['transaction_id'] = batch['transaction_id'] + f"-{copy}"
+            batch['customer_id'] = batch['customer_id'] + f"-{copy % 50}"
+            batch.to_csv(f, header=False, index=False)
+            written += len(batch)
+            copy += 1
+
+def stored_digest():
+    conn = database.get_connection()
+    digest = conn.execute('SELECT COUNT(*), TOTAL(amount), TOTAL(processed_ts) FROM transactions').fetchone()
+    conn.close()
+    return digest
+
+def timed_ingest(csv_path, mode):
+    start = time.perf_counter()
+    stats = processors.process_csv_data(csv_path, mode=mode)
+    return time.perf_counter() - start, stats
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_ROWS
+    max_workers = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+
+    with tempfile.TemporaryDirectory() as directory:
+        csv_path = os.path.join(directory, 'transactions.csv')
+        build_csv(csv_path, count)
+        fresh_database(directory, 'parallel.db')
+
+        serial, serial_stats = timed_ingest(csv_path, 'full')
+        serial_digest = stored_digest()
+        results = []
+        workers = 1
+        while workers <= max_workers:
+            processors.INGEST_WORKERS = workers
+            elapsed, stats = timed_ingest(csv_path, 'parallel')
+            assert stats == serial_stats and stored_digest() == serial_digest
+            results.append((workers, elapsed))
+            workers *= 2
+        database.close_pools()
+
+    print(f"Rows:        {count:,}  (cores available: {os.cpu_count()})")
+    print(f"Serial:      {serial:8.2f} s  ({count / serial:,.0f} rows/sec)")
+    for workers, elapsed in results:
+        print(f"{workers} workers:   {elapsed:8.2f} s  ({count / elapsed:,.0f} rows/sec, {serial / elapsed:.1f}x)")
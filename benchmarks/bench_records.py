@@ -0,0 +1,48 @@
+# benchmarks/bench_records.py
+"""
+Memory benchmark for the ingest hand-off format.
+Compares the bytes per row of processed transactions held as a DataFrame of Python values
+(the stored column form) with records.RecordBatch.
+
+Usage: python benchmarks/bench_records.py [row counts...]
+"""
+
+import os
+import sys
+import io
+import random
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+
+import pandas as pd
+import processors
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+CSV_HEADER = 'transaction_id,customer_id,amount,currency,timestamp,timezone,status,product_category\n'
+
+def generate_csv(count, seed=42):
+    """CSV text in the sample formats spread over 90 days"""
+    rng = random.Random(seed)
+    base = datetime(2024, 1, 1)
+    lines = [CSV_HEADER]
+    for i in range(count):
+        dt = base + timedelta(seconds=rng.randrange(90 * 86400))
+        lines.append(
+            f"TXN-{i:08d},CUST-{rng.randint(1000, 9999)},{rng.uniform(5.99, 999.99):.2f},"
+            f"{rng.choice(['USD', 'EUR', 'GBP', 'JPY', 'CAD', 'AUD'])},{dt:%Y-%m-%d %H:%M:%S},"
+            f"{rng.choice(['America/New_York', 'Europe/London', 'Asia/Tokyo', 'UTC', ''])},"
+            f"{rng.choice(['completed', 'pending', 'failed'])},{rng.choice(['electronics', 'books', 'home'])}\n"
+        )
+    return ''.join(lines)
+
+if __name__ == '__main__':
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+    print(f"{'rows':>12} {'frame B/row':>12} {'batch B/row':>12} {'ratio':>7}")
+    for count in sizes:
+        df = pd.read_csv(io.StringIO(generate_csv(count)), dtype=processors.CSV_DTYPES)
+        batch = processors.prepare_frame(df, processors.new_stats())
+        del df
+        frame_bytes = pd.DataFrame(batch.to_columns()).memory_usage(deep=True).sum()
+        batch_bytes = batch.nbytes()
+        print(f"{count:>12,} {frame_bytes / count:12.1f} {batch_bytes / count:12.1f} {frame_bytes / batch_bytes:7.1f}x")
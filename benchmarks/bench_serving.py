@@ -0,0 +1,144 @@
+# benchmarks/bench_serving.py
+"""
+Load test of the API servers.
+Starts the Flask server (app.run, threaded) and the ASGI entry point (asgi.application under uvicorn)
+in turn on the same generated database, sends a mix of sales requests from concurrent keep-alive
+clients and reports requests/sec, p50/p99 latency and the non-200 responses (503 backpressure,
+504 timeouts) of each. The response cache is disabled in both servers so every request runs its query.
+
+Usage: python benchmarks/bench_serving.py [row count] [concurrent clients] [seconds per server]
+"""
+
+import os
+import sys
+import time
+import random
+import tempfile
+import threading
+import subprocess
+import http.client
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+
+import numpy as np
+import columnar
+import database
+from bench_insert import generate_columns, fresh_database
+
+DEFAULT_ROWS = 200_000
+DEFAULT_CLIENTS = 32
+DEFAULT_SECONDS = 10
+PORT = 5077
+
+APP_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'app'))
+
+BOOTSTRAP = '''
+import sys, logging
+sys.path.insert(0, {app_dir!r})
+import config
+config.RESPONSE_CACHE_MAX_ENTRIES = 0
+config.DEBUG = False
+import database
+database.DB_PATH = {db_path!r}
+logging.getLogger('werkzeug').setLevel(logging.ERROR)
+{run}
+'''
+
+SERVERS = {
+    'flask': "from app import app\napp.run(host='127.0.0.1', port={port}, threaded=True)",
+    'asgi': "import uvicorn, asgi\nuvicorn.run(asgi.application, host='127.0.0.1', port={port}, log_level='error')",
+}
+
+TIMEZONES = ['UTC', 'America/New_York', 'Asia/Kolkata']
+
+def request_paths(count, seed=3):
+    """Mix of daily, hourly and compare requests over the generated data (2024-01-15 + 90 days)"""
+    rng = random.Random(seed)
+    paths = []
+    for _ in range(count):
+        day = 15 + rng.randrange(60)
+        start = f"2024-{1 + day // 31:02d}-{1 + day % 28:02d}"
+        timezone = rng.choice(TIMEZONES)
+        paths.append(rng.choice([
+            f"/api/sales/daily?start_date={start}&end_date=2024-03-31&timezone={timezone}",
+            f"/api/sales/hourly?date={start}&timezone={timezone}",
+            f"/api/sales/compare?period1=2024-02&period2=2024-03&timezone={timezone}",
+        ]))
+    return paths
+
+def start_server(kind, db_path):
+    script = BOOTSTRAP.format(app_dir=APP_DIR, db_path=db_path, run=SERVERS[kind].format(port=PORT))
+    process = subprocess.Popen([sys.executable, '-c', script])
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', PORT, timeout=1)
+            conn.request('GET', '/health')
+            if conn.getresponse().status == 200:
+                return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"{kind} server did not start")
+
+def run_load(clients, seconds):
+    """(latencies in seconds, status counts) of the requests completed by the clients within the time"""
+    paths = request_paths(2000)
+    latencies, statuses = [], Counter()
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+
+    def client(index):
+        conn = http.client.HTTPConnection('127.0.0.1', PORT, timeout=60)
+        own_latencies, own_statuses = [], Counter()
+        i = index
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            try:
+                conn.request('GET', paths[i % len(paths)])
+                response = conn.getresponse()
+                response.read()
+                own_statuses[response.status] += 1
+            except (OSError, http.client.HTTPException):
+                own_statuses['error'] += 1
+                conn.close()
+            own_latencies.append(time.perf_counter() - start)
+            i += clients
+        with lock:
+            latencies.extend(own_latencies)
+            statuses.update(own_statuses)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, statuses
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_ROWS
+    clients = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_CLIENTS
+    seconds = float(sys.argv[3]) if len(sys.argv) > 3 else DEFAULT_SECONDS
+
+    with tempfile.TemporaryDirectory() as directory:
+        fresh_database(directory, 'serving.db')
+        with database.BulkWriter(full_reload=True) as writer:
+            writer.write(generate_columns(count))
+        columnar.ensure_store()
+        database.close_pools()
+
+        print(f"Rows: {count:,}   Clients: {clients}   Seconds per server: {seconds:g}")
+        print(f"{'Server':<8}{'Requests':>10}{'Req/s':>10}{'p50 ms':>10}{'p99 ms':>10}  Non-200")
+        for kind in SERVERS:
+            process = start_server(kind, database.DB_PATH)
+            try:
+                run_load(clients, 1)  # Warming up
+                latencies, statuses = run_load(clients, seconds)
+            finally:
+                process.terminate()
+                process.wait()
+            p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+            other = {status: n for status, n in statuses.items() if status != 200}
+            print(f"{kind:<8}{len(latencies):>10,}{len(latencies) / seconds:>10.0f}{p50:>10.1f}{p99:>10.1f}  {other or '-'}")
@@ -0,0 +1,55 @@
+# benchmarks/bench_timestamps.py
+"""
+Per-row benchmark for parse_timestamp.
+Compares dateutil parsing (format cache disabled) with the per-source format cache,
+and the (timestamp, timezone) -> epoch memo on a feed that repeats values.
+
+Usage: python benchmarks/bench_timestamps.py [row count]
+"""
+
+import os
+import sys
+import time
+import random
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+
+import processors
+from cache import MemoCache
+
+DEFAULT_ROWS = 100_000
+FORMATS = ['%Y-%m-%d %H:%M:%S', '%m/%d/%y %I:%M %p', '%d-%b-%Y %H:%M', '%Y-%m-%dT%H:%M:%SZ', '%Y-%m-%dT%H:%M:%S']
+TIMEZONES = ['America/New_York', 'Europe/London', 'Asia/Tokyo', 'UTC', '', 'America/Los_Angeles']
+
+def generate_rows(count, distinct=None, seed=42):
+    """(timestamp, timezone) rows in the sample CSV formats, drawn from `distinct` values when given"""
+    rng = random.Random(seed)
+    base = datetime(2024, 1, 1)
+    rows = [
+        ((base + timedelta(seconds=rng.randrange(90 * 86400))).strftime(rng.choice(FORMATS)), rng.choice(TIMEZONES))
+        for _ in range(distinct or count)
+    ]
+    return rows if distinct is None else [rng.choice(rows) for _ in range(count)]
+
+def bench(rows, formats, parse=processors.parse_timestamp):
+    start = time.perf_counter()
+    for timestamp, timezone_str in rows:
+        parse(timestamp, timezone_str, False, formats)
+    return (time.perf_counter() - start) / len(rows) * 1e6
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_ROWS
+    rows = generate_rows(count)
+    uncached = bench(rows, processors.TimestampFormats(max_entries=0))
+    formats = processors.TimestampFormats()
+    cached = bench(rows, formats)
+    print(f"{'path':<28} {'us/row':>8} {'hit rate':>9}")
+    print(f"{'dateutil (no format cache)':<28} {uncached:8.2f} {'-':>9}")
+    print(f"{'format cache':<28} {cached:8.2f} {formats.stats()['hit_rate']:9.4f}")
+    print(f"{'timezone cache':<28} {'':>8} {processors.timezone_cache.stats()['hit_rate']:9.4f}")
+
+    repeated = generate_rows(count, distinct=1000)
+    processors.epoch_memo = MemoCache(4096)
+    memo = bench(repeated, formats, processors.parse_timestamp_epoch)
+    print(f"{'epoch memo (1k distinct)':<28} {memo:8.2f} {processors.epoch_memo.stats()['hit_rate']:9.4f}")
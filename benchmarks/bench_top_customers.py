@@ -0,0 +1,82 @@
+# benchmarks/bench_top_customers.py
+"""
+Benchmark for the top customers of a range.
+Loads transactions over a year with skewed customers (a few buy much more than the rest), then ranks the
+top 10 by spend over ranges of 7 to 365 days exactly (GROUP BY customer_id over the range's completed
+sales) and from the merged daily summaries of customer_topk_daily, with the summaries' error bound,
+how many of the exact top 10 they return and their largest overstatement. Also times rebuilding the
+summaries and refreshing one day, as an incremental ingest does.
+
+Usage: python benchmarks/bench_top_customers.py [row count]
+"""
+
+import os
+import sys
+import time
+import random
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+
+import database
+import queries
+from bench_insert import generate_columns, fresh_database
+
+DEFAULT_ROWS = 2_000_000
+REPEAT = 5
+SPAN_DAYS = 365
+START_TS = 1704067200  # 2024-01-01
+RANGE_DAYS = (7, 31, 90, 365)
+LIMIT = 10
+
+def best_of(function, *args):
+    """Best wall time of REPEAT calls, with the last result"""
+    best = float('inf')
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        result = function(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_ROWS
+    columns = generate_columns(count)
+    rng = random.Random(11)
+    columns['processed_ts'] = [START_TS + rng.randrange(SPAN_DAYS * 86400) for _ in range(count)]
+    columns['customer_id'] = [f"CUST-{int(100000 * rng.random() ** 3):05d}" for _ in range(count)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        fresh_database(directory, 'top_customers.db')
+        with database.BulkWriter(full_reload=True) as writer:
+            writer.write(columns)
+
+        conn = database.get_connection()
+        start = time.perf_counter()
+        database.rebuild_customer_topk(conn)
+        conn.commit()
+        rebuild = time.perf_counter() - start
+        start = time.perf_counter()
+        database.refresh_customer_topk(conn, {START_TS + 100 * 86400})
+        conn.commit()
+        refresh = time.perf_counter() - start
+        summary_rows = conn.execute('SELECT COUNT(*) FROM customer_topk_daily').fetchone()[0]
+        conn.close()
+        print(f"Rows: {count:,} over {SPAN_DAYS} days; summaries: {summary_rows:,} rows, "
+              f"rebuilt in {rebuild:.1f} s, one day refreshed in {refresh * 1000:.0f} ms")
+
+        print(f"{'Range':<10}{'Exact ms':>10}{'Summary ms':>12}{'Error bound':>14}{'Top 10 found':>14}"
+              f"{'Max overstatement':>19}")
+        for days in RANGE_DAYS:
+            start_ts, end_ts = START_TS, START_TS + days * 86400
+            exact_time, (exact, _) = best_of(queries.get_top_customers, start_ts, end_ts, 'spend', LIMIT, True)
+            approximate_time, (approximate, error_bound) = best_of(queries.get_top_customers, start_ts, end_ts,
+                                                                   'spend', LIMIT)
+            every_customer, _ = queries.get_top_customers(start_ts, end_ts, 'spend', 10 ** 9, True)
+            true_values = {customer_id: value for customer_id, value, _ in every_customer}
+            exact_ids = {customer_id for customer_id, _, _ in exact}
+            found = sum(customer_id in exact_ids for customer_id, _, _ in approximate)
+            overstatement = max(value - true_values[customer_id] for customer_id, value, _ in approximate)
+            print(f"{days:>4} days{exact_time * 1000:>10.1f}{approximate_time * 1000:>12.1f}{error_bound:>14.2f}"
+                  f"{found:>11}/{LIMIT}{overstatement:>19.2f}")
+        database.close_pools()
@@ -0,0 +1,85 @@
+# benchmarks/bench_unique_customers.py
+"""
+Benchmark for distinct customer counts.
+Counts the distinct customers of the completed sales in ranges of 1 to 90 days, and of each day of a
+31-day daily request, with COUNT(DISTINCT customer_id) over transactions and by merging the hourly
+HyperLogLog sketches (queries.get_unique_customers), in UTC and Asia/Kolkata (whose local days cut UTC
+hours in half, read from raw rows). Also reports the sketches' size and largest relative error.
+
+Usage: python benchmarks/bench_unique_customers.py [row count]
+"""
+
+import os
+import sys
+import time
+import tempfile
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+
+import database
+import processors
+import queries
+from bench_insert import generate_columns, fresh_database
+
+DEFAULT_ROWS = 2_000_000
+REPEAT = 5
+RANGE_DAYS = (1, 7, 31, 90)
+FIRST_DAY = date(2024, 1, 16)  # generate_columns spreads rows over 90 days from 2024-01-15 14:30 UTC
+
+DISTINCT_SQL = '''
+    SELECT COUNT(DISTINCT customer_id) FROM transactions
+    WHERE status = 'completed' AND processed_ts >= ? AND processed_ts < ?
+'''
+
+def exact_counts(ranges):
+    """Reference: one COUNT(DISTINCT) query per range"""
+    with database.read_connection() as conn:
+        return [conn.execute(DISTINCT_SQL, (start_ts, end_ts)).fetchone()[0] for start_ts, end_ts in ranges]
+
+def local_days(first_day, days, timezone_str):
+    """UTC range of days local days from first_day"""
+    last_day = first_day + timedelta(days=days - 1)
+    return processors.local_date_range(first_day.isoformat(), last_day.isoformat(), timezone_str)
+
+def best_of(function, *args):
+    """Best wall time of REPEAT calls, with the last result"""
+    best = float('inf')
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        result = function(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_ROWS
+    with tempfile.TemporaryDirectory() as directory:
+        fresh_database(directory, 'unique_customers.db')
+        with database.BulkWriter(full_reload=True) as writer:
+            writer.write(generate_columns(count))
+        conn = database.get_connection()
+        start = time.perf_counter()
+        database.rebuild_customer_sketches(conn)
+        conn.commit()
+        rebuild = time.perf_counter() - start
+        sketch_count, sketch_bytes = conn.execute(
+            'SELECT COUNT(*), SUM(LENGTH(registers)) FROM customer_sketch_hourly'
+        ).fetchone()
+        conn.close()
+        print(f"Rows: {count:,}; {sketch_count:,} hourly sketches, {sketch_bytes / sketch_count:,.0f} bytes each "
+              f"on average, rebuilt in {rebuild:.1f} s")
+
+        print(f"{'Ranges':<28}{'COUNT(DISTINCT) ms':>20}{'Sketches ms':>13}{'Max error %':>13}")
+        for timezone_str in ('UTC', 'Asia/Kolkata'):
+            cases = [
+                (f"{days} days {timezone_str}", [local_days(FIRST_DAY, days, timezone_str)]) for days in RANGE_DAYS
+            ]
+            cases.append((f"31 single days {timezone_str}",
+                          [local_days(FIRST_DAY + timedelta(days=i), 1, timezone_str) for i in range(31)]))
+            for label, ranges in cases:
+                exact_time, exact = best_of(exact_counts, ranges)
+                sketch_time, estimates = best_of(queries.get_unique_customers, ranges)
+                error = max(abs(estimate - value) / value for estimate, value in zip(estimates, exact))
+                print(f"{label:<28}{exact_time * 1000:>20.1f}{sketch_time * 1000:>13.1f}{error * 100:>13.2f}")
+        database.close_pools()
@@ -198,9 +198,8 @@ def create_sample_data():
     print(f"   📁 Saved to: {csv_path}")
     return len(sample_transactions)
 
-def setup_database():
+def setup_database(db_path='data/ecommerce.db'):
     """Initialize SQLite database with proper schema and indexes"""
-    db_path = 'data/ecommerce.db'
     conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
     
@@ -217,10 +216,12 @@ def setup_database():
             original_timestamp TEXT NOT NULL,
             original_timezone TEXT,
             processed_timestamp DATETIME,
+            processed_ts INTEGER,  -- processed_timestamp as UTC epoch seconds
             processed_timezone TEXT DEFAULT 'UTC',
             status TEXT NOT NULL,
             product_category TEXT NOT NULL,
             data_quality_flags TEXT,  -- JSON string for tracking issues
+            quality_issues INTEGER NOT NULL DEFAULT 0,  -- Bitmask of the same issues (database.ISSUE_BITS)
             created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
             updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
         )
@@ -232,8 +233,7 @@ def setup_database():
         'CREATE INDEX IF NOT EXISTS idx_customer_id ON transactions(customer_id)',
         'CREATE INDEX IF NOT EXISTS idx_status ON transactions(status)',
         'CREATE INDEX IF NOT EXISTS idx_currency ON transactions(currency)',
-        'CREATE INDEX IF NOT EXISTS idx_category ON transactions(product_category)',
-        'CREATE INDEX IF NOT EXISTS idx_transaction_id ON transactions(transaction_id)'
+        'CREATE INDEX IF NOT EXISTS idx_category ON transactions(product_category)'
     ]
     
     for index_sql in indexes:
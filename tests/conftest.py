@@ -0,0 +1,44 @@
+# tests/conftest.py
+"""
+Shared fixtures for the test suite.
+"""
+
+import pytest
+import sys
+import os
+
+# Add the repository root and app directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+
+import database
+import processors
+import setup_db
+
+CSV_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'transactions.csv')
+
+CSV_HEADER = 'transaction_id,customer_id,amount,currency,timestamp,timezone,status,product_category'
+
+@pytest.fixture
+def scratch_db(tmp_path, monkeypatch):
+    """Empty database with the current schema"""
+    db_path = str(tmp_path / 'ecommerce.db')
+    setup_db.setup_database(db_path)
+    monkeypatch.setattr(database, 'DB_PATH', db_path)
+    database.ensure_schema()
+    yield db_path
+    database.close_pools()
+
+@pytest.fixture
+def loaded_db(scratch_db):
+    """Scratch database loaded from the sample CSV"""
+    processors.process_csv_data(CSV_PATH, mode='full')
+    return scratch_db
+
+@pytest.fixture
+def client():
+    """Flask test client"""
+    from app import app
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
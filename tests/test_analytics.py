@@ -0,0 +1,1001 @@
+# tests/test_analytics.py
+"""
+Test cases for the analytics query layer and sales endpoints.
+"""
+
+import pytest
+import sys
+import os
+import json
+import sqlite3
+import random
+import numpy as np
+
+# Add the app directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+
+try:
+    from app import response_cache
+    import database
+    import processors
+    import queries
+    import sketches
+    import config
+
+except ImportError as e:
+    pytest.skip(f"Could not import app modules: {e}", allow_module_level=True)
+
+from .conftest import CSV_HEADER, CSV_PATH
+
+@pytest.fixture
+def sales_db(scratch_db, tmp_path):
+    """Scratch database loaded with a few transactions around day boundaries"""
+    csv_path = tmp_path / 'transactions.csv'
+    csv_path.write_text('\n'.join([
+        CSV_HEADER,
+        'TXN-1,CUST-1,100.0,USD,2024-01-15T12:00:00Z,,completed,books',
+        'TXN-2,CUST-2,50.0,USD,2024-01-16T03:00:00Z,,completed,books',   # Jan 15 22:00 in New York
+        'TXN-3,CUST-3,25.0,USD,2024-01-16T12:00:00Z,,completed,books',
+        'TXN-4,CUST-4,10.0,USD,2024-01-15T13:00:00Z,,pending,books',
+        'TXN-5,CUST-5,40.0,USD,2024-02-10T12:00:00Z,,completed,books',
+    ]) + '\n')
+    processors.process_csv_data(str(csv_path), mode='full')
+    return scratch_db
+
+@pytest.fixture
+def dst_db(scratch_db, tmp_path):
+    """Scratch database with transactions around the 2024 New York DST transitions"""
+    csv_path = tmp_path / 'transactions.csv'
+    csv_path.write_text('\n'.join([
+        CSV_HEADER,
+        'TXN-1,CUST-1,10.0,USD,2024-11-03T05:30:00Z,,completed,books',   # 01:30 EDT
+        'TXN-2,CUST-2,20.0,USD,2024-11-03T06:30:00Z,,completed,books',   # 01:30 EST
+        'TXN-3,CUST-3,30.0,USD,2024-11-04T04:30:00Z,,completed,books',   # Nov 3 23:30 EST
+        'TXN-4,CUST-4,40.0,USD,2024-03-10T04:30:00Z,,completed,books',   # Mar 9 23:30 EST
+        'TXN-5,CUST-5,50.0,USD,2024-03-10T07:30:00Z,,completed,books',   # Mar 10 03:30 EDT
+        'TXN-6,CUST-6,60.0,USD,2024-03-11T03:30:00Z,,completed,books',   # Mar 10 23:30 EDT
+    ]) + '\n')
+    processors.process_csv_data(str(csv_path), mode='full')
+    return scratch_db
+
+@pytest.fixture
+def breakdown_db(scratch_db, tmp_path):
+    """Scratch database with several statuses, categories, currencies and customers"""
+    csv_path = tmp_path / 'transactions.csv'
+    csv_path.write_text('\n'.join([
+        CSV_HEADER,
+        'TXN-1,CUST-1,100.0,USD,2024-01-15T12:00:00Z,,completed,books',
+        'TXN-2,CUST-2,50.0,EUR,2024-01-15T12:30:00Z,,completed,electronics',
+        'TXN-3,CUST-1,25.0,USD,2024-01-15T20:00:00Z,,pending,books',
+        'TXN-4,CUST-3,10.0,EUR,2024-01-16T03:00:00Z,,completed,books',        # Jan 16 08:30 in Kolkata
+        'TXN-5,CUST-2,40.0,USD,2024-01-16T19:00:00Z,,completed,electronics',  # Jan 17 00:30 in Kolkata
+        'TXN-6,CUST-1,5.0,USD,2024-01-16T19:10:00Z,,failed,home',
+    ]) + '\n')
+    processors.process_csv_data(str(csv_path), mode='full')
+    return scratch_db
+
+def query_plan(db_path, sql, params):
+    conn = sqlite3.connect(db_path)
+    plan = [row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql, params)]
+    conn.close()
+    return plan
+
+class TestSargableQueries:
+    """Test cases for the processed_ts range queries"""
+
+    @pytest.mark.parametrize('filters, group_by, index', [
+        (None, None, 'idx_status_processed_ts'),
+        ({'status': 'pending'}, 'product_category', 'idx_status_processed_ts'),
+        ({'status': 'completed', 'product_category': 'books'}, None, 'idx_category_status_ts'),
+        ({'status': 'completed', 'currency': 'EUR'}, 'customer_id', 'idx_currency_status_ts'),
+        ({'status': 'completed', 'customer_id': 'CUST-1'}, None, 'customer_id'),
+        ({'status': None, 'customer_id': 'CUST-1'}, 'product_category', 'customer_id'),
+    ])
+    def test_query_plan_searches_index(self, scratch_db, filters, group_by, index):
+        sql, params = queries.sales_query(0, 1, filters, group_by, bucket_seconds=queries.RAW_BUCKET_SECONDS)
+        plan = query_plan(scratch_db, sql, params)
+        assert any(step.startswith('SEARCH') and index in step for step in plan), plan
+        assert not any(step.startswith('SCAN') for step in plan), plan
+
+    def test_local_date_range(self):
+        assert processors.local_date_range('2024-01-15', '2024-01-15', 'UTC') == (1705276800, 1705363200)
+        start, end = processors.local_date_range('2024-01-15', '2024-01-15', 'America/New_York')
+        assert (start, end) == (1705276800 + 5 * 3600, 1705363200 + 5 * 3600)
+        # Spring forward day is 23 hours long, fall back day 25 hours
+        start, end = processors.local_date_range('2024-03-10', '2024-03-10', 'America/New_York')
+        assert end - start == 23 * 3600
+        start, end = processors.local_date_range('2024-11-03', '2024-11-03', 'America/New_York')
+        assert end - start == 25 * 3600
+
+    @pytest.mark.parametrize('day', ['9999-12-31', '2262-04-11', '0001-01-01'])
+    def test_dates_past_supported_range_are_empty(self, sales_db, client, day):
+        start, end = processors.local_date_range(day, day, 'Asia/Kolkata')
+        assert start == end
+        for url in (f'/api/sales/daily?start_date={day}&end_date={day}', f'/api/sales/hourly?date={day}',
+                    f'/api/data-quality?start_date={day}&end_date={day}'):
+            response = client.get(url)
+            assert response.status_code == 200
+        assert json.loads(client.get(f'/api/sales/daily?start_date={day}&end_date={day}').data)['data'] == []
+
+    def test_processed_ts_backfilled_for_existing_rows(self, scratch_db):
+        conn = sqlite3.connect(scratch_db)
+        conn.execute('DROP INDEX idx_status_processed_ts')
+        conn.execute('DROP INDEX idx_processed_ts')
+        conn.execute('DROP INDEX idx_quality_issues')
+        conn.execute('DROP INDEX idx_category_status_ts')
+        conn.execute('DROP INDEX idx_currency_status_ts')
+        conn.execute('DROP INDEX idx_dedup_ts')
+        conn.execute('ALTER TABLE transactions DROP COLUMN processed_ts')
+        conn.execute('''
+            INSERT INTO transactions (transaction_id, customer_id, amount, currency, original_timestamp,
+                                      processed_timestamp, status, product_category)
+            VALUES ('TXN-1', 'CUST-1', 1.0, 'USD', 'x', '2024-01-15T14:30:00.500000+00:00', 'completed', 'books')
+        ''')
+        conn.commit()
+        conn.close()
+
+        database.ensure_schema()
+        conn = sqlite3.connect(scratch_db)
+        assert conn.execute('SELECT processed_ts FROM transactions').fetchone()[0] == 1705329000
+        conn.close()
+
+class TestSalesRollup:
+    """Test cases for the hourly sales rollup"""
+
+    def rollup_rows(self, db_path):
+        conn = sqlite3.connect(db_path)
+        rows = conn.execute('''
+            SELECT hour_ts, status, currency, product_category,
+                   ROUND(total_amount, 2), transaction_count, min_amount, max_amount
+            FROM sales_rollup_hourly ORDER BY 1, 2, 3, 4
+        ''').fetchall()
+        conn.close()
+        return rows
+
+    def expected_rows(self, db_path):
+        conn = sqlite3.connect(db_path)
+        rows = conn.execute('''
+            SELECT processed_ts - processed_ts % 3600, status, currency, product_category,
+                   ROUND(SUM(amount), 2), COUNT(*), MIN(amount), MAX(amount)
+            FROM transactions WHERE processed_ts IS NOT NULL
+            GROUP BY 1, 2, 3, 4 ORDER BY 1, 2, 3, 4
+        ''').fetchall()
+        conn.close()
+        return rows
+
+    def test_rollup_matches_transactions_after_full_load(self, scratch_db):
+        processors.process_csv_data(os.path.join(os.path.dirname(__file__), '..', 'data', 'transactions.csv'),
+                                    mode='full')
+        assert len(self.rollup_rows(scratch_db)) > 0
+        assert self.rollup_rows(scratch_db) == self.expected_rows(scratch_db)
+
+    def test_rollup_follows_incremental_upserts(self, scratch_db, tmp_path):
+        csv_path = tmp_path / 'transactions.csv'
+        lines = [
+            CSV_HEADER,
+            'TXN-1,CUST-1,100.0,USD,2024-01-15T12:10:00Z,,completed,books',
+            'TXN-2,CUST-2,50.0,USD,2024-01-15T12:20:00Z,,completed,books',
+        ]
+        csv_path.write_text('\n'.join(lines) + '\n')
+        processors.process_csv_data(str(csv_path), mode='incremental')
+        # TXN-1 is corrected to a later hour and a new status
+        lines.append('TXN-1,CUST-1,100.0,USD,2024-01-15T15:10:00Z,,refunded,books')
+        lines.append('TXN-3,CUST-3,25.0,EUR,2024-01-15T12:40:00Z,,completed,books')
+        csv_path.write_text('\n'.join(lines) + '\n')
+        processors.process_csv_data(str(csv_path), mode='incremental')
+
+        assert self.rollup_rows(scratch_db) == self.expected_rows(scratch_db)
+        assert [row[:2] + row[5:6] for row in self.rollup_rows(scratch_db)] == [
+            (1705320000, 'completed', 1), (1705320000, 'completed', 1), (1705330800, 'refunded', 1)
+        ]
+
+    def test_rollup_rebuilt_when_missing(self, scratch_db):
+        processors.process_csv_data(os.path.join(os.path.dirname(__file__), '..', 'data', 'transactions.csv'),
+                                    mode='full')
+        conn = sqlite3.connect(scratch_db)
+        conn.execute('DROP TABLE sales_rollup_hourly')
+        conn.commit()
+        conn.close()
+
+        database.ensure_schema()
+        assert self.rollup_rows(scratch_db) == self.expected_rows(scratch_db)
+
+    @pytest.mark.parametrize('filters, group_by, index', [
+        (None, None, 'COVERING INDEX idx_rollup_status_hour'),
+        ({'status': None}, 'status', 'PRIMARY KEY'),
+        ({'status': 'completed', 'currency': 'EUR'}, 'product_category', 'COVERING INDEX idx_rollup_status_hour'),
+    ])
+    def test_rollup_query_plan_searches_index(self, scratch_db, filters, group_by, index):
+        sql, params = queries.sales_query(0, 1, filters, group_by, rollup=True)
+        plan = query_plan(scratch_db, sql, params)
+        assert any(step.startswith('SEARCH') and index in step for step in plan), plan
+
+    def test_has_whole_hour_offsets(self):
+        start, end = processors.local_date_range('2024-11-03', '2024-11-03', 'America/New_York')
+        assert processors.has_whole_hour_offsets('America/New_York', start, end)
+        start, end = processors.local_date_range('2024-11-03', '2024-11-03', 'Asia/Kolkata')
+        assert not processors.has_whole_hour_offsets('Asia/Kolkata', start, end)
+        assert not processors.has_whole_hour_offsets('UTC', 1800, 7200)
+
+    @pytest.mark.parametrize('url', [
+        '/api/sales/daily?start_date=2024-03-09&end_date=2024-11-04&timezone=America/New_York',
+        '/api/sales/daily?start_date=2024-03-09&end_date=2024-11-04&timezone=UTC',
+        '/api/sales/hourly?date=2024-11-03&timezone=America/New_York',
+        '/api/sales/hourly?date=2024-03-10&timezone=America/New_York',
+        '/api/sales/compare?period1=2024-03&period2=2024-11',
+        '/api/sales/compare?periods=2024-03,2024-11,2024-W45,2024-03-09..2024-11-03&timezone=America/New_York',
+    ])
+    def test_rollup_matches_raw_rows(self, client, dst_db, monkeypatch, url):
+        from_rollup = client.get(url).get_json()
+        monkeypatch.setattr(queries.config, 'USE_SALES_ROLLUP', False)
+        response_cache.clear()
+        assert client.get(url).get_json() == from_rollup
+
+class TestSalesEndpoints:
+    """Test cases for the sales endpoints on a scratch database"""
+
+    @pytest.fixture(autouse=True)
+    def _setup_client(self, client, sales_db):
+        self.client = client
+
+    def test_daily_sales_uses_local_days(self):
+        data = self.client.get(
+            '/api/sales/daily?start_date=2024-01-15&end_date=2024-01-15&timezone=America/New_York'
+        ).get_json()
+        assert data['data'] == [{
+            'date': '2024-01-15', 'total_sales': 150.0, 'transaction_count': 2, 'average_order_value': 75.0,
+            'unique_customers': 2
+        }]
+
+    def test_hourly_sales_uses_local_day(self):
+        data = self.client.get('/api/sales/hourly?date=2024-01-15&timezone=America/New_York').get_json()
+        assert [hour['hour'] for hour in data['data']] == ['2024-01-15 07:00:00', '2024-01-15 22:00:00']
+
+    def test_compare_periods(self):
+        data = self.client.get('/api/sales/compare?period1=2024-01&period2=2024-02').get_json()
+        assert (data['period1']['total_sales'], data['period1']['transaction_count']) == (175.0, 3)
+        assert (data['period2']['total_sales'], data['period2']['transaction_count']) == (40.0, 1)
+        assert data['growth']['transaction_change_percent'] == -66.67
+
+    def test_compare_periods_without_sales(self):
+        data = self.client.get('/api/sales/compare?period1=2023-01&period2=2023-02').get_json()
+        assert data['period1']['total_sales'] == 0
+        assert data['growth']['sales_change_percent'] == 0
+
+class TestPeriodComparison:
+    """Test cases for comparing any number of periods"""
+
+    @pytest.fixture(autouse=True)
+    def _setup_client(self, client, sales_db):
+        self.client = client
+
+    def compare(self, query):
+        return self.client.get(f'/api/sales/compare?{query}')
+
+    @pytest.mark.parametrize('period_str, bounds', [
+        ('2024', ('2024-01-01', '2024-12-31')),
+        ('2024-Q1', ('2024-01-01', '2024-03-31')),
+        ('2024-02', ('2024-02-01', '2024-02-29')),
+        ('2024-W03', ('2024-01-15', '2024-01-21')),
+        ('2025-W01', ('2024-12-30', '2025-01-05')),
+        ('2024-02-29', ('2024-02-29', '2024-02-29')),
+        ('2024-01-10..2024-01-20', ('2024-01-10', '2024-01-20')),
+    ])
+    def test_parse_period(self, period_str, bounds):
+        assert processors.parse_period(period_str) == bounds
+
+    @pytest.mark.parametrize('period_str', ['2024-13', '2024-Q5', '2024-W60', '2024-02-30', '2024-02-10..2024-02-01', 'x'])
+    def test_parse_period_rejects_malformed(self, period_str):
+        with pytest.raises(ValueError):
+            processors.parse_period(period_str)
+
+    def test_shift_period_keeps_month_ends(self):
+        assert processors.shift_period('2024-02-01', '2024-02-29', '-1y') == ('2023-02-01', '2023-02-28')
+        assert processors.shift_period('2024-03-01', '2024-03-31', '-1m') == ('2024-02-01', '2024-02-29')
+        assert processors.shift_period('2024-01-01', '2024-03-31', '-3m') == ('2023-10-01', '2023-12-31')
+        assert processors.shift_period('2024-01-15', '2024-01-21', '-1w') == ('2024-01-08', '2024-01-14')
+        assert processors.shift_period('2024-01-10', '2024-01-20', '+7d') == ('2024-01-17', '2024-01-27')
+
+    def test_many_periods_with_every_pair(self):
+        data = self.compare('periods=2024-01,2024-02,2024-01-16..2024-02-29').get_json()
+        assert [(p['period'], p['total_sales'], p['transaction_count']) for p in data['periods']] == [
+            ('2024-01', 175.0, 3), ('2024-02', 40.0, 1), ('2024-01-16..2024-02-29', 115.0, 3)
+        ]
+        assert [(g['from'], g['to'], g['transaction_change_percent']) for g in data['growth']] == [
+            ('2024-01', '2024-02', -66.67), ('2024-01', '2024-01-16..2024-02-29', 0.0),
+            ('2024-02', '2024-01-16..2024-02-29', 200.0),
+        ]
+
+    def test_periods_use_the_timezone(self):
+        # TXN-2 (Jan 16 03:00 UTC) falls on Jan 15 in New York
+        utc = self.compare('periods=2024-01-15,2024-01-16').get_json()
+        new_york = self.compare('periods=2024-01-15,2024-01-16&timezone=America/New_York').get_json()
+        assert [p['transaction_count'] for p in utc['periods']] == [1, 2]
+        assert [p['transaction_count'] for p in new_york['periods']] == [2, 1]
+        assert new_york['timezone'] == 'America/New_York'
+
+    def test_offsets_add_shifted_periods(self):
+        data = self.compare('periods=2024-02&offsets=-1m,-1y').get_json()
+        assert [(p['period'], p['start'], p['end'], p['transaction_count']) for p in data['periods']] == [
+            ('2024-02', '2024-02-01', '2024-02-29', 1),
+            ('2024-02 -1m', '2024-01-01', '2024-01-31', 3),
+            ('2024-02 -1y', '2023-02-01', '2023-02-28', 0),
+        ]
+
+    def test_period_totals_match_separate_queries(self):
+        ranges = [processors.local_date_range(*processors.parse_period(period_str), 'UTC')
+                  for period_str in ['2024-02', '2024-01', '2024-Q1', '2024-01-15', '2023']]
+        expected = [queries.get_period_totals([period]) for period in ranges]
+        assert [[totals] for totals in queries.get_period_totals(ranges)] == expected
+
+    @pytest.mark.parametrize('query', [
+        'periods=2024-01,2024-13', 'periods=2024-01&offsets=1y', 'periods=2024-01&timezone=Mars/Olympus',
+        'period1=2024-01',
+    ])
+    def test_rejects_malformed_requests(self, query):
+        assert self.compare(query).status_code == 400
+
+    def test_rejects_too_many_periods(self, monkeypatch):
+        monkeypatch.setattr(config, 'COMPARE_MAX_PERIODS', 2)
+        assert self.compare('periods=2024-01,2024-02').status_code == 200
+        assert self.compare('periods=2024-01,2024-02&offsets=-1y').status_code == 400
+
+class TestSalesBreakdown:
+    """Test cases for filters and group_by on the sales endpoints"""
+
+    @pytest.fixture(autouse=True)
+    def _setup_client(self, client, breakdown_db):
+        self.client = client
+
+    def daily(self, query, timezone_str='UTC'):
+        return self.client.get(
+            f'/api/sales/daily?start_date=2024-01-15&end_date=2024-01-16&timezone={timezone_str}&{query}'
+        ).get_json()
+
+    def test_daily_split_by_category(self):
+        data = self.daily('group_by=category')
+        assert [(day['date'], day['category'], day['total_sales'], day['transaction_count']) for day in data['data']] == [
+            ('2024-01-15', 'books', 100.0, 1), ('2024-01-15', 'electronics', 50.0, 1),
+            ('2024-01-16', 'books', 10.0, 1), ('2024-01-16', 'electronics', 40.0, 1),
+        ]
+        assert data['groups'] == [
+            {'category': 'books', 'total_sales': 110.0, 'transaction_count': 2},
+            {'category': 'electronics', 'total_sales': 90.0, 'transaction_count': 2},
+        ]
+        assert data['summary']['total_sales'] == 200.0
+        assert data['group_by'] == 'category'
+
+    @pytest.mark.parametrize('query, total_sales, transaction_count', [
+        ('category=books', 110.0, 2),
+        ('category=books&status=all', 135.0, 3),
+        ('transaction_currency=EUR', 60.0, 2),
+        ('status=pending', 25.0, 1),
+        ('customer_id=CUST-1&status=all', 130.0, 3),
+        ('category=toys', 0, 0),
+    ])
+    def test_daily_filters(self, query, total_sales, transaction_count):
+        summary = self.daily(query)['summary']
+        assert (summary['total_sales'], summary['total_transactions']) == (total_sales, transaction_count)
+
+    def test_group_by_status_keeps_every_status(self):
+        assert [(group['status'], group['transaction_count']) for group in self.daily('group_by=status')['groups']] == [
+            ('completed', 4), ('pending', 1), ('failed', 1)
+        ]
+        assert [group['status'] for group in self.daily('group_by=status&status=failed')['groups']] == ['failed']
+
+    def test_group_by_customer(self):
+        data = self.daily('group_by=customer&status=all')
+        assert [(group['customer'], group['total_sales']) for group in data['groups']] == [
+            ('CUST-1', 130.0), ('CUST-2', 90.0), ('CUST-3', 10.0)
+        ]
+
+    def test_empty_group_by(self):
+        data = self.daily('group_by=currency&category=toys')
+        assert (data['data'], data['groups'], data['group_by']) == ([], [], 'currency')
+        data = self.client.get('/api/sales/hourly?date=2024-01-20&group_by=currency').get_json()
+        assert (data['data'], data['groups']) == ([], [])
+
+    def test_hourly_split_by_currency(self):
+        data = self.client.get('/api/sales/hourly?date=2024-01-15&group_by=currency').get_json()
+        assert [(hour['hour'], hour['currency'], hour['total_sales']) for hour in data['data']] == [
+            ('2024-01-15 12:00:00', 'EUR', 50.0), ('2024-01-15 12:00:00', 'USD', 100.0)
+        ]
+
+    def test_compare_split_by_category(self):
+        data = self.client.get('/api/sales/compare?periods=2024-01-15,2024-01-16,2024-01&group_by=category'
+                               '&transaction_currency=USD').get_json()
+        assert [period['groups'] for period in data['periods']] == [
+            [{'category': 'books', 'total_sales': 100.0, 'transaction_count': 1}],
+            [{'category': 'electronics', 'total_sales': 40.0, 'transaction_count': 1}],
+            [{'category': 'books', 'total_sales': 100.0, 'transaction_count': 1},
+             {'category': 'electronics', 'total_sales': 40.0, 'transaction_count': 1}],
+        ]
+        assert data['filters']['transaction_currency'] == 'USD'
+
+    @pytest.mark.parametrize('timezone_str', ['UTC', 'Asia/Kolkata', 'America/New_York'])
+    @pytest.mark.parametrize('query', ['group_by=category', 'group_by=customer', 'group_by=status&currency=EUR',
+                                       'category=books&status=all', 'customer_id=CUST-2'])
+    def test_every_source_agrees(self, monkeypatch, timezone_str, query):
+        answers = [self.daily(query, timezone_str)]
+        monkeypatch.setattr(queries.config, 'USE_SALES_ROLLUP', False)
+        response_cache.clear()
+        answers.append(self.daily(query, timezone_str))
+        monkeypatch.setattr(queries.config, 'USE_COLUMNAR_STORE', False)
+        response_cache.clear()
+        answers.append(self.daily(query, timezone_str))
+        assert answers[0] == answers[1] == answers[2]
+
+    def test_rejects_unknown_group_by(self):
+        response = self.client.get('/api/sales/daily?start_date=2024-01-15&end_date=2024-01-16&group_by=color')
+        assert response.status_code == 400
+
+class TestTopCustomers:
+    """Test cases for the daily top customer summaries and /api/customers/top"""
+
+    SUMMARY_SIZE = 5
+
+    @pytest.fixture(autouse=True)
+    def _setup_db(self, client, scratch_db, tmp_path, monkeypatch):
+        # 30 customers over ten days, each day keeping only its top 5 per metric
+        monkeypatch.setattr(database, 'TOP_CUSTOMERS_SUMMARY_SIZE', self.SUMMARY_SIZE)
+        rng = random.Random(5)
+        lines = [CSV_HEADER]
+        for i in range(600):
+            customer = rng.randint(0, 29)
+            lines.append(f"TXN-{i},CUST-{customer:02d},{rng.randint(1, 50) * (customer + 1)}.0,USD,"
+                         f"2024-01-{10 + i % 10}T{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:00Z,,"
+                         f"{'pending' if i % 7 == 0 else 'completed'},books")
+        self.csv_path = tmp_path / 'transactions.csv'
+        self.csv_path.write_text('\n'.join(lines) + '\n')
+        processors.process_csv_data(str(self.csv_path), mode='full')
+        self.client = client
+        self.db_path = scratch_db
+
+    def exact_values(self, metric, start_ts, end_ts):
+        conn = sqlite3.connect(self.db_path)
+        rows = conn.execute(f'''
+            SELECT customer_id, {database.TOP_CUSTOMER_METRICS[metric]} FROM transactions
+            WHERE status = 'completed' AND processed_ts >= ? AND processed_ts < ? GROUP BY customer_id
+        ''', (start_ts, end_ts)).fetchall()
+        conn.close()
+        return dict(rows)
+
+    def summary_rows(self):
+        conn = sqlite3.connect(self.db_path)
+        rows = conn.execute('SELECT * FROM customer_topk_daily ORDER BY 1, 2, 3').fetchall()
+        conn.close()
+        return rows
+
+    @pytest.mark.parametrize('metric', ['spend', 'transactions'])
+    def test_exact_matches_group_by(self, metric):
+        start_ts, end_ts = processors.local_date_range('2024-01-10', '2024-01-19', 'UTC')
+        customers, error_bound = queries.get_top_customers(start_ts, end_ts, metric, 10, exact=True)
+        exact = self.exact_values(metric, start_ts, end_ts)
+        expected = sorted(exact, key=lambda customer_id: (-exact[customer_id], customer_id))[:10]
+        assert [(customer_id, value, max_error) for customer_id, value, max_error in customers] == [
+            (customer_id, exact[customer_id], 0) for customer_id in expected
+        ]
+        assert error_bound == 0
+
+    @pytest.mark.parametrize('metric', ['spend', 'transactions'])
+    @pytest.mark.parametrize('timezone_str', ['UTC', 'Asia/Kolkata'])
+    def test_approximate_within_error_bound(self, metric, timezone_str):
+        start_ts, end_ts = processors.local_date_range('2024-01-10', '2024-01-19', timezone_str)
+        customers, error_bound = queries.get_top_customers(start_ts, end_ts, metric, 10)
+        exact = self.exact_values(metric, start_ts, end_ts)
+        assert 0 < error_bound <= sum(exact.values()) / (self.SUMMARY_SIZE + 1)
+        for customer_id, value, max_error in customers:
+            assert exact[customer_id] <= value <= exact[customer_id] + max_error + 1e-9
+            assert max_error <= error_bound
+        # Every customer left out of the answer truly had no more than the last listed estimate
+        listed = {customer_id for customer_id, _, _ in customers}
+        assert all(value <= customers[-1][1] for customer_id, value in exact.items() if customer_id not in listed)
+
+    def test_approximate_is_exact_when_summaries_keep_everyone(self, monkeypatch):
+        monkeypatch.setattr(database, 'TOP_CUSTOMERS_SUMMARY_SIZE', 30)
+        processors.process_csv_data(str(self.csv_path), mode='full')
+        start_ts, end_ts = processors.local_date_range('2024-01-10', '2024-01-19', 'America/New_York')
+        assert queries.get_top_customers(start_ts, end_ts, 'spend', 30) == \
+            queries.get_top_customers(start_ts, end_ts, 'spend', 30, exact=True)
+
+    def test_summaries_follow_incremental_ingest(self):
+        lines = self.csv_path.read_text().splitlines()
+        lines[1] = 'TXN-0,CUST-99,9999.0,USD,2024-01-12T10:00:00Z,,completed,books'  # Moved to another day
+        lines.append('TXN-new,CUST-98,5000.0,USD,2024-01-20T10:00:00Z,,completed,books')
+        self.csv_path.write_text('\n'.join(lines) + '\n')
+        processors.process_csv_data(str(self.csv_path), mode='incremental')
+        incremental = self.summary_rows()
+
+        conn = sqlite3.connect(self.db_path)
+        database.rebuild_customer_topk(conn)
+        conn.commit()
+        conn.close()
+        assert incremental == self.summary_rows()
+        assert ('spend', 1705708800, 'CUST-98', 5000.0, 0.0) in incremental
+
+    def test_endpoint_modes(self):
+        url = '/api/customers/top?start_date=2024-01-10&end_date={end}&limit=3'
+        short = self.client.get(url.format(end='2024-01-12')).get_json()
+        assert (short['mode'], short['error_bound'], short['currency']) == ('exact', 0, 'USD')
+        assert [customer['max_error'] for customer in short['customers']] == [0, 0, 0]
+
+        data = self.client.get(url.format(end='2024-01-19')).get_json()
+        assert data['mode'] == 'approximate' and data['error_bound'] > 0
+        assert len(data['customers']) == 3
+        assert set(data['customers'][0]) == {'customer_id', 'total_sales', 'max_error'}
+
+        data = self.client.get(url.format(end='2024-01-19') + '&mode=exact&by=transactions').get_json()
+        assert (data['mode'], data['error_bound'], 'currency' in data) == ('exact', 0, False)
+        assert all(isinstance(customer['transaction_count'], int) for customer in data['customers'])
+
+    @pytest.mark.parametrize('query', ['', 'start_date=2024-01-10', 'by=refunds', 'mode=fast', 'limit=0',
+                                       'limit=101', 'limit=x', 'timezone=Mars/Base'])
+    def test_rejects_malformed_requests(self, query):
+        dates = '' if 'start_date' in query or not query else 'start_date=2024-01-10&end_date=2024-01-19&'
+        assert self.client.get(f'/api/customers/top?{dates}{query}').status_code == 400
+
+class TestUniqueCustomers:
+    """Test cases for the HyperLogLog customer sketches and unique_customers of the sales endpoints"""
+
+    # Three standard errors of a 4096 register sketch
+    TOLERANCE = 3 * 1.04 / 64
+
+    def exact_counts(self, db_path, ranges, status='completed'):
+        conn = sqlite3.connect(db_path)
+        counts = [conn.execute(f'''
+            SELECT COUNT(DISTINCT customer_id) FROM transactions
+            WHERE processed_ts >= ? AND processed_ts < ? {'AND status = ?' if status else ''}
+        ''', (start_ts, end_ts, *([status] if status else []))).fetchone()[0] for start_ts, end_ts in ranges]
+        conn.close()
+        return counts
+
+    def sketch_rows(self, db_path):
+        conn = sqlite3.connect(db_path)
+        rows = conn.execute('SELECT hour_ts, status, registers FROM customer_sketch_hourly ORDER BY 1, 2').fetchall()
+        conn.close()
+        return rows
+
+    @pytest.mark.parametrize('count', [10, 1000, 50000])
+    def test_sketch_estimates_and_merges(self, count):
+        values = [f"CUST-{i}" for i in range(count)]
+        halves = sketches.build([i % 2 for i in range(count)], 2, values)
+        merged = np.zeros(sketches.REGISTER_COUNT, dtype='uint8')
+        for registers in halves:
+            sketches.merge_into(merged, sketches.encode(registers))
+        assert (merged == sketches.build(np.zeros(count, 'int64'), 1, values)[0]).all()
+        assert abs(sketches.estimate(merged) / count - 1) < self.TOLERANCE
+        assert len(sketches.encode(halves[0])) <= sketches.REGISTER_COUNT
+
+    @pytest.mark.parametrize('timezone_str', ['UTC', 'America/New_York', 'Asia/Kolkata'])
+    def test_daily_matches_exact_counts_on_sample(self, client, scratch_db, timezone_str):
+        processors.process_csv_data(CSV_PATH, mode='full')
+        data = client.get(f'/api/sales/daily?start_date=2024-01-01&end_date=2024-03-31&timezone={timezone_str}'
+                          ).get_json()
+        ranges = [processors.local_date_range(day['date'], day['date'], timezone_str) for day in data['data']]
+        exact = self.exact_counts(scratch_db, ranges)
+        # A day of a few dozen customers can lose one or two whose hashes share a register
+        assert [day['unique_customers'] for day in data['data']] == pytest.approx(exact, rel=self.TOLERANCE, abs=2)
+        (total,) = self.exact_counts(scratch_db, [processors.local_date_range('2024-01-01', '2024-03-31',
+                                                                              timezone_str)])
+        assert total > 1000
+        assert data['summary']['unique_customers'] == pytest.approx(total, rel=self.TOLERANCE)
+
+    def test_compare_and_status_filters(self, client, scratch_db):
+        processors.process_csv_data(CSV_PATH, mode='full')
+        data = client.get('/api/sales/compare?periods=2024-01,2024-02,2024-Q1&timezone=Asia/Kolkata').get_json()
+        ranges = [processors.local_date_range(period['start'], period['end'], 'Asia/Kolkata')
+                  for period in data['periods']]
+        assert [period['unique_customers'] for period in data['periods']] == \
+            pytest.approx(self.exact_counts(scratch_db, ranges), rel=self.TOLERANCE)
+
+        data = client.get('/api/sales/compare?period1=2024-01&period2=2024-02&status=all').get_json()
+        ranges = [processors.local_date_range(data[key]['start'], data[key]['end'], 'UTC')
+                  for key in ('period1', 'period2')]
+        assert [data['period1']['unique_customers'], data['period2']['unique_customers']] == \
+            pytest.approx(self.exact_counts(scratch_db, ranges, status=None), rel=self.TOLERANCE)
+
+        # The sketches do not split customers by category
+        data = client.get('/api/sales/daily?start_date=2024-01-01&end_date=2024-01-31&category=books').get_json()
+        assert 'unique_customers' not in data['summary'] and 'unique_customers' not in data['data'][0]
+        data = client.get('/api/sales/daily?start_date=2023-01-01&end_date=2023-01-31').get_json()
+        assert data['summary']['unique_customers'] == 0
+
+    def test_sketches_follow_incremental_ingest(self, scratch_db, tmp_path):
+        csv_path = tmp_path / 'transactions.csv'
+        lines = [
+            CSV_HEADER,
+            'TXN-1,CUST-1,100.0,USD,2024-01-15T12:10:00Z,,completed,books',
+            'TXN-2,CUST-2,50.0,USD,2024-01-15T12:20:00Z,,completed,books',
+        ]
+        csv_path.write_text('\n'.join(lines) + '\n')
+        processors.process_csv_data(str(csv_path), mode='incremental')
+        lines[1] = 'TXN-1,CUST-1,100.0,USD,2024-01-15T15:10:00Z,,refunded,books'
+        lines.append('TXN-3,CUST-3,25.0,EUR,2024-01-15T12:40:00Z,,completed,books')
+        csv_path.write_text('\n'.join(lines) + '\n')
+        processors.process_csv_data(str(csv_path), mode='incremental')
+        incremental = self.sketch_rows(scratch_db)
+
+        conn = sqlite3.connect(scratch_db)
+        database.rebuild_customer_sketches(conn)
+        conn.commit()
+        conn.close()
+        assert incremental == self.sketch_rows(scratch_db)
+        assert [row[:2] for row in incremental] == [(1705320000, 'completed'), (1705330800, 'refunded')]
+        assert queries.get_unique_customers([(1705320000, 1705334400)], {'status': None}) == [3]
+
+class TestTimezoneBucketing:
+    """Test cases for local day and hour buckets around DST transitions"""
+
+    @pytest.fixture(autouse=True)
+    def _setup_client(self, client, dst_db):
+        self.client = client
+
+    def daily(self, start_date, end_date, timezone_str):
+        data = self.client.get(
+            f'/api/sales/daily?start_date={start_date}&end_date={end_date}&timezone={timezone_str}'
+        ).get_json()
+        return {day['date']: day['transaction_count'] for day in data['data']}
+
+    def test_daily_around_fall_back(self):
+        assert self.daily('2024-11-03', '2024-11-03', 'America/New_York') == {'2024-11-03': 3}
+        assert self.daily('2024-11-03', '2024-11-04', 'UTC') == {'2024-11-03': 2, '2024-11-04': 1}
+
+    def test_daily_around_spring_forward(self):
+        assert self.daily('2024-03-09', '2024-03-10', 'America/New_York') == {'2024-03-09': 1, '2024-03-10': 2}
+
+    def test_hourly_keeps_repeated_hour_apart(self):
+        data = self.client.get('/api/sales/hourly?date=2024-11-03&timezone=America/New_York').get_json()
+        assert [(h['hour'], h['utc_offset'], h['total_sales']) for h in data['data']] == [
+            ('2024-11-03 01:00:00', '-04:00', 10.0),
+            ('2024-11-03 01:00:00', '-05:00', 20.0),
+            ('2024-11-03 23:00:00', '-05:00', 30.0),
+        ]
+
+    def test_hourly_with_fractional_offset(self):
+        data = self.client.get('/api/sales/hourly?date=2024-11-03&timezone=Asia/Kolkata').get_json()
+        assert [(h['hour'], h['utc_offset']) for h in data['data']] == [
+            ('2024-11-03 11:00:00', '+05:30'),
+            ('2024-11-03 12:00:00', '+05:30'),
+        ]
+
+class TestQualityIssues:
+    """Test cases for the quality_issues bitmask and the filtered data quality report"""
+
+    def stored_issues(self, db_path):
+        conn = sqlite3.connect(db_path)
+        rows = conn.execute('''
+            SELECT processed_ts, product_category, currency, data_quality_flags, quality_issues
+            FROM transactions ORDER BY transaction_id
+        ''').fetchall()
+        conn.close()
+        return rows
+
+    def expected_counts(self, db_path, start_ts=None, end_ts=None, category=None, currency=None):
+        """(total, with issues, per-issue counts) from parsing the JSON flags of every matching row"""
+        counts = {name: 0 for name in database.ISSUE_BITS}
+        total = with_issues = 0
+        for ts, row_category, row_currency, flags, _ in self.stored_issues(db_path):
+            if start_ts is not None and (ts is None or not start_ts <= ts < end_ts):
+                continue
+            if category and row_category != category or currency and row_currency != currency:
+                continue
+            issues = json.loads(flags)['issues']
+            total += 1
+            with_issues += bool(issues)
+            for name in issues:
+                counts[name] += 1
+        return total, with_issues, counts
+
+    def test_bitmask_matches_json_flags(self, scratch_db):
+        processors.process_csv_data(CSV_PATH, mode='full')
+        rows = self.stored_issues(scratch_db)
+        for *_, flags, mask in rows:
+            assert mask == sum(database.ISSUE_BITS[name] for name in json.loads(flags)['issues'])
+        assert any(mask for *_, mask in rows)
+
+    def test_bitmask_backfilled_from_json(self, scratch_db):
+        processors.process_csv_data(CSV_PATH, mode='full')
+        expected = self.stored_issues(scratch_db)
+        conn = sqlite3.connect(scratch_db)
+        conn.execute('DROP INDEX idx_quality_issues')
+        conn.execute('ALTER TABLE transactions DROP COLUMN quality_issues')
+        conn.commit()
+        conn.close()
+
+        database.ensure_schema()
+        assert self.stored_issues(scratch_db) == expected
+
+    def test_issue_query_plan_uses_partial_index(self, scratch_db):
+        for where, params in [
+            ('processed_ts >= ? AND processed_ts < ? AND +currency = ?', (0, 1, 'USD')),
+            ('+product_category = ?', ('books',)),
+        ]:
+            plan = query_plan(scratch_db, queries.ISSUE_COUNTS_SQL.format(where=where), params)
+            # Scanning the partial index only visits rows with issues
+            assert all('idx_quality_issues' in step for step in plan), plan
+
+    @pytest.mark.parametrize('filters', [
+        {},
+        {'category': 'books'},
+        {'currency': 'EUR', 'category': 'home'},
+        {'start_date': '2024-02-01', 'end_date': '2024-02-29'},
+        {'start_date': '2024-02-01', 'end_date': '2024-02-29', 'timezone': 'Asia/Kolkata', 'currency': 'USD'},
+    ])
+    def test_counts_match_json_flags(self, scratch_db, filters):
+        processors.process_csv_data(CSV_PATH, mode='full')
+        start_ts = end_ts = None
+        if 'start_date' in filters:
+            start_ts, end_ts = processors.local_date_range(
+                filters['start_date'], filters['end_date'], filters.get('timezone', 'UTC')
+            )
+        expected = self.expected_counts(scratch_db, start_ts, end_ts, filters.get('category'), filters.get('currency'))
+        assert queries.get_issue_counts(start_ts, end_ts, filters.get('category'), filters.get('currency')) == expected
+        assert expected[2]['missing_timezone'] > 0
+
+    def test_filtered_endpoint(self, client, scratch_db):
+        processors.process_csv_data(CSV_PATH, mode='full')
+        data = client.get('/api/data-quality?start_date=2024-01-01&end_date=2024-01-31&category=books').get_json()
+        start_ts, end_ts = processors.local_date_range('2024-01-01', '2024-01-31', 'UTC')
+        total, with_issues, counts = self.expected_counts(scratch_db, start_ts, end_ts, 'books')
+        assert (data['total_records'], data['records_with_issues'], data['issues_found']) == (total, with_issues, counts)
+        assert data['filters']['category'] == 'books'
+        # Without filters the report is the ingest summary
+        assert 'resolution_summary' in client.get('/api/data-quality').get_json()
+
+    def test_filtered_endpoint_validation(self, client, scratch_db):
+        assert client.get('/api/data-quality?start_date=2024-01-01').status_code == 400
+        assert client.get('/api/data-quality?start_date=2024-01-01&end_date=2024-13-01').status_code == 400
+        assert client.get('/api/data-quality?currency=USD&timezone=Bad/Zone').status_code == 400
+
+class TestQualityCounters:
+    """Test cases for the per-day, per-ingest quality counters"""
+
+    @pytest.fixture
+    def edge_csv(self, tmp_path):
+        """Rows around the 2024 New York DST transitions plus an invalid date and a duplicate"""
+        csv_path = tmp_path / 'transactions.csv'
+        csv_path.write_text('\n'.join([
+            CSV_HEADER,
+            'TXN-1,CUST-1,10.0,USD,2024-03-10 02:30:00,America/New_York,completed,books',   # Nonexistent
+            'TXN-2,CUST-2,20.0,USD,2024-11-03 01:30:00,America/New_York,completed,books',   # Ambiguous
+            'TXN-3,CUST-3,30.0,USD,2024-11-03 12:00:00,America/New_York,completed,books',
+            'TXN-4,CUST-3,30.0,USD,2024-11-03 12:00:20,America/New_York,completed,books',   # Duplicate of TXN-3
+            'TXN-5,CUST-5,50.0,USD,2024-11-03T18:00:00Z,,completed,books',                  # Missing timezone
+            'TXN-6,CUST-6,60.0,USD,not a date,UTC,completed,books',
+        ]) + '\n')
+        return csv_path
+
+    def counts(self, **changes):
+        return dict(dict.fromkeys(database.QUALITY_COUNTER_COLUMNS, 0), **changes)
+
+    @pytest.mark.parametrize('mode', ['full', 'streaming', 'parallel'])
+    def test_edge_rows_counted_per_day(self, scratch_db, edge_csv, mode):
+        processors.process_csv_data(str(edge_csv), mode=mode)
+        days = dict(queries.get_quality_counters(group_by='day'))
+        march_10 = processors.local_day_start('2024-03-10', 'UTC')
+        november_3 = processors.local_day_start('2024-11-03', 'UTC')
+        assert days == {
+            database.UNDATED_DAY: self.counts(total_records=1, invalid_dates=1),
+            march_10: self.counts(total_records=1, dst_nonexistent=1),
+            november_3: self.counts(total_records=4, duplicate_transactions=1, missing_timezones=1, dst_ambiguous=1),
+        }
+
+    def test_counters_match_stats_and_stored_rows(self, scratch_db):
+        stats = processors.process_csv_data(CSV_PATH, mode='full')
+        (_, totals), = queries.get_quality_counters()
+        assert totals['total_records'] == stats['total_processed']
+        for name in ('invalid_dates', 'missing_timezones', 'duplicate_transactions'):
+            assert totals[name] == stats[name]
+
+        conn = sqlite3.connect(scratch_db)
+        stored = dict(conn.execute(
+            'SELECT processed_ts / 86400 * 86400, COUNT(*) FROM transactions '
+            'WHERE processed_ts IS NOT NULL GROUP BY 1'
+        ).fetchall())
+        conn.close()
+        for day, counts in queries.get_quality_counters(group_by='day'):
+            if day != database.UNDATED_DAY:
+                assert counts['total_records'] - counts['invalid_dates'] - counts['duplicate_transactions'] == stored[day]
+
+    def test_incremental_ingest_adds_batch(self, scratch_db, edge_csv):
+        processors.process_csv_data(str(edge_csv), mode='full')
+        with open(edge_csv, 'a') as f:
+            f.write('TXN-7,CUST-7,70.0,USD,2024-11-03T20:00:00Z,UTC,completed,books\n')
+        processors.process_csv_data(str(edge_csv), mode='incremental')
+
+        batches = queries.get_quality_counters(group_by='ingest')
+        assert [(group[1], counts['total_records']) for group, counts in batches] == [('full', 6), ('incremental', 1)]
+        # A full reload starts the history over
+        processors.process_csv_data(str(edge_csv), mode='full')
+        assert [group[1] for group, _ in queries.get_quality_counters(group_by='ingest')] == ['full']
+
+    def test_counters_backfilled_for_existing_rows(self, client, scratch_db, edge_csv):
+        processors.process_csv_data(str(edge_csv), mode='full')
+        assert client.get('/api/data-quality?group_by=day').get_json()['backfilled'] is False
+        conn = sqlite3.connect(scratch_db)
+        conn.execute('DROP TABLE quality_counters_daily')
+        conn.execute('DROP TABLE ingest_batches')
+        conn.commit()
+        conn.close()
+
+        database.ensure_schema()
+        days = dict(queries.get_quality_counters(group_by='day'))
+        march_10 = processors.local_day_start('2024-03-10', 'UTC')
+        november_3 = processors.local_day_start('2024-11-03', 'UTC')
+        # The dropped duplicate was never stored, so it is neither counted nor part of the total
+        assert days == {
+            database.UNDATED_DAY: self.counts(total_records=1, invalid_dates=1),
+            march_10: self.counts(total_records=1, dst_nonexistent=1),
+            november_3: self.counts(total_records=3, missing_timezones=1, dst_ambiguous=1),
+        }
+        assert [group[1] for group, _ in queries.get_quality_counters(group_by='ingest')] == [database.BACKFILL_MODE]
+
+        response_cache.clear()
+        data = client.get('/api/data-quality?start_date=2024-11-01&end_date=2024-11-30&group_by=day').get_json()
+        assert data['backfilled'] is True
+        assert [(group['date'], group['total_records']) for group in data['groups']] == [('2024-11-03', 3)]
+        # Only a database without any batch is backfilled
+        database.ensure_schema()
+        assert len(queries.get_quality_counters(group_by='ingest')) == 1
+
+    def test_counter_query_plan_searches_primary_key(self, scratch_db):
+        sql = queries.QUALITY_COUNTERS_SQL.format(
+            group_columns='', where='c.day_ts >= ? AND c.day_ts < ?', group_by=''
+        )
+        plan = ' '.join(query_plan(scratch_db, sql, (0, 86400)))
+        assert 'SEARCH c USING PRIMARY KEY (day_ts>? AND day_ts<?)' in plan
+        assert 'transactions' not in plan
+
+    def test_counter_endpoint(self, client, scratch_db, edge_csv):
+        processors.process_csv_data(str(edge_csv), mode='full')
+        data = client.get('/api/data-quality?start_date=2024-11-01&end_date=2024-11-30').get_json()
+        assert data['total_records'] == 4
+        assert data['issues_found']['dst_ambiguous'] == 1
+        assert data['issues_found']['dst_nonexistent'] == 0
+
+        data = client.get('/api/data-quality?group_by=day').get_json()
+        assert [group['date'] for group in data['groups']] == [None, '2024-03-10', '2024-11-03']
+        assert data['total_records'] == 6
+        assert data['issues_found']['invalid_dates'] == 1
+
+        data = client.get('/api/data-quality?group_by=ingest').get_json()
+        assert [(group['batch_id'], group['mode']) for group in data['groups']] == [(1, 'full')]
+
+    def test_counter_endpoint_validation(self, client, scratch_db):
+        assert client.get('/api/data-quality?group_by=week').status_code == 400
+        assert client.get('/api/data-quality?group_by=day&category=books').status_code == 400
+        assert client.get('/api/data-quality?group_by=day&end_date=2024-01-31').status_code == 400
+        assert client.get('/api/data-quality?group_by=day').status_code == 200
+
+class TestCurrencyConversion:
+    """Test cases for base-currency amounts and the currency parameter of the sales endpoints"""
+
+    @pytest.fixture
+    def fx_db(self, scratch_db, tmp_path):
+        rates_path = tmp_path / 'fx_rates.csv'
+        rates_path.write_text('\n'.join([
+            'date,currency,rate',
+            '2024-01-15,EUR,1.10',
+            '2024-01-16,EUR,1.20',
+            '2024-01-15,GBP,1.25',
+        ]) + '\n')
+        database.replace_fx_rates(database.read_fx_rates_file(str(rates_path)))
+        csv_path = tmp_path / 'transactions.csv'
+        csv_path.write_text('\n'.join([
+            CSV_HEADER,
+            'TXN-1,CUST-1,100.0,EUR,2024-01-15T12:00:00Z,,completed,books',
+            'TXN-2,CUST-2,50.0,GBP,2024-01-16T03:00:00Z,,completed,books',   # Latest GBP rate is Jan 15
+            'TXN-3,CUST-3,10.0,USD,2024-01-16T12:00:00Z,,completed,books',
+            'TXN-4,CUST-4,20.0,XYZ,2024-01-16T13:00:00Z,,completed,books',   # No rates
+            'TXN-5,CUST-5,30.0,EUR,2024-01-14T12:00:00Z,,completed,books',   # Before the table, earliest rate
+        ]) + '\n')
+        processors.process_csv_data(str(csv_path), mode='full')
+        return scratch_db
+
+    def base_amounts(self, db_path):
+        conn = sqlite3.connect(db_path)
+        rows = dict(conn.execute('SELECT transaction_id, amount_base FROM transactions').fetchall())
+        conn.close()
+        return rows
+
+    def test_ingest_stores_base_amounts(self, fx_db):
+        stored = self.base_amounts(fx_db)
+        assert stored == {'TXN-1': pytest.approx(110.0), 'TXN-2': pytest.approx(62.5), 'TXN-3': 10.0,
+                          'TXN-4': None, 'TXN-5': pytest.approx(33.0)}
+
+        # Recomputing in SQL after a rate reload gives the values the vectorized ingest stored
+        database.replace_fx_rates(database.get_fx_rates())
+        assert self.base_amounts(fx_db) == stored
+
+    def test_rates_lookup_is_as_of(self):
+        rates = processors.FxRates([('EUR', 86400, 2.0), ('EUR', 3 * 86400, 4.0)])
+        assert rates.currencies() == ['EUR', 'USD']
+        converted = rates.to_base([1.0, 1.0, 1.0, 1.0, 1.0], ['EUR', 'EUR', 'EUR', 'USD', 'XYZ'],
+                                  [0, 2 * 86400 + 5, 3 * 86400, 0, 0])
+        assert converted[:4].tolist() == [2.0, 2.0, 4.0, 1.0]
+        assert pytest.approx(rates.from_base([8.0], 'EUR', [3 * 86400]).tolist()) == [2.0]
+        assert converted[4] != converted[4]  # NaN
+
+    @pytest.mark.parametrize('use_rollup', [True, False])
+    def test_daily_in_reporting_currency(self, client, fx_db, monkeypatch, use_rollup):
+        monkeypatch.setattr(queries.config, 'USE_SALES_ROLLUP', use_rollup)
+        response_cache.clear()
+        data = client.get('/api/sales/daily?start_date=2024-01-14&end_date=2024-01-16&currency=eur').get_json()
+        assert data['currency'] == 'EUR'
+        assert [(day['date'], day['total_sales'], day['transaction_count']) for day in data['data']] == [
+            ('2024-01-14', 30.0, 1), ('2024-01-15', 100.0, 1), ('2024-01-16', 60.42, 3)
+        ]
+
+        data = client.get('/api/sales/hourly?date=2024-01-16&currency=USD').get_json()
+        assert [hour['total_sales'] for hour in data['data']] == [62.5, 10.0, 0.0]  # The XYZ row adds nothing
+
+        # Without a currency amounts are summed as stored
+        data = client.get('/api/sales/daily?start_date=2024-01-16&end_date=2024-01-16').get_json()
+        assert 'currency' not in data
+        assert data['summary']['total_sales'] == 80.0
+
+    @pytest.mark.parametrize('use_rollup', [True, False])
+    def test_compare_in_reporting_currency(self, client, fx_db, monkeypatch, use_rollup):
+        monkeypatch.setattr(queries.config, 'USE_SALES_ROLLUP', use_rollup)
+        response_cache.clear()
+        data = client.get('/api/sales/compare?period1=2024-01&period2=2024-02&currency=EUR').get_json()
+        assert data['currency'] == 'EUR'
+        assert data['period1'] == {
+            'start': '2024-01-01', 'end': '2024-01-31', 'total_sales': 190.42, 'transaction_count': 5,
+            'unique_customers': 5
+        }
+        assert data['period2']['total_sales'] == 0
+
+    def test_unsupported_currency(self, client, fx_db):
+        response = client.get('/api/sales/daily?start_date=2024-01-14&end_date=2024-01-16&currency=XYZ')
+        assert response.status_code == 400
+        assert response.get_json()['message'] == 'currency must be one of EUR, GBP, USD'
+        assert client.get('/api/sales/compare?period1=2024-01&period2=2024-02&currency=JPY').status_code == 400
+
+    def test_rate_reload_updates_rollup(self, client, fx_db):
+        database.replace_fx_rates([('EUR', 0, 2.0), ('GBP', 0, 1.0)])
+        data = client.get('/api/sales/compare?period1=2024-01&period2=2024-02&currency=USD').get_json()
+        assert data['period1']['total_sales'] == 200.0 + 50.0 + 10.0 + 60.0
+
+    @pytest.fixture
+    def pre_fx_db(self, fx_db, tmp_path, monkeypatch):
+        """fx_db as left by ingest before base amounts: no amount_base, rollup base sums or rates"""
+        conn = sqlite3.connect(fx_db)
+        conn.execute('DROP INDEX idx_rollup_status_hour')
+        conn.execute('ALTER TABLE sales_rollup_hourly DROP COLUMN total_amount_base')
+        conn.execute('ALTER TABLE transactions DROP COLUMN amount_base')
+        conn.execute('DROP TABLE fx_rates')
+        conn.commit()
+        conn.close()
+        rates_path = tmp_path / 'fx_rates_file.csv'
+        rates_path.write_text('date,currency,rate\n2024-01-01,EUR,2.0\n2024-01-01,GBP,1.5\n')
+        monkeypatch.setattr(database, 'FX_RATES_PATH', str(rates_path))
+        return fx_db
+
+    def test_migration_loads_rates_before_base_amounts(self, pre_fx_db):
+        database.ensure_schema()
+        assert self.base_amounts(pre_fx_db) == {'TXN-1': 200.0, 'TXN-2': 75.0, 'TXN-3': 10.0,
+                                                'TXN-4': None, 'TXN-5': 60.0}
+        conn = sqlite3.connect(pre_fx_db)
+        total = conn.execute('SELECT SUM(total_amount_base) FROM sales_rollup_hourly').fetchone()[0]
+        conn.close()
+        assert total == 200.0 + 75.0 + 10.0 + 60.0
+
+    def test_first_request_migrates(self, client, pre_fx_db):
+        data = client.get('/api/sales/compare?period1=2024-01&period2=2024-02&currency=USD').get_json()
+        assert data['period1']['total_sales'] == 200.0 + 75.0 + 10.0 + 60.0
+        assert self.base_amounts(pre_fx_db)['TXN-1'] == 200.0
+
+    def test_rollup_without_base_column_is_rebuilt(self, fx_db):
+        conn = sqlite3.connect(fx_db)
+        conn.execute('DROP INDEX idx_rollup_status_hour')
+        conn.execute('ALTER TABLE sales_rollup_hourly DROP COLUMN total_amount_base')
+        conn.commit()
+        conn.close()
+        generation = database.get_data_generation()
+        database.ensure_schema()
+        conn = sqlite3.connect(fx_db)
+        total = conn.execute('SELECT SUM(total_amount_base) FROM sales_rollup_hourly').fetchone()[0]
+        conn.close()
+        assert total == pytest.approx(110.0 + 62.5 + 10.0 + 33.0)
+        assert database.get_data_generation() > generation
@@ -0,0 +1,126 @@
+# tests/test_cache.py
+"""
+Test cases for the response cache and conditional requests.
+"""
+
+import pytest
+import sys
+import os
+
+# Add the app directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+
+try:
+    import app as app_module
+    from app import response_cache
+    from cache import ResponseCache
+    import database
+    import processors
+
+except ImportError as e:
+    pytest.skip(f"Could not import app modules: {e}", allow_module_level=True)
+
+from .conftest import CSV_HEADER
+
+DAILY_URL = '/api/sales/daily?start_date=2024-01-15&end_date=2024-01-16'
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def csv_path(scratch_db, tmp_path):
+    """Scratch database loaded from a small CSV that tests can append to"""
+    path = tmp_path / 'transactions.csv'
+    path.write_text('\n'.join([
+        CSV_HEADER,
+        'TXN-1,CUST-1,100.0,USD,2024-01-15T12:00:00Z,,completed,books',
+        'TXN-2,CUST-2,50.0,USD,2024-01-16T03:00:00Z,,completed,books',
+    ]) + '\n')
+    processors.process_csv_data(str(path), mode='incremental')
+    return path
+
+class TestResponseCache:
+    """Test cases for the LRU/TTL cache"""
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = ResponseCache(max_entries=2, ttl_seconds=60)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        assert cache.get('a') == 1
+        cache.put('c', 3)
+        assert cache.get('b') is None
+        assert (cache.get('a'), cache.get('c')) == (1, 3)
+        assert cache.stats()['evictions'] == 1
+
+    def test_entries_expire_after_ttl(self):
+        clock = FakeClock()
+        cache = ResponseCache(max_entries=10, ttl_seconds=60, clock=clock)
+        cache.put('a', 1)
+        clock.now = 59.9
+        assert cache.get('a') == 1
+        clock.now = 60
+        assert cache.get('a') is None
+        assert len(cache) == 0
+        stats = cache.stats()
+        assert (stats['hits'], stats['misses'], stats['expirations']) == (1, 1, 1)
+
+    def test_zero_entries_disables_cache(self):
+        cache = ResponseCache(max_entries=0)
+        cache.put('a', 1)
+        assert cache.get('a') is None
+
+class TestCachedEndpoints:
+    """Test cases for cached endpoints, ETags and invalidation on ingest"""
+
+    @pytest.fixture(autouse=True)
+    def _setup_client(self, client, csv_path):
+        self.client = client
+        self.csv_path = csv_path
+
+    def test_repeated_request_is_a_hit(self):
+        hits = response_cache.hits
+        first = self.client.get(DAILY_URL)
+        # Parameter order, explicit defaults and unrelated parameters share the cache entry
+        second = self.client.get('/api/sales/daily?end_date=2024-01-16&timezone=UTC&start_date=2024-01-15&_=1')
+        assert first.status_code == second.status_code == 200
+        assert first.get_data() == second.get_data()
+        assert first.headers['ETag'] == second.headers['ETag']
+        assert response_cache.hits == hits + 1
+
+    def test_if_none_match_returns_304(self):
+        etag = self.client.get(DAILY_URL).headers['ETag']
+        response = self.client.get(DAILY_URL, headers={'If-None-Match': etag})
+        assert response.status_code == 304
+        assert response.get_data() == b''
+        assert response.headers['ETag'] == etag
+        assert self.client.get(DAILY_URL, headers={'If-None-Match': '"stale"'}).status_code == 200
+
+    def test_ingest_commit_invalidates_entries(self):
+        first = self.client.get(DAILY_URL)
+        generation = database.get_data_generation()
+        with open(self.csv_path, 'a') as f:
+            f.write('TXN-3,CUST-3,25.0,USD,2024-01-16T12:00:00Z,,completed,books\n')
+        processors.process_csv_data(str(self.csv_path), mode='incremental')
+        assert database.get_data_generation() > generation
+
+        second = self.client.get(DAILY_URL, headers={'If-None-Match': first.headers['ETag']})
+        assert second.status_code == 200
+        assert second.get_json()['summary']['total_transactions'] == 3
+
+    def test_errors_are_not_cached(self):
+        size = len(response_cache)
+        assert self.client.get('/api/sales/daily?start_date=2024-01-15').status_code == 400
+        assert len(response_cache) == size
+
+    def test_metrics(self):
+        self.client.get(DAILY_URL)
+        etag = self.client.get(DAILY_URL).headers['ETag']
+        self.client.get(DAILY_URL, headers={'If-None-Match': etag})
+        data = self.client.get('/api/metrics').get_json()
+        assert data['data_generation'] == database.get_data_generation()
+        assert data['response_cache']['hits'] >= 2
+        assert data['response_cache']['not_modified'] == app_module.not_modified_count >= 1
@@ -0,0 +1,121 @@
+# tests/test_database.py
+"""
+Test cases for the read-only connection pool.
+"""
+
+import pytest
+import sys
+import os
+import sqlite3
+import threading
+
+# Add the app directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+
+try:
+    import database
+
+except ImportError as e:
+    pytest.skip(f"Could not import app modules: {e}", allow_module_level=True)
+
+@pytest.fixture
+def pool(scratch_db):
+    pool = database.ConnectionPool(scratch_db, max_size=2, timeout=0.05)
+    yield pool
+    pool.close()
+
+class TestConnectionPool:
+    """Test cases for connection reuse, limits and health checks"""
+
+    def test_connection_is_reused_by_thread(self, pool):
+        with pool.connection() as first:
+            pass
+        with pool.connection() as second:
+            assert second is first
+        assert pool.stats()['size'] == 1
+
+    def test_connections_are_read_only(self, pool):
+        with pool.connection() as conn:
+            assert conn.execute('PRAGMA query_only').fetchone()[0] == 1
+            assert conn.execute('PRAGMA mmap_size').fetchone()[0] == database.DB_MMAP_SIZE
+            with pytest.raises(sqlite3.OperationalError):
+                conn.execute("INSERT INTO data_generation (id, generation) VALUES (1, 1)")
+
+    def test_sees_commits_of_writers(self, pool):
+        with pool.connection() as conn:
+            assert conn.execute('SELECT COUNT(*) FROM transactions').fetchone()[0] == 0
+        writer = database.get_connection()
+        writer.execute('''
+            INSERT INTO transactions (transaction_id, customer_id, amount, currency, original_timestamp,
+                                      status, product_category)
+            VALUES ('TXN-1', 'CUST-1', 1.0, 'USD', 'x', 'completed', 'books')
+        ''')
+        writer.commit()
+        writer.close()
+        with pool.connection() as conn:
+            assert conn.execute('SELECT COUNT(*) FROM transactions').fetchone()[0] == 1
+
+    def test_exhausted_pool_times_out(self, pool):
+        first = pool.acquire()
+        second = pool.acquire()
+        with pytest.raises(sqlite3.OperationalError):
+            pool.acquire()
+        pool.release(first)
+        pool.release(second)
+        stats = pool.stats()
+        assert (stats['size'], stats['in_use'], stats['timeouts'], stats['waits']) == (2, 0, 1, 0)
+
+    def test_waiting_thread_gets_released_connection(self, scratch_db):
+        pool = database.ConnectionPool(scratch_db, max_size=1, timeout=5)
+        conn = pool.acquire()
+        acquired = []
+        waiter = threading.Thread(target=lambda: acquired.append(pool.acquire()))
+        waiter.start()
+        threading.Event().wait(0.05)
+        pool.release(conn)
+        waiter.join()
+        assert acquired == [conn]
+        stats = pool.stats()
+        assert stats['waits'] == 1 and stats['wait_ms_max'] > 0
+        pool.release(conn)
+        pool.close()
+
+    def test_broken_connection_is_replaced(self, scratch_db):
+        pool = database.ConnectionPool(scratch_db, max_size=2, health_check_seconds=0)
+        with pool.connection() as conn:
+            pass
+        conn.close()
+        with pool.connection() as replacement:
+            assert replacement is not conn
+            assert replacement.execute('SELECT 1').fetchone() == (1,)
+        stats = pool.stats()
+        assert (stats['size'], stats['health_check_failures']) == (1, 1)
+        pool.close()
+
+    def test_forked_pool_drops_inherited_connections(self, pool):
+        with pool.connection() as inherited:
+            pass
+        pool.pid = -1  # As seen from a forked worker
+        with pool.connection() as conn:
+            assert conn is not inherited
+        assert pool.stats()['size'] == 1
+        inherited.close()
+
+    def test_close_closes_connections_released_later(self, pool):
+        conn = pool.acquire()
+        pool.close()
+        pool.release(conn)
+        with pytest.raises(sqlite3.ProgrammingError):
+            conn.execute('SELECT 1')
+        with pytest.raises(sqlite3.ProgrammingError):
+            pool.acquire()
+
+    def test_pool_follows_db_path(self, scratch_db):
+        assert database.get_pool().db_path == scratch_db
+        assert database.get_pool() is database.get_pool()
+
+    def test_health_and_metrics_endpoints(self, scratch_db, client):
+        assert client.get('/health').get_json()['database_healthy'] is True
+        pool = client.get('/api/metrics').get_json()['connection_pool']
+        assert pool['db_path'] == scratch_db
+        assert pool['acquisitions'] >= 1
@@ -0,0 +1,670 @@
+# tests/test_ingest.py
+"""
+Test cases for the CSV ingest pipeline.
+"""
+
+import pytest
+import sys
+import os
+import random
+import time
+import subprocess
+from datetime import datetime, timedelta
+
+# Add the app directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+
+try:
+    import sqlite3
+    import numpy as np
+    import pandas as pd
+    import pytz
+    import database
+    import processors
+    import records
+    import ingest
+
+except ImportError as e:
+    pytest.skip(f"Could not import app modules: {e}", allow_module_level=True)
+
+from .conftest import CSV_HEADER, CSV_PATH
+
+def fetch_transactions(db_path):
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute('''
+        SELECT transaction_id, customer_id, amount, currency, original_timestamp, original_timezone,
+               processed_timestamp, status, product_category, data_quality_flags
+        FROM transactions ORDER BY transaction_id
+    ''').fetchall()
+    conn.close()
+    return rows
+
+def write_csv(path, lines):
+    path.write_text('\n'.join([CSV_HEADER] + lines) + '\n')
+    return str(path)
+
+def make_records(count, seed=7):
+    """Generating records with many near-duplicate candidates"""
+    rng = random.Random(seed)
+    base = datetime(2024, 1, 1, tzinfo=pytz.UTC)
+    records = []
+    for i in range(count):
+        dt = base + timedelta(seconds=rng.randint(0, 3600), microseconds=rng.choice([0, 500000]))
+        records.append({
+            'customer_id': f"CUST-{rng.randint(1, 20)}",
+            'amount': rng.choice([9.99, 10.0, 25.5]),
+            'processed_timestamp': dt.isoformat(),
+            'dt': dt,
+        })
+    return records
+
+class TestDuplicateDetector:
+    """Test cases for the indexed duplicate detection"""
+
+    def test_window_boundaries(self):
+        detector = processors.DuplicateDetector(window_seconds=60)
+        base = processors.to_epoch_us(datetime(2024, 1, 1, tzinfo=pytz.UTC))
+        assert detector.check_and_add('CUST-1', 10.0, base) is False
+        assert detector.check_and_add('CUST-1', 10.0, base + 60_000_000) is True
+        assert detector.check_and_add('CUST-1', 10.0, base - 60_000_001) is False
+        assert detector.check_and_add('CUST-1', 10.5, base) is False
+        assert detector.check_and_add('CUST-2', 10.0, base) is False
+        assert detector.check_and_add('CUST-1', 10.0, None) is False
+
+    def test_matches_linear_scan(self):
+        """The detector must flag exactly the rows is_duplicate flags"""
+        kept = []
+        legacy_flags = []
+        for record in make_records(2000):
+            duplicate = processors.is_duplicate(record, kept, record['dt'])
+            legacy_flags.append(duplicate)
+            if not duplicate:
+                kept.append(record)
+
+        detector = processors.DuplicateDetector()
+        flags = [
+            detector.check_and_add(r['customer_id'], r['amount'], processors.to_epoch_us(r['dt']))
+            for r in make_records(2000)
+        ]
+        assert flags == legacy_flags
+        assert len(detector) == len(kept)
+
+class TestBatchNormalizer:
+    """Test cases for the vectorized timestamp normalization"""
+
+    def assert_parity(self, timestamps, timezones, dst_checks):
+        normalized = processors.normalize_timestamps(timestamps, timezones, dst_checks)
+        for idx in timestamps.index:
+            expected_dt, expected_issues = processors.parse_timestamp(
+                timestamps[idx], timezones[idx], bool(dst_checks[idx])
+            )
+            utc = normalized.at[idx, 'utc']
+            assert processors.issue_list(normalized.at[idx, 'issue']) == expected_issues, timestamps[idx]
+            if expected_dt is None:
+                assert pd.isna(utc), timestamps[idx]
+            else:
+                assert utc == expected_dt, timestamps[idx]
+
+    def test_parity_with_parse_timestamp_on_csv(self):
+        df = pd.read_csv(CSV_PATH)
+        dst_checks = df['transaction_id'].str.lower().str.contains('dst', regex=False)
+        self.assert_parity(df['timestamp'], df['timezone'], dst_checks)
+
+    def test_parity_on_edge_cases(self):
+        rows = [
+            ('2024-03-10 02:30:00', 'America/New_York', False),  # nonexistent
+            ('2024-03-10 02:30:00', 'America/New_York', True),
+            ('2024-11-03 01:30:00', 'America/New_York', False),  # ambiguous
+            ('2024-11-03 01:30:00', 'America/New_York', True),
+            ('2024-01-15 14:30:00.123456', 'Asia/Tokyo', False),
+            ('2024-01-15 14:30:00.5', 'Asia/Kolkata', False),
+            ('2024-01-15', 'Europe/Paris', False),
+            ('2024-01-15T14:30:00Z', 'Bad/Zone', False),
+            ('2024-01-15T14:30:00Z', None, False),
+            ('2024-01-15 14:30:00', 'Bad/Zone', False),
+            ('01/15/24 2:30 PM', 'UTC', False),
+            ('12/31/99 11:59 PM', 'UTC', False),
+            ('15/01/2024 3:45 PM', 'Europe/London', False),
+            ('5-Jan-2024 09:05', 'Australia/Sydney', False),
+            ('November 3, 2024, 1:30 AM', 'America/New_York', True),
+            ('2024-01-15T14:30:00+05:00', 'UTC', False),
+            ('2024-01-15T14:30:00+05:00', None, False),
+            ('2024-02-30 10:00:00', 'UTC', False),
+            ('2024-13-45 25:99:99', 'UTC', False),
+            ('  2024-01-15 14:30:00  ', ' UTC ', False),
+            ('', 'UTC', False),
+            (None, None, False),
+        ]
+        timestamps = pd.Series([r[0] for r in rows], dtype=object)
+        timezones = pd.Series([r[1] for r in rows], dtype=object)
+        dst_checks = pd.Series([r[2] for r in rows])
+        self.assert_parity(timestamps, timezones, dst_checks)
+
+    def test_isoformat_and_epoch_columns(self):
+        utc = pd.Series(pd.to_datetime(['2024-01-15 14:30:00', '2024-01-15 14:30:00.250000', None], format='ISO8601', utc=True))
+        dts = [ts.to_pydatetime() for ts in utc[:2]]
+        assert list(processors.format_utc_isoformat(utc)) == [dt.isoformat() for dt in dts] + [None]
+        assert list(processors.epoch_microseconds(utc)) == [processors.to_epoch_us(dt) for dt in dts] + [None]
+
+class TestProcessorCaches:
+    """Test cases for the timezone, format and epoch caches"""
+
+    def sample_rows(self):
+        df = pd.read_csv(CSV_PATH, dtype=str)
+        dst_checks = df['transaction_id'].str.lower().str.contains('dst', regex=False)
+        return list(zip(df['timestamp'], df['timezone'], dst_checks))
+
+    def per_row_seconds(self, rows, formats):
+        started = time.perf_counter()
+        for timestamp, timezone_str, dst_check in rows:
+            processors.parse_timestamp(timestamp, timezone_str, dst_check, formats)
+        return (time.perf_counter() - started) / len(rows)
+
+    def test_unknown_timezones_are_cached(self):
+        misses = processors.timezone_cache.misses
+        assert processors.resolve_timezone('Not/AZone') is None
+        assert processors.resolve_timezone('Not/AZone') is None
+        assert processors.validate_timezone('Not/AZone') is False
+        assert processors.timezone_cache.misses == misses + 1
+        assert processors.resolve_timezone('Asia/Tokyo') is pytz.timezone('Asia/Tokyo')
+
+    def test_format_cache_matches_uncached_parse(self):
+        formats = processors.TimestampFormats()
+        uncached = processors.TimestampFormats(max_entries=0)
+        rows = self.sample_rows() + [
+            ('12/31/76 11:59 PM', 'UTC', False),  # two-digit year outside the strptime pattern
+            ('01/15/24 2:30 PM', 'UTC', False),
+            ('2024-02-30 10:00:00', 'UTC', False),
+            ('5-Foo-2024 09:05', 'UTC', False),
+            ('2024-01-15T14:30:00Z', 'Bad/Zone', False),
+        ]
+        for timestamp, timezone_str, dst_check in rows:
+            assert (processors.parse_timestamp(timestamp, timezone_str, dst_check, formats) ==
+                    processors.parse_timestamp(timestamp, timezone_str, dst_check, uncached)), timestamp
+        stats = formats.stats()
+        assert stats['size'] < 20
+        assert stats['hit_rate'] > 0.99
+
+    def test_epoch_memo(self, monkeypatch):
+        monkeypatch.setattr(processors, 'epoch_memo', processors.MemoCache(16))
+        expected = processors.parse_timestamp('2024-11-03 01:30:00', 'America/New_York', True)
+        for _ in range(3):
+            epoch_us, issues = processors.parse_timestamp_epoch('2024-11-03 01:30:00', 'America/New_York', True)
+            assert (epoch_us, issues) == (processors.to_epoch_us(expected[0]), expected[1])
+        assert processors.parse_timestamp_epoch('not a date', 'UTC') == (None, ['invalid_date_format'])
+        assert processors.epoch_memo.stats()['hit_rate'] == 0.5
+
+    def test_cached_parse_is_cheaper_per_row(self):
+        """Micro-benchmark: the format cache has to beat dateutil on the sample rows"""
+        rows = self.sample_rows()
+        formats = processors.TimestampFormats()
+        uncached = processors.TimestampFormats(max_entries=0)
+        self.per_row_seconds(rows[:200], formats)
+        cached_cost = min(self.per_row_seconds(rows, formats) for _ in range(3))
+        uncached_cost = min(self.per_row_seconds(rows, uncached) for _ in range(3))
+        print(f"parse_timestamp per row: {cached_cost * 1e6:.1f}us cached, {uncached_cost * 1e6:.1f}us uncached")
+        assert cached_cost < uncached_cost / 2
+
+class TestRecordBatch:
+    """Test cases for the compact record batch handed from the parser to the writer"""
+
+    def make_batch(self, ids, dictionaries=None):
+        count = len(ids)
+        return records.RecordBatch.from_columns({
+            'transaction_id': ids,
+            'customer_id': [f"CUST-{i % 2}" for i in range(count)],
+            'amount': [10.5 + i for i in range(count)],
+            'currency': ['USD', 'EUR'] * (count // 2) + ['USD'] * (count % 2),
+            'original_timestamp': ['2024-01-15 10:00:00.5'] * (count - 1) + [''],
+            'original_timezone': ['UTC'] * (count - 1) + [''],
+            'epoch_us': [1705312800_500000 + i for i in range(count - 1)] + [None],
+            'status': ['completed'] * count,
+            'product_category': ['books'] * count,
+            'issue': [''] * (count - 1) + ['empty_timestamp'],
+        }, dictionaries or records.RecordDictionaries(), '2024-04-01T00:00:00Z')
+
+    def test_stored_columns(self):
+        columns = self.make_batch(['TXN-1', 'TXN-2', 'TXN-3']).to_columns()
+        assert set(columns) == set(database.TRANSACTION_COLUMNS)
+        assert columns['processed_timestamp'] == [
+            '2024-01-15T10:00:00.500000+00:00', '2024-01-15T10:00:00.500001+00:00', None
+        ]
+        assert columns['processed_ts'] == [1705312800, 1705312800, None]
+        assert columns['data_quality_flags'] == ['{"issues": []}'] * 2 + ['{"issues": ["empty_timestamp"]}']
+        assert columns['customer_id'] == ['CUST-0', 'CUST-1', 'CUST-0']
+        assert columns['created_at'] == ['2024-04-01T00:00:00Z'] * 3
+
+    def test_quality_flags_json_is_optional(self, monkeypatch):
+        monkeypatch.setattr(records.config, 'QUALITY_FLAGS_JSON', False)
+        columns = self.make_batch(['TXN-1', 'TXN-2']).to_columns()
+        assert columns['data_quality_flags'] == [None, None]
+        assert columns['quality_issues'] == [0, database.ISSUE_BITS['empty_timestamp']]
+
+    def test_take_and_slices(self):
+        batch = self.make_batch([f"TXN-{i}" for i in range(7)])
+        kept = batch.take(np.array([True, False, True, True, False, False, True]))
+        assert kept.transaction_id.tolist() == ['TXN-0', 'TXN-2', 'TXN-3', 'TXN-6']
+        assert [part['transaction_id'] for part in kept.column_slices(3)] == [['TXN-0', 'TXN-2', 'TXN-3'], ['TXN-6']]
+        assert kept.epoch_values()[-1] is None
+        assert kept.codes['status'].dtype == np.uint8
+
+    def test_concat_merges_dictionaries(self):
+        first = self.make_batch(['TXN-1', 'TXN-2'])
+        second = self.make_batch(['TXN-3', 'TXN-4', 'TXN-5'])
+        merged = records.RecordBatch.concat([first, second])
+        assert merged.to_columns() == {
+            name: first.to_columns()[name] + second.to_columns()[name] for name in database.TRANSACTION_COLUMNS
+        }
+        assert len(merged.dictionaries.customer_id) == 2
+
+    def test_batch_is_compact(self):
+        df = pd.read_csv(CSV_PATH, dtype=processors.CSV_DTYPES)
+        batch = processors.prepare_frame(df, processors.new_stats())
+        frame_bytes = pd.DataFrame(batch.to_columns()).memory_usage(deep=True).sum()
+        assert batch.nbytes() * 5 < frame_bytes
+
+class TestStreamingIngest:
+    """Test cases for chunked CSV ingestion"""
+
+    def test_streaming_matches_full_load(self, scratch_db):
+        full_stats = processors.process_csv_data(CSV_PATH, mode='full')
+        full_rows = fetch_transactions(scratch_db)
+
+        streaming_stats = processors.process_csv_data(CSV_PATH, mode='streaming', chunk_size=700)
+        assert streaming_stats == full_stats
+        assert fetch_transactions(scratch_db) == full_rows
+
+    def test_duplicates_detected_across_chunks(self, scratch_db, tmp_path):
+        csv_path = write_csv(tmp_path / 'transactions.csv', [
+            'TXN-1,CUST-1,10.0,USD,2024-01-15 10:00:00,UTC,completed,books',
+            'TXN-2,CUST-2,20.0,USD,2024-01-15 10:00:00,UTC,completed,books',
+            'TXN-3,CUST-1,10.0,USD,2024-01-15 10:00:30,UTC,completed,books',
+            'TXN-4,CUST-1,10.0,USD,2024-01-15 10:05:00,UTC,completed,books',
+        ])
+        stats = processors.process_csv_data(csv_path, mode='streaming', chunk_size=2)
+        assert stats['duplicate_transactions'] == 1
+        assert [row[0] for row in fetch_transactions(scratch_db)] == ['TXN-1', 'TXN-2', 'TXN-4']
+
+    @pytest.mark.parametrize('chunk_size', [1000, 700])
+    def test_late_duplicate_matches_full_load(self, scratch_db, tmp_path, chunk_size):
+        # Twin of TXN-00003 (row 3) 30 s later, at the end of a file that is far from time order
+        csv_path = tmp_path / 'transactions.csv'
+        with open(CSV_PATH) as f:
+            csv_path.write_text(f.read() + 'TXN-99999,CUST-7336,842.45,USD,2024-01-16 06:24:49,,completed,beauty\n')
+        full_stats = processors.process_csv_data(str(csv_path), mode='full')
+        full_rows = fetch_transactions(scratch_db)
+        assert full_stats['duplicate_transactions'] == 1
+
+        streaming_stats = processors.process_csv_data(str(csv_path), mode='streaming', chunk_size=chunk_size)
+        assert streaming_stats == full_stats
+        assert fetch_transactions(scratch_db) == full_rows
+
+    def test_pruned_state_counts_rows_behind_it(self, scratch_db, tmp_path, monkeypatch, capsys):
+        monkeypatch.setattr(processors, 'STREAM_DEDUP_HORIZON_SECONDS', 600)
+        csv_path = write_csv(tmp_path / 'transactions.csv', [
+            'TXN-1,CUST-1,10.0,USD,2024-01-15 10:00:00,UTC,completed,books',
+            'TXN-2,CUST-2,20.0,USD,2024-01-15 12:00:00,UTC,completed,books',
+            'TXN-3,CUST-1,10.0,USD,2024-01-15 10:00:30,UTC,completed,books',   # Twin of the pruned TXN-1
+            'TXN-4,CUST-3,30.0,USD,2024-01-15 11:55:00,UTC,completed,books',   # Inside the horizon
+        ])
+        processors.process_csv_data(csv_path, mode='streaming', chunk_size=2)
+        assert '1 rows arrived more than STREAM_DEDUP_HORIZON_SECONDS' in capsys.readouterr().out
+
+    def test_prune_forgets_old_keys(self):
+        detector = processors.DuplicateDetector()
+        detector.add('CUST-1', 10.0, 1_000_000)
+        detector.add('CUST-2', 10.0, 5_000_000_000)
+        detector.prune(2_000_000)
+        assert len(detector) == 1
+        assert detector.is_duplicate('CUST-1', 10.0, 1_000_000) is False
+
+class TestBulkWriter:
+    """Test cases for the bulk transaction writer"""
+
+    def make_columns(self, ids):
+        count = len(ids)
+        return {
+            'transaction_id': ids,
+            'customer_id': ['CUST-1'] * count,
+            'amount': pd.Series([10.5] * count),
+            'amount_base': [10.5] * count,
+            'currency': ['USD'] * count,
+            'original_timestamp': ['2024-01-15 10:00:00'] * count,
+            'original_timezone': ['UTC'] * count,
+            'processed_timestamp': ['2024-01-15T10:00:00+00:00'] * count,
+            'processed_ts': [1705312800] * count,
+            'processed_timezone': ['UTC'] * count,
+            'status': ['completed'] * count,
+            'product_category': ['books'] * count,
+            'data_quality_flags': ['{"issues": []}'] * count,
+            'quality_issues': [0] * count,
+            'created_at': ['2024-04-01T00:00:00Z'] * count,
+        }
+
+    def index_names(self, db_path):
+        conn = sqlite3.connect(db_path)
+        names = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        conn.close()
+        return names
+
+    def test_full_reload_replaces_rows_and_rebuilds_indexes(self, scratch_db):
+        with database.BulkWriter() as writer:
+            writer.write(self.make_columns(['TXN-OLD']))
+
+        with database.BulkWriter(full_reload=True) as writer:
+            assert not set(database.SECONDARY_INDEXES) & self.index_names(scratch_db)
+            assert writer.write(self.make_columns(['TXN-1', 'TXN-2'])) == 2
+
+        assert [row[0] for row in fetch_transactions(scratch_db)] == ['TXN-1', 'TXN-2']
+        assert set(database.SECONDARY_INDEXES) <= self.index_names(scratch_db)
+
+    def test_insert_many_transactions_records(self, scratch_db):
+        columns = self.make_columns(['TXN-1'])
+        record = {name: values[0] for name, values in columns.items()}
+        database.insert_many_transactions([record])
+        assert fetch_transactions(scratch_db)[0][:3] == ('TXN-1', 'CUST-1', 10.5)
+
+class TestIncrementalIngest:
+    """Test cases for incremental ingestion from a high-water mark"""
+
+    def quality_summary(self, db_path):
+        conn = sqlite3.connect(db_path)
+        row = conn.execute('''
+            SELECT total_records, invalid_dates, missing_timezones, duplicate_transactions
+            FROM data_quality_summary
+        ''').fetchall()
+        conn.close()
+        return row
+
+    def test_only_appended_rows_are_processed(self, scratch_db, tmp_path):
+        csv_file = tmp_path / 'transactions.csv'
+        write_csv(csv_file, [
+            'TXN-1,CUST-1,10.0,USD,2024-01-15 10:00:00,UTC,completed,books',
+            'TXN-2,CUST-2,20.0,USD,2024-01-15 11:00:00,,pending,books',
+        ])
+        processors.process_csv_data(str(csv_file), mode='incremental')
+        assert self.quality_summary(scratch_db) == [(2, 0, 1, 0)]
+
+        with open(csv_file, 'a') as f:
+            f.write('TXN-3,CUST-1,10.0,USD,2024-01-15 10:00:45,UTC,completed,books\n')  # duplicate of TXN-1
+            f.write('TXN-2,CUST-2,20.0,USD,2024-01-15 11:00:00,,completed,books\n')  # re-sent with new status
+            f.write('TXN-4,CUST-3,30.0,USD,not a date,UTC,completed,books\n')
+            f.write('TXN-5,CUST-4,40.0,USD,2024-01-16 09:00:00,UTC,comp')  # still being written
+
+        stats = processors.process_csv_data(str(csv_file), mode='incremental')
+        assert stats == {
+            'total_processed': 3, 'invalid_dates': 1, 'missing_timezones': 1, 'duplicate_transactions': 1,
+            'out_of_order_records': 0
+        }
+        rows = fetch_transactions(scratch_db)
+        assert [(row[0], row[7]) for row in rows] == [('TXN-1', 'completed'), ('TXN-2', 'completed')]
+        assert self.quality_summary(scratch_db) == [(5, 1, 2, 1)]
+
+        with open(csv_file, 'a') as f:
+            f.write('leted,books\n')
+        processors.process_csv_data(str(csv_file), mode='incremental')
+        assert [row[0] for row in fetch_transactions(scratch_db)] == ['TXN-1', 'TXN-2', 'TXN-5']
+
+    def test_stored_duplicate_window_on_processed_ts(self, scratch_db, tmp_path):
+        csv_file = tmp_path / 'transactions.csv'
+        write_csv(csv_file, ['TXN-1,CUST-1,10.0,USD,2024-01-15 10:00:00,UTC,completed,books'])
+        processors.process_csv_data(str(csv_file), mode='incremental')
+        with open(csv_file, 'a') as f:
+            f.write('TXN-2,CUST-1,10.0,USD,2024-01-15 09:59:00,UTC,completed,books\n')  # 60 s before TXN-1
+            f.write('TXN-3,CUST-1,10.0,USD,2024-01-15 10:01:01,UTC,completed,books\n')  # 61 s after
+        stats = processors.process_csv_data(str(csv_file), mode='incremental')
+        assert stats['duplicate_transactions'] == 1
+        assert [row[0] for row in fetch_transactions(scratch_db)] == ['TXN-1', 'TXN-3']
+
+        conn = sqlite3.connect(scratch_db)
+        plan = conn.execute('''
+            EXPLAIN QUERY PLAN SELECT 1 FROM transactions
+            WHERE customer_id = 'CUST-1' AND amount = 10.0 AND processed_ts BETWEEN 0 AND 1 AND transaction_id != 'x'
+        ''').fetchall()
+        conn.close()
+        assert 'idx_dedup_ts' in plan[0][3]
+
+    def test_stored_duplicate_window_below_a_second(self, scratch_db, tmp_path):
+        csv_file = tmp_path / 'transactions.csv'
+        write_csv(csv_file, ['TXN-1,CUST-1,10.0,USD,2024-01-15 10:00:00.900000,UTC,completed,books'])
+        processors.process_csv_data(str(csv_file), mode='incremental')
+        with open(csv_file, 'a') as f:
+            f.write('TXN-2,CUST-1,10.0,USD,2024-01-15 09:59:00.500000,UTC,completed,books\n')  # 60.4 s before TXN-1
+            f.write('TXN-3,CUST-1,10.0,USD,2024-01-15 10:01:00.500000,UTC,completed,books\n')  # 59.6 s after
+        stats = processors.process_csv_data(str(csv_file), mode='incremental')
+        assert stats['duplicate_transactions'] == 1
+        incremental_ids = [row[0] for row in fetch_transactions(scratch_db)]
+
+        processors.process_csv_data(str(csv_file), mode='full')
+        assert incremental_ids == [row[0] for row in fetch_transactions(scratch_db)] == ['TXN-1', 'TXN-2']
+
+    def test_rewritten_file_falls_back_to_full_load(self, scratch_db, tmp_path):
+        csv_file = tmp_path / 'transactions.csv'
+        write_csv(csv_file, ['TXN-1,CUST-1,10.0,USD,2024-01-15 10:00:00,UTC,completed,books'])
+        processors.process_csv_data(str(csv_file), mode='incremental')
+
+        write_csv(csv_file, [
+            'TXN-9,CUST-9,90.0,USD,2024-01-15 10:00:00,UTC,completed,books',
+            'TXN-8,CUST-8,80.0,USD,2024-01-15 10:00:00,UTC,completed,books',
+        ])
+        processors.process_csv_data(str(csv_file), mode='incremental')
+        assert [row[0] for row in fetch_transactions(scratch_db)] == ['TXN-8', 'TXN-9']
+        assert self.quality_summary(scratch_db) == [(2, 0, 0, 0)]
+
+    def test_incremental_matches_full_load(self, scratch_db, tmp_path):
+        lines = open(CSV_PATH).read().splitlines()
+        csv_file = tmp_path / 'transactions.csv'
+        csv_file.write_text('\n'.join(lines[:2001]) + '\n')
+        processors.process_csv_data(str(csv_file), mode='incremental')
+        with open(csv_file, 'a') as f:
+            f.write('\n'.join(lines[2001:]) + '\n')
+        processors.process_csv_data(str(csv_file), mode='incremental')
+        incremental_rows = fetch_transactions(scratch_db)
+        incremental_summary = self.quality_summary(scratch_db)
+
+        processors.process_csv_data(str(csv_file), mode='full')
+        assert incremental_rows == fetch_transactions(scratch_db)
+        assert incremental_summary == self.quality_summary(scratch_db)
+
+class TestParallelIngest:
+    """Test cases for sharded multi-process ingestion"""
+
+    def near_duplicate_lines(self, count, seed=11):
+        """CSV lines with many near-duplicates, mixed timestamp formats and a few invalid dates"""
+        rng = random.Random(seed)
+        base = datetime(2024, 3, 10, 6, 0, 0)
+        lines = []
+        for i in range(count):
+            dt = base + timedelta(seconds=rng.randint(0, 600))
+            timestamp = rng.choice([dt.strftime('%Y-%m-%d %H:%M:%S'), dt.strftime('%Y-%m-%dT%H:%M:%SZ'),
+                                    dt.strftime('%m/%d/%Y %H:%M:%S'), 'not a date' if i % 97 == 0 else dt.isoformat()])
+            timezone = rng.choice(['UTC', 'America/New_York', ''])
+            lines.append(f"TXN-{i:05d},CUST-{rng.randint(1, 15)},{rng.choice([9.99, 10.0])},USD,"
+                         f"{timestamp},{timezone},completed,books")
+        return lines
+
+    def test_split_csv_covers_every_line_once(self, tmp_path):
+        lines = self.near_duplicate_lines(50)
+        csv_path = write_csv(tmp_path / 'transactions.csv', lines)
+        for shard_count in (1, 2, 7, 200):
+            data = b''
+            with open(csv_path, 'rb') as f:
+                for start, end in processors.split_csv(csv_path, shard_count):
+                    f.seek(start)
+                    chunk = f.read(end - start)
+                    assert chunk.endswith(b'\n')
+                    data += chunk
+            assert data.decode().splitlines() == lines
+
+    def test_find_duplicates_matches_detector(self):
+        records = make_records(3000)
+        detector = processors.DuplicateDetector()
+        expected = [detector.check_and_add(r['customer_id'], r['amount'], processors.to_epoch_us(r['dt']))
+                    for r in records]
+        duplicate = processors.find_duplicates(
+            [r['customer_id'] for r in records], [r['amount'] for r in records],
+            [processors.to_epoch_us(r['dt']) for r in records]
+        )
+        assert duplicate.tolist() == expected
+        assert 0 < sum(expected) < len(records)
+
+    @pytest.mark.parametrize('workers', [1, 3])
+    def test_parallel_matches_full_load(self, scratch_db, tmp_path, workers, monkeypatch):
+        csv_path = write_csv(tmp_path / 'transactions.csv', self.near_duplicate_lines(2000))
+        full_stats = processors.process_csv_data(csv_path, mode='full')
+        full_rows = fetch_transactions(scratch_db)
+        assert full_stats['duplicate_transactions'] > 0
+
+        monkeypatch.setattr(processors, 'INGEST_WORKERS', workers)
+        parallel_stats = processors.process_csv_data(csv_path, mode='parallel')
+        assert parallel_stats == full_stats
+        assert fetch_transactions(scratch_db) == full_rows
+
+    def test_parallel_matches_full_load_on_sample(self, scratch_db):
+        full_stats = processors.process_csv_data(CSV_PATH, mode='full')
+        full_rows = fetch_transactions(scratch_db)
+        assert processors.process_csv_data(CSV_PATH, mode='parallel') == full_stats
+        assert fetch_transactions(scratch_db) == full_rows
+
+class TestOutOfOrderDetector:
+    """Test cases for late arrival detection"""
+
+    HOUR_US = 3600 * 1_000_000
+
+    def test_flags_rows_behind_running_max(self):
+        detector = processors.OutOfOrderDetector(lateness_seconds=3600)
+        hour = self.HOUR_US
+        epoch_us = np.array([10 * hour, 12 * hour, 10.5 * hour, records.NO_TIME, 11.99 * hour, 13 * hour], dtype='int64')
+        assert detector.observe(epoch_us).tolist() == [False, False, True, False, False, False]
+        assert detector.newest_us == 13 * self.HOUR_US
+        assert detector.late_count == 1
+        # 1.5 hours behind lands in <=6h, 36 seconds behind in <=1m
+        assert dict(zip(processors.LATENESS_BUCKET_LABELS, detector.histogram)) == {
+            '<=1m': 1, '<=5m': 0, '<=1h': 0, '<=6h': 1, '<=1d': 0, '<=7d': 0, '>7d': 0
+        }
+
+    def test_chunks_match_single_pass(self):
+        rng = np.random.default_rng(5)
+        epoch_us = (np.arange(5000) * 60 + rng.integers(-7200, 600, 5000)).astype('int64') * 1_000_000
+        whole = processors.OutOfOrderDetector()
+        expected = whole.observe(epoch_us)
+
+        chunked = processors.OutOfOrderDetector()
+        late = np.concatenate([chunked.observe(chunk) for chunk in np.array_split(epoch_us, 37)])
+        assert late.tolist() == expected.tolist()
+        assert (chunked.newest_us, chunked.late_count, chunked.histogram) == \
+               (whole.newest_us, whole.late_count, whole.histogram)
+        assert 0 < whole.late_count < len(epoch_us)
+
+    @pytest.mark.parametrize('mode', ['full', 'streaming', 'parallel'])
+    def test_ingest_flags_and_reports_late_rows(self, scratch_db, tmp_path, mode):
+        csv_path = write_csv(tmp_path / 'transactions.csv', [
+            'TXN-1,CUST-1,10.0,USD,2024-01-15 10:00:00,UTC,completed,books',
+            'TXN-2,CUST-2,20.0,USD,2024-01-15 12:00:00,UTC,completed,books',
+            'TXN-3,CUST-3,30.0,USD,2024-01-15 10:30:00,UTC,completed,books',   # 1.5 hours late
+            'TXN-4,CUST-4,40.0,USD,2024-01-15 11:59:00,UTC,completed,books',   # Within the allowed lateness
+        ])
+        stats = processors.process_csv_data(csv_path, mode=mode, chunk_size=2)
+        assert stats['out_of_order_records'] == 1
+
+        conn = sqlite3.connect(scratch_db)
+        flagged = conn.execute('SELECT transaction_id FROM transactions WHERE quality_issues & 16').fetchall()
+        summary = conn.execute('SELECT out_of_order_records FROM data_quality_summary').fetchone()
+        conn.close()
+        assert flagged == [('TXN-3',)]
+        assert summary == (1,)
+        assert fetch_transactions(scratch_db)[2][9] == '{"issues": ["out_of_order"]}'
+
+    def test_incremental_ingest_continues_running_max(self, scratch_db, tmp_path):
+        csv_file = tmp_path / 'transactions.csv'
+        write_csv(csv_file, ['TXN-1,CUST-1,10.0,USD,2024-01-15 12:00:00,UTC,completed,books'])
+        processors.process_csv_data(str(csv_file), mode='full')
+        with open(csv_file, 'a') as f:
+            f.write('TXN-2,CUST-2,20.0,USD,2024-01-15 09:00:00,UTC,completed,books\n')
+        stats = processors.process_csv_data(str(csv_file), mode='incremental')
+        assert stats['out_of_order_records'] == 1
+        newest_us, late_count, histogram = database.get_arrival_state(os.path.abspath(csv_file))
+        assert (newest_us, late_count, sum(histogram)) == (processors.to_epoch_us(
+            datetime(2024, 1, 15, 12, tzinfo=pytz.UTC)), 1, 1)
+
+    def test_report_without_arrival_table(self, scratch_db, tmp_path, client):
+        processors.process_csv_data(write_csv(tmp_path / 'transactions.csv', [
+            'TXN-1,CUST-1,10.0,USD,2024-01-15 12:00:00,UTC,completed,books',
+        ]), mode='full')
+        conn = sqlite3.connect(scratch_db)
+        conn.execute('DROP TABLE arrival_order')
+        conn.commit()
+        conn.close()
+        assert database.get_lateness_histogram() == []
+        response = client.get('/api/data-quality')
+        assert response.status_code == 200
+        assert response.get_json()['out_of_order_lateness']['histogram'] == {}
+
+class TestIngestCLI:
+    """Test cases for the ingest command line (app/ingest.py)"""
+
+    APP_DIR = os.path.join(os.path.dirname(__file__), '..', 'app')
+    HEAVY_MODULES = ('pandas', 'numpy', 'flask', 'processors')
+
+    def loaded_modules(self, argv):
+        """Running main(argv) in a fresh interpreter; returns (stdout, heavy modules it imported)"""
+        script = (
+            "import sys, ingest\n"
+            "try:\n"
+            f"    ingest.main({argv!r})\n"
+            "except SystemExit:\n"
+            "    pass\n"
+            f"print(sorted(m for m in {self.HEAVY_MODULES!r} if m in sys.modules))\n"
+        )
+        result = subprocess.run([sys.executable, '-c', script], cwd=self.APP_DIR,
+                                capture_output=True, text=True, check=True)
+        *output, modules = result.stdout.strip().splitlines()
+        return '\n'.join(output), modules
+
+    def test_help_imports_nothing_heavy(self):
+        output, modules = self.loaded_modules(['--help'])
+        assert '--mode' in output
+        assert modules == '[]'
+
+    def test_dry_run_and_noop_stay_lazy(self, scratch_db, tmp_path):
+        csv_file = write_csv(tmp_path / 'transactions.csv', [
+            'TXN-1,CUST-1,10.0,USD,2024-01-15 10:00:00,UTC,completed,books',
+        ])
+        output, modules = self.loaded_modules([csv_file, '--db', scratch_db, '--mode', 'incremental', '--dry-run'])
+        assert output == f"{csv_file}: full, {os.path.getsize(csv_file):,} bytes to read"
+        assert modules == '[]'
+
+        assert ingest.main([csv_file, '--db', scratch_db, '--mode', 'incremental']) == 0
+        assert [row[0] for row in fetch_transactions(scratch_db)] == ['TXN-1']
+
+        output, modules = self.loaded_modules([csv_file, '--db', scratch_db, '--mode', 'incremental'])
+        assert output.endswith('Nothing new to ingest')
+        assert modules == '[]'
+
+    def test_several_files_never_full_load(self, scratch_db, tmp_path):
+        first = write_csv(tmp_path / 'first.csv', ['TXN-1,CUST-1,10.0,USD,2024-01-15 10:00:00,UTC,completed,books'])
+        second = write_csv(tmp_path / 'second.csv', ['TXN-2,CUST-2,20.0,USD,2024-01-15 11:00:00,UTC,completed,books'])
+        with pytest.raises(SystemExit):
+            ingest.main([first, second, '--db', scratch_db])
+        assert ingest.main([first, '--db', scratch_db, '--mode', 'incremental']) == 0
+        with pytest.raises(SystemExit):
+            ingest.main([first, second, '--db', scratch_db, '--mode', 'incremental'])  # second has no high-water mark
+        assert [row[0] for row in fetch_transactions(scratch_db)] == ['TXN-1']
+
+    def test_missing_file_is_rejected(self, scratch_db, tmp_path):
+        with pytest.raises(SystemExit):
+            ingest.main([str(tmp_path / 'missing.csv'), '--db', scratch_db])
+
+    def test_fx_rates_reload_without_new_rows(self, scratch_db, tmp_path):
+        csv_file = write_csv(tmp_path / 'transactions.csv', [
+            'TXN-1,CUST-1,10.0,EUR,2024-01-15 10:00:00,UTC,completed,books',
+        ])
+        rates_file = tmp_path / 'fx_rates.csv'
+        rates_file.write_text('date,currency,rate\n2024-01-01,EUR,1.5\n')
+        assert ingest.main([csv_file, '--db', scratch_db, '--mode', 'incremental', '--fx-rates', str(rates_file)]) == 0
+
+        rates_file.write_text('date,currency,rate\n2024-01-01,EUR,2.0\n')
+        assert ingest.main([csv_file, '--db', scratch_db, '--mode', 'incremental', '--fx-rates', str(rates_file)]) == 0
+        conn = sqlite3.connect(scratch_db)
+        assert conn.execute('SELECT amount_base FROM transactions').fetchall() == [(20.0,)]
+        conn.close()
@@ -0,0 +1,129 @@
+# tests/test_wsgi.py
+"""
+Test cases for the production WSGI entry point.
+"""
+
+import pytest
+import sys
+import os
+import time
+import signal
+import threading
+import subprocess
+import http.client
+
+# Add the app directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+
+try:
+    from app import response_cache
+    import database
+    import processors
+    import wsgi
+
+except ImportError as e:
+    pytest.skip(f"Could not import app modules: {e}", allow_module_level=True)
+
+APP_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'app'))
+from .conftest import CSV_PATH
+PORT = 5078
+
+def get(path):
+    conn = http.client.HTTPConnection('127.0.0.1', PORT, timeout=10)
+    conn.request('GET', path)
+    response = conn.getresponse()
+    return response.status, response.read()
+
+class TestWorkerWarmup:
+    """Test cases for preparing a web worker before it serves"""
+
+    def test_warm_worker_caches_common_responses(self, loaded_db):
+        response_cache.clear()
+        with database.read_connection() as conn:
+            newest_ts = conn.execute('SELECT MAX(processed_ts) FROM transactions').fetchone()[0]
+        paths = wsgi.warm_requests(newest_ts)
+        assert wsgi.warm_worker() == len(paths)
+        assert len(response_cache) == len(paths)
+
+        hits = response_cache.hits
+        wsgi.app.test_client().get(paths[1])
+        assert response_cache.hits == hits + 1
+        assert processors.timezone_cache.get('America/New_York') is not None
+
+    def test_warm_worker_on_empty_database(self, scratch_db):
+        assert wsgi.warm_worker() == 0
+
+    def test_web_worker_never_ingests(self, loaded_db, monkeypatch):
+        monkeypatch.setattr(processors, 'INGEST_DISABLED', None)
+        wsgi.init_worker()
+        with pytest.raises(RuntimeError, match='web worker'):
+            processors.process_csv_data(CSV_PATH, mode='full')
+
+    def test_reload_without_server(self, tmp_path):
+        assert wsgi.reload_server(str(tmp_path / 'missing.pid')) is False
+
+class TestGunicornServer:
+    """Test cases for the pre-forked server (skipped without gunicorn)"""
+
+    @pytest.fixture
+    def server(self, loaded_db, tmp_path):
+        pytest.importorskip('gunicorn')
+        pidfile = tmp_path / 'gunicorn.pid'
+        conf = tmp_path / 'gunicorn_test.conf.py'
+        conf.write_text(
+            "import runpy\n"
+            f"globals().update(runpy.run_path({os.path.join(APP_DIR, 'gunicorn.conf.py')!r}))\n"
+            "import database\n"
+            f"database.DB_PATH = {loaded_db!r}\n"
+            f"bind = '127.0.0.1:{PORT}'\n"
+            "workers = 2\n"
+            f"pidfile = {str(pidfile)!r}\n"
+        )
+        database.close_pools()
+        process = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', str(conf)], cwd=APP_DIR)
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline and process.poll() is None:
+            try:
+                if get('/health')[0] == 200 and pidfile.exists():
+                    break
+            except OSError:
+                time.sleep(0.2)
+        else:
+            process.kill()
+            pytest.fail('gunicorn did not start')
+        yield process, str(pidfile)
+        process.send_signal(signal.SIGTERM)
+        process.wait(30)
+
+    def worker_pids(self, master_pid):
+        with open(f"/proc/{master_pid}/task/{master_pid}/children") as f:
+            return set(f.read().split())
+
+    def test_reload_drops_no_requests(self, server):
+        process, pidfile = server
+        statuses = []
+        stop = threading.Event()
+
+        def load():
+            while not stop.is_set():
+                try:
+                    statuses.append(get('/api/sales/daily?start_date=2024-01-01&end_date=2024-01-31')[0])
+                except OSError as e:
+                    statuses.append(repr(e))
+
+        old_workers = self.worker_pids(process.pid)
+        threads = [threading.Thread(target=load) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.5)
+        assert wsgi.reload_server(pidfile)
+        deadline = time.monotonic() + 30
+        while self.worker_pids(process.pid) & old_workers and time.monotonic() < deadline:
+            time.sleep(0.2)
+        time.sleep(0.5)
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+        assert not self.worker_pids(process.pid) & old_workers
+        assert statuses and set(statuses) == {200}